@@ -19,11 +19,15 @@ from airflow.operators.python import PythonOperator
 from airflow.operators.bash import BashOperator
 from airflow.providers.http.sensors.http import HttpSensor
 from airflow.providers.http.operators.http import SimpleHttpOperator
-from airflow.providers.amazon.aws.hooks.s3 import S3Hook
 from airflow.hooks.base import BaseHook
+from airflow.models import Variable
 import json
 import pandas as pd
-from io import StringIO
+
+from parquet_dataset import (
+    PartitionedParquetWriter, S3Backend, LocalBackend, iter_column_chunks,
+    DEFAULT_ROW_GROUP_SIZE, DEFAULT_COMPRESSION
+)
 
 # Definição dos argumentos default
 default_args = {
@@ -50,7 +54,26 @@ dag = DAG(
     doc_md=__doc__                                # Documentação do DAG
 )
 
+# Destino do data lake: bucket S3 (ou MinIO) ou diretório local
+S3_BUCKET = 'example-bucket'
+LOCAL_DATA_LAKE_DIR = '/opt/airflow/include/data_lake'
+
+# Quantidade de registros exibidos no log como amostra
+LOG_SAMPLE_SIZE = 5
+
 # Funções para as tasks do pipeline
+def get_storage_backend():
+    """
+    Retorna o destino configurado na Variable `etl_storage_backend`:
+    - `s3` (padrão): bucket da Variable `etl_s3_bucket`, usando a conexão
+      `aws_default` (para o MinIO local, informe `endpoint_url` no extra)
+    - `local`: diretório da Variable `etl_local_data_dir`, com o mesmo layout
+    """
+    backend = Variable.get('etl_storage_backend', default_var='s3')
+    if backend == 'local':
+        return LocalBackend(Variable.get('etl_local_data_dir', default_var=LOCAL_DATA_LAKE_DIR))
+    return S3Backend(Variable.get('etl_s3_bucket', default_var=S3_BUCKET))
+
 def extract_data(**context):
     """
     Extrai dados da API e retorna como JSON.
@@ -74,57 +97,72 @@ def extract_data(**context):
 def transform_data(**context):
     """
     Transforma os dados extraídos aplicando regras de negócio.
+    
+    A transformação é feita sobre o lote inteiro em formato colunar:
+    o valor total é uma multiplicação de colunas e todos os registros
+    do lote recebem o mesmo `processed_at`. O log mostra apenas a
+    contagem e uma amostra dos registros, e não o lote completo.
     """
     # Recupera os dados da task anterior via XCom
     task_instance = context['task_instance']
     data = task_instance.xcom_pull(task_ids='extract_financial_data')
     
-    # Transformação dos dados para o formato desejado
-    transformed_data = []
-    for item in data['financial_data']:
-        # Calcula o valor total transacionado
-        total_value = item['price'] * item['volume']
-        
-        # Adiciona informação de data e valor total
-        transformed_item = {
-            'date': data['date'],
-            'asset': item['asset'],
-            'price': item['price'],
-            'volume': item['volume'],
-            'total_value': total_value,
-            'processed_at': datetime.now().isoformat()
-        }
-        transformed_data.append(transformed_item)
+    # Carrega o lote em formato colunar
+    df = pd.DataFrame(data['financial_data'], columns=['asset', 'price', 'volume'])
+    df.insert(0, 'date', data['date'])
+    
+    # Calcula o valor total transacionado
+    df['total_value'] = df['price'] * df['volume']
     
-    print(f"Dados transformados: {json.dumps(transformed_data, indent=2)}")
-    return transformed_data
+    # Um único timestamp de processamento para todo o lote
+    df['processed_at'] = datetime.now().isoformat()
+    
+    print(f"Dados transformados: {len(df)} registros. Amostra:\n"
+          f"{df.head(LOG_SAMPLE_SIZE).to_string(index=False)}")
+    # XCom em formato colunar ({coluna: valores}), bem mais barato de montar
+    # e serializar do que uma lista com um dicionário por registro
+    return {column: df[column].tolist() for column in df.columns}
 
 def load_to_s3(**context):
     """
-    Carrega os dados em um bucket S3 no formato parquet.
+    Carrega os dados em um bucket S3 no formato parquet, particionados
+    por data (`financial_data/date=YYYY-MM-DD/part-00000.parquet`).
+    
+    O lote é enviado ao writer em blocos de `etl_parquet_row_group_size`
+    linhas, sem montar um DataFrame com o lote inteiro. O tamanho dos row
+    groups e a compressão podem ser ajustados pelas Variables
+    `etl_parquet_row_group_size` e `etl_parquet_compression`.
     """
     # Recupera os dados transformados
     task_instance = context['task_instance']
     data = task_instance.xcom_pull(task_ids='transform_financial_data')
-    execution_date = context['execution_date'].strftime('%Y-%m-%d')
     
-    # Converte para DataFrame do pandas
-    df = pd.DataFrame(data)
-    
-    # Converte para parquet
-    parquet_buffer = StringIO()
-    df.to_parquet(parquet_buffer)
-    
-    # Define o caminho no S3
-    s3_path = f"financial_data/date={execution_date}/financial_data.parquet"
+    # Grava o dataset particionado; cada partição tocada é substituída por completo
+    row_group_size = int(Variable.get('etl_parquet_row_group_size', default_var=DEFAULT_ROW_GROUP_SIZE))
+    backend = get_storage_backend()
+    writer = PartitionedParquetWriter(
+        backend,
+        prefix='financial_data',
+        partition_cols=['date'],
+        row_group_size=row_group_size,
+        compression=Variable.get('etl_parquet_compression', default_var=DEFAULT_COMPRESSION)
+    )
+    with writer:
+        # O XCom chega em formato colunar; cada bloco vira um DataFrame próprio
+        for chunk in iter_column_chunks(data, row_group_size):
+            writer.write(chunk)
     
-    # Simulação de carregamento para S3 (em produção usaria S3Hook)
-    print(f"Dados carregados em s3://example-bucket/{s3_path}")
+    # Partições derivadas dos arquivos gravados, e não da data de execução:
+    # o lote pode trazer outras datas (ou nenhuma linha)
+    partitions = [backend.uri(prefix) for prefix in writer.partitions]
+    print(f"Dados carregados em {', '.join(partitions) or 'nenhuma partição'}: "
+          f"{len(writer.files)} arquivo(s)")
     
-    # Retorna o caminho do arquivo para referência futura
+    # Retorna as partições e os arquivos gravados para referência futura
     return {
-        "s3_path": s3_path, 
-        "record_count": len(data)
+        "partitions": partitions,
+        "files": writer.files,
+        "record_count": sum(file['rows'] for file in writer.files)
     }
 
 def notify_completion(**context):
@@ -139,7 +177,7 @@ def notify_completion(**context):
     message = (
         f"ETL pipeline concluído com sucesso!\n"
         f"Data de execução: {context['execution_date'].strftime('%Y-%m-%d %H:%M:%S')}\n"
-        f"Arquivo gerado: {load_result['s3_path']}\n"
+        f"Partições geradas: {', '.join(load_result['partitions']) or 'nenhuma'}\n"
         f"Registros processados: {load_result['record_count']}"
     )
     
@@ -0,0 +1,225 @@
+"""
+### Dataset Parquet particionado
+
+Escrita de datasets Parquet particionados no estilo Hive
+(`<prefixo>/date=YYYY-MM-DD/part-00000.parquet`) em um object store.
+
+Os dados são recebidos em blocos (`write`) e gravados incrementalmente em
+arquivos locais temporários, um por partição, em row groups de tamanho
+configurável; cada arquivo é enviado ao destino ao atingir
+`rows_per_file` linhas ou no `close`. Assim o DAG nunca precisa montar o
+Parquet inteiro em memória.
+
+Destinos disponíveis:
+- `S3Backend`: bucket S3 (ou MinIO) via `S3Hook`, com upload multipart
+  para arquivos grandes
+- `LocalBackend`: diretório local com o mesmo layout de chaves, útil para
+  desenvolvimento e testes sem object store
+"""
+
+import os
+import shutil
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_ROW_GROUP_SIZE = 100000
+DEFAULT_ROWS_PER_FILE = 1000000
+DEFAULT_COMPRESSION = 'snappy'
+
+# Arquivos acima deste tamanho são enviados em partes ao S3
+DEFAULT_MULTIPART_THRESHOLD = 16 * 1024 * 1024
+DEFAULT_MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+
+
+def iter_column_chunks(columns, chunk_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Gera DataFrames de até `chunk_size` linhas a partir de um dicionário
+    `{coluna: valores}` (ex.: o XCom colunar), sem montar o DataFrame do
+    lote inteiro.
+    """
+    import pandas as pd
+
+    total = len(next(iter(columns.values()), []))
+    for start in range(0, total, chunk_size):
+        yield pd.DataFrame({name: values[start:start + chunk_size] for name, values in columns.items()})
+
+
+class LocalBackend:
+    """
+    Grava os arquivos em `root_dir`, usando a chave como caminho relativo.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def put_file(self, local_path, key):
+        target = os.path.join(self.root_dir, key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_path, target)
+        return target
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(os.path.join(self.root_dir, prefix), ignore_errors=True)
+
+    def uri(self, key):
+        return os.path.join(self.root_dir, key)
+
+
+class S3Backend:
+    """
+    Grava os arquivos em um bucket S3 via `S3Hook`. O upload usa o
+    transfer manager do boto3, que divide em partes paralelas os
+    arquivos maiores que `multipart_threshold`.
+    """
+
+    def __init__(self, bucket_name, aws_conn_id='aws_default',
+                 multipart_threshold=DEFAULT_MULTIPART_THRESHOLD,
+                 multipart_chunksize=DEFAULT_MULTIPART_CHUNKSIZE):
+        # Importado aqui para que o LocalBackend funcione sem o provider da AWS
+        from airflow.providers.amazon.aws.hooks.s3 import S3Hook
+
+        self.bucket_name = bucket_name
+        self.hook = S3Hook(
+            aws_conn_id=aws_conn_id,
+            transfer_config_args={
+                'multipart_threshold': multipart_threshold,
+                'multipart_chunksize': multipart_chunksize,
+            }
+        )
+
+    def put_file(self, local_path, key):
+        self.hook.load_file(filename=local_path, key=key, bucket_name=self.bucket_name, replace=True)
+        return self.uri(key)
+
+    def delete_prefix(self, prefix):
+        keys = self.hook.list_keys(bucket_name=self.bucket_name, prefix=prefix)
+        if keys:
+            self.hook.delete_objects(bucket=self.bucket_name, keys=keys)
+
+    def uri(self, key):
+        return f"s3://{self.bucket_name}/{key}"
+
+
+class PartitionedParquetWriter:
+    """
+    Grava blocos de DataFrame como dataset Parquet particionado por
+    `partition_cols`. Cada partição tocada é apagada no destino antes da
+    primeira escrita, de modo que reexecuções substituem a partição em vez
+    de acumular arquivos.
+
+    Uso:
+        with PartitionedParquetWriter(backend, 'financial_data', ['date']) as writer:
+            for frame in frames:
+                writer.write(frame)
+        writer.files       # [{'path': ..., 'partition': ..., 'rows': ..., 'bytes': ...}]
+        writer.partitions  # ['financial_data/date=2025-04-29/', ...]
+    """
+
+    def __init__(self, backend, prefix, partition_cols,
+                 row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                 rows_per_file=DEFAULT_ROWS_PER_FILE,
+                 compression=DEFAULT_COMPRESSION,
+                 basename='part'):
+        self.backend = backend
+        self.prefix = prefix.rstrip('/')
+        self.partition_cols = list(partition_cols)
+        self.row_group_size = row_group_size
+        self.rows_per_file = rows_per_file
+        self.compression = compression
+        self.basename = basename
+        self.files = []
+        self._staging_dir = tempfile.mkdtemp(prefix='parquet_dataset_')
+        self._open = {}
+        self._file_counts = {}
+
+    def partition_key(self, values):
+        return "/".join(f"{col}={value}" for col, value in zip(self.partition_cols, values))
+
+    @property
+    def partitions(self):
+        """
+        Prefixos das partições efetivamente gravadas, na ordem da primeira
+        escrita, derivados de `files`.
+        """
+        seen = []
+        for file in self.files:
+            prefix = f"{self.prefix}/{file['partition']}/"
+            if prefix not in seen:
+                seen.append(prefix)
+        return seen
+
+    def write(self, frame):
+        """
+        Acrescenta um bloco ao dataset, distribuindo as linhas por partição.
+        """
+        if frame.empty:
+            return
+        for values, group in frame.groupby(self.partition_cols, sort=False):
+            if not isinstance(values, tuple):
+                values = (values,)
+            partition = self.partition_key(values)
+            table = pa.Table.from_pandas(group.drop(columns=self.partition_cols), preserve_index=False)
+            # Blocos maiores que o espaço restante no arquivo atual são divididos
+            offset = 0
+            while offset < table.num_rows:
+                state = self._writer_for(partition, table.schema)
+                take = min(self.rows_per_file - state['rows'], table.num_rows - offset)
+                state['writer'].write_table(
+                    table.slice(offset, take).cast(state['schema']), row_group_size=self.row_group_size
+                )
+                state['rows'] += take
+                offset += take
+                if state['rows'] >= self.rows_per_file:
+                    self._finish(partition)
+
+    def close(self):
+        """
+        Envia os arquivos ainda abertos e remove a área de staging local.
+        Retorna a lista de arquivos gravados.
+        """
+        try:
+            for partition in list(self._open):
+                self._finish(partition)
+        finally:
+            shutil.rmtree(self._staging_dir, ignore_errors=True)
+        return self.files
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            for state in self._open.values():
+                state['writer'].close()
+            shutil.rmtree(self._staging_dir, ignore_errors=True)
+
+    def _writer_for(self, partition, schema):
+        if partition in self._open:
+            return self._open[partition]
+
+        file_index = self._file_counts.get(partition, 0)
+        if file_index == 0:
+            self.backend.delete_prefix(f"{self.prefix}/{partition}/")
+        self._file_counts[partition] = file_index + 1
+
+        local_path = os.path.join(self._staging_dir, f"{partition.replace('/', '_')}-{file_index:05d}.parquet")
+        self._open[partition] = {
+            'key': f"{self.prefix}/{partition}/{self.basename}-{file_index:05d}.parquet",
+            'local_path': local_path,
+            'schema': schema,
+            'writer': pq.ParquetWriter(local_path, schema, compression=self.compression),
+            'rows': 0,
+        }
+        return self._open[partition]
+
+    def _finish(self, partition):
+        state = self._open.pop(partition)
+        state['writer'].close()
+        size = os.path.getsize(state['local_path'])
+        path = self.backend.put_file(state['local_path'], state['key'])
+        os.remove(state['local_path'])
+        self.files.append({'path': path, 'partition': partition, 'rows': state['rows'], 'bytes': size})
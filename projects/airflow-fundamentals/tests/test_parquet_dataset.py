@@ -0,0 +1,84 @@
+"""
+Testes do dataset Parquet particionado com o `LocalBackend`.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'plugins'))
+
+from parquet_dataset import LocalBackend, PartitionedParquetWriter, iter_column_chunks  # noqa: E402
+
+
+def _batch(dates, assets, price=10.0):
+    return {
+        'date': list(dates),
+        'asset': list(assets),
+        'price': [price] * len(assets),
+        'volume': list(range(len(assets))),
+    }
+
+
+def _write(root_dir, columns, chunk_size=2, rows_per_file=3):
+    writer = PartitionedParquetWriter(
+        LocalBackend(str(root_dir)), 'financial_data', ['date'],
+        row_group_size=chunk_size, rows_per_file=rows_per_file
+    )
+    with writer:
+        for chunk in iter_column_chunks(columns, chunk_size):
+            writer.write(chunk)
+    return writer
+
+
+def _read_partition(root_dir, date):
+    partition_dir = os.path.join(str(root_dir), 'financial_data', f"date={date}")
+    files = sorted(os.listdir(partition_dir))
+    frame = pd.concat([pq.read_table(os.path.join(partition_dir, name)).to_pandas() for name in files])
+    return files, frame.reset_index(drop=True)
+
+
+def test_iter_column_chunks_splits_columnar_batch():
+    chunks = list(iter_column_chunks(_batch(['2025-04-29'] * 5, 'ABCDE'), chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert pd.concat(chunks)['asset'].tolist() == list('ABCDE')
+
+
+def test_round_trip_partitioned_output(tmp_path):
+    columns = _batch(['2025-04-29'] * 4 + ['2025-04-30'] * 2, 'ABCDEF')
+
+    writer = _write(tmp_path, columns)
+
+    assert sum(file['rows'] for file in writer.files) == 6
+    # Partições reportadas a partir dos arquivos gravados, na ordem de escrita
+    assert writer.partitions == ['financial_data/date=2025-04-29/', 'financial_data/date=2025-04-30/']
+    assert [file['partition'] for file in writer.files] == ['date=2025-04-29'] * 2 + ['date=2025-04-30']
+    names, frame = _read_partition(tmp_path, '2025-04-29')
+    # rows_per_file=3: a partição com 4 linhas é dividida em dois arquivos
+    assert names == ['part-00000.parquet', 'part-00001.parquet']
+    assert frame['asset'].tolist() == list('ABCD')
+    assert frame['volume'].tolist() == [0, 1, 2, 3]
+    assert 'date' not in frame.columns
+
+    names, frame = _read_partition(tmp_path, '2025-04-30')
+    assert names == ['part-00000.parquet']
+    assert frame['asset'].tolist() == list('EF')
+
+
+def test_rerun_overwrites_touched_partitions(tmp_path):
+    _write(tmp_path, _batch(['2025-04-29'] * 4 + ['2025-04-30'] * 2, 'ABCDEF'))
+
+    # Reexecução menor só para o dia 29: arquivos antigos da partição somem
+    _write(tmp_path, _batch(['2025-04-29'] * 2, 'XY', price=20.0))
+
+    names, frame = _read_partition(tmp_path, '2025-04-29')
+    assert names == ['part-00000.parquet']
+    assert frame['asset'].tolist() == ['X', 'Y']
+    assert frame['price'].tolist() == [20.0, 20.0]
+
+    # Partições não tocadas pela reexecução são preservadas
+    _, frame = _read_partition(tmp_path, '2025-04-30')
+    assert frame['asset'].tolist() == ['E', 'F']
@@ -2,7 +2,8 @@
 ## dbt Integration DAG
 
 Este DAG executa modelos dbt para transformação e análise de dados de voos.
-Ele depende da conclusão bem-sucedida do DAG flights_etl.
+Ele é disparado pelo dataset raw_flights, publicado pelo DAG flights_etl
+assim que a carga no banco é concluída.
 
 Escrito por: Tiago Silva
 Data: 29/04/2025
@@ -12,12 +13,19 @@ from datetime import datetime, timedelta
 from airflow import DAG
 from airflow.operators.bash import BashOperator
 from airflow.operators.python import PythonOperator, BranchPythonOperator
-from airflow.sensors.external_task import ExternalTaskSensor
-from airflow.providers.postgres.hooks.postgres import PostgresHook
 from airflow.utils.task_group import TaskGroup
+from airflow.utils.trigger_rule import TriggerRule
 from airflow.models import Variable
 import os
-import json
+import shutil
+
+from pipeline_metrics import instrumented, current_stage
+from connection_pool import pooled_connection
+from flights_datasets import RAW_FLIGHTS_DATASET, loaded_partitions
+from dbt_artifacts import (
+    read_results, record_history, find_regressions, failed_tests,
+    DEFAULT_REGRESSION_THRESHOLD, DEFAULT_REGRESSION_WINDOW
+)
 
 # Definição dos argumentos default
 default_args = {
@@ -38,7 +46,7 @@ dag = DAG(
     'dbt_flights_transformations',
     default_args=default_args,
     description='Executa transformações dbt em dados de voos',
-    schedule_interval='0 10 * * *',  # Executa às 10h, após o ETL
+    schedule=[RAW_FLIGHTS_DATASET],  # Executa assim que o ETL carrega novos voos
     catchup=False,
     max_active_runs=1,
     doc_md=__doc__
@@ -49,48 +57,177 @@ DBT_PROJECT_DIR = '/opt/airflow/dbt'  # Caminho para o projeto dbt no container
 DBT_PROFILES_DIR = '/opt/airflow/dbt/profiles'
 DBT_TARGET = 'prod'
 
+# Diretórios de saída separados para run e test, para que o run_results.json
+# de um não sobrescreva o do outro
+DBT_RUN_TARGET_PATH = 'target/run'
+DBT_TEST_TARGET_PATH = 'target/test'
+
+# manifest.json da última execução bem-sucedida, usado como estado (--state)
+DBT_STATE_DIR = '/opt/airflow/dbt/state'
+
+# Source do dbt com as tabelas raw e, para cada tabela, a contagem
+# correspondente no resumo da carga do flights_etl
+DBT_SOURCE_NAME = 'flights'
+LOADED_SOURCE_COUNTS = {
+    'raw_flights': 'flights_inserted',
+    'raw_airports': 'airports_inserted',
+    'raw_airlines': 'airlines_inserted'
+}
+
+# Seleção completa, usada sem estado anterior ou em execuções manuais
+DBT_FULL_SELECTION = 'tag:daily'
+
 # Funções auxiliares
+@instrumented()
 def check_flights_data_availability(**context):
     """
-    Verifica se há dados de voos disponíveis para a data de execução.
-    """
-    execution_date = context['ds']
-    
-    # Conexão com o banco
-    pg_hook = PostgresHook(postgres_conn_id='postgres_flights')
+    Verifica se há dados de voos disponíveis para as partições carregadas.
     
-    # Consulta para verificar dados para a data atual
-    query = f"""
-    SELECT COUNT(*) as flight_count 
-    FROM raw_flights 
-    WHERE flight_date = '{execution_date}'
+    Em execuções disparadas pelo dataset, as datas vêm dos eventos da carga
+    (vários eventos podem ser agrupados em uma só execução); em execuções
+    manuais, usa a data de execução. A decisão lê o manifesto de carga
+    gravado por `load_flights_to_postgres`, sem contar as linhas de raw_flights.
     """
+    summaries = loaded_partitions(context)
+    for summary in summaries:
+        print(f"Carga de {summary['flight_date']}: {summary['flights_inserted']} voos, "
+              f"{summary['airports_inserted']} aeroportos, {summary['airlines_inserted']} companhias")
     
-    result = pg_hook.get_first(query)
-    flight_count = result[0]
+    flight_dates = sorted({summary['flight_date'] for summary in summaries}) or [context['ds']]
+    context['ti'].xcom_push(key='flight_dates', value=flight_dates)
     
-    print(f"Encontrados {flight_count} voos para {execution_date}")
+    # Uma única conexão do pool do DAG para o manifesto e as datas sem manifesto
+    available = []
+    with pooled_connection('postgres_flights', context) as conn:
+        cursor = conn.cursor()
+        
+        # Contagens do manifesto de carga: leitura pela chave primária, sem varrer raw_flights
+        cursor.execute(
+            """
+            SELECT flight_date::text, flights_count
+            FROM raw_flights_load_manifest
+            WHERE flight_date = ANY(%s::date[])
+            """,
+            (flight_dates,)
+        )
+        manifest = dict(cursor.fetchall())
+        
+        for flight_date in flight_dates:
+            if flight_date in manifest:
+                print(f"{flight_date}: {manifest[flight_date]} voos carregados")
+                has_data = manifest[flight_date] > 0
+            else:
+                # Datas sem manifesto (cargas anteriores a ele): basta saber se
+                # existe ao menos uma linha, o que o índice por data responde sem contar
+                cursor.execute(
+                    "SELECT EXISTS (SELECT 1 FROM raw_flights WHERE flight_date = %s)",
+                    (flight_date,)
+                )
+                has_data = cursor.fetchone()[0]
+                print(f"{flight_date}: sem manifesto de carga, dados presentes: {has_data}")
+            if has_data:
+                available.append(flight_date)
+        cursor.close()
+    current_stage().add_rows(len(available))
     
-    # Se tiver dados, prossegue com o dbt
-    if flight_count > 0:
-        return 'dbt_run'
+    # Se tiver dados, prossegue com o dbt (tarefa dentro do TaskGroup dbt_tasks)
+    if available:
+        return 'dbt_tasks.select_models'
     else:
         return 'no_data_available'
 
+def _state_dir():
+    return Variable.get("dbt_state_dir", default_var=DBT_STATE_DIR)
+
+def select_dbt_models(**context):
+    """
+    Monta os argumentos de seleção do dbt run/test.
+    
+    Com o manifest da última execução bem-sucedida disponível, seleciona
+    apenas os modelos alterados desde então (`state:modified+`) e os
+    modelos a jusante das sources que receberam dados nas cargas que
+    dispararam a execução. Sem estado anterior, ou em execuções manuais
+    (sem resumo de carga), seleciona `tag:daily` inteiro.
+    """
+    summaries = loaded_partitions(context)
+    state_dir = _state_dir()
+    has_state = os.path.exists(os.path.join(state_dir, 'manifest.json'))
+    
+    if not has_state or not summaries:
+        dbt_args = f"--select {DBT_FULL_SELECTION}"
+        print(f"Sem estado anterior ou resumo de carga; seleção completa: {dbt_args}")
+    else:
+        loaded_sources = [
+            table for table, count_key in LOADED_SOURCE_COUNTS.items()
+            if any(summary.get(count_key, 0) > 0 for summary in summaries)
+        ]
+        selectors = ['state:modified+'] + [
+            f"source:{DBT_SOURCE_NAME}.{table}+" for table in loaded_sources
+        ]
+        dbt_args = f"--select {' '.join(selectors)} --state {state_dir}"
+        print(f"Sources com dados novos: {', '.join(loaded_sources) or 'nenhuma'}")
+        print(f"Seleção: {dbt_args}")
+    
+    context['ti'].xcom_push(key='dbt_args', value=dbt_args)
+    return dbt_args
+
+def save_dbt_state(**context):
+    """
+    Guarda o manifest.json da execução atual como estado para a próxima
+    seleção `state:modified+`. Só é chamada depois que os testes passam,
+    de modo que modelos com falha continuam selecionados na próxima execução.
+    """
+    state_dir = _state_dir()
+    os.makedirs(state_dir, exist_ok=True)
+    
+    # Cópia seguida de rename, para nunca deixar um manifest parcial no estado
+    target_path = os.path.join(state_dir, 'manifest.json')
+    tmp_path = target_path + '.tmp'
+    shutil.copyfile(os.path.join(DBT_PROJECT_DIR, DBT_RUN_TARGET_PATH, 'manifest.json'), tmp_path)
+    os.replace(tmp_path, target_path)
+    
+    print(f"Estado do dbt atualizado em {target_path}")
+    return target_path
+
+def _record_dbt_results(target_path, context):
+    """
+    Lê os artefatos de uma execução do dbt e grava os resultados por nó em
+    dbt_run_history. Retorna `(linhas, resumo)`.
+    """
+    rows, summary = read_results(os.path.join(DBT_PROJECT_DIR, target_path))
+    
+    with pooled_connection('postgres_flights', context) as conn:
+        try:
+            record_history(conn, rows, context['run_id'])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return rows, summary
+
 def run_dbt_tests(**context):
     """
-    Executa testes dbt e decide se deve continuar o pipeline ou não.
+    Avalia o run_results.json do `dbt test` e decide se o pipeline continua.
+    Testes com status `fail` ou `error` reprovam a execução; `warn` não.
     """
-    # Em um ambiente real, avaliaria os resultados do comando `dbt test`
-    # e tomaria uma decisão baseada nos resultados.
+    rows, summary = _record_dbt_results(DBT_TEST_TARGET_PATH, context)
+    failures = failed_tests(rows)
+    
+    print(f"dbt test: {summary['nodes_executed']} testes em {summary['execution_time']:.1f}s, "
+          f"status: {summary['by_status']}")
+    for row in failures:
+        print(f"Teste reprovado: {row['name']} ({row['status']}, {row['failures']} falhas): {row['message']}")
     
-    # Para simplificar este exemplo, consideramos que os testes passaram
-    tests_passed = True
+    context['ti'].xcom_push(key='test_results', value={
+        **summary,
+        'failed_tests': [row['name'] for row in failures]
+    })
+    tests_passed = not failures
     
     if tests_passed:
-        return 'generate_docs'
+        return 'dbt_tasks.save_dbt_state'
     else:
-        return 'send_test_failure_notification'
+        return 'dbt_tasks.send_test_failure_notification'
 
 def generate_dbt_docs(**context):
     """
@@ -111,20 +248,42 @@ def generate_dbt_docs(**context):
 def log_run_results(**context):
     """
     Processa e registra os resultados da execução do dbt.
+    
+    Lê o run_results.json e o manifest.json do `dbt run`, grava o tempo,
+    status e linhas afetadas de cada modelo em dbt_run_history e aponta os
+    modelos cujo tempo passou do limite (Variable `dbt_regression_threshold`)
+    em relação à mediana das últimas execuções (Variable `dbt_regression_window`).
+    Roda também quando o dbt run falha, para registrar os modelos com erro.
     """
     task_instance = context['task_instance']
     
-    # Em um ambiente real, processaria o arquivo run_results.json gerado pelo dbt
-    # Para este exemplo, simularemos o resultado
+    rows, summary = _record_dbt_results(DBT_RUN_TARGET_PATH, context)
+    
+    with pooled_connection('postgres_flights', context) as conn:
+        regressions = find_regressions(
+            conn,
+            rows,
+            threshold=float(Variable.get("dbt_regression_threshold", default_var=DEFAULT_REGRESSION_THRESHOLD)),
+            window=int(Variable.get("dbt_regression_window", default_var=DEFAULT_REGRESSION_WINDOW))
+        )
+    
     run_results = {
-        'execution_time': 45.2,  # segundos
-        'models_executed': 8,
-        'models_success': 8,
-        'models_error': 0,
-        'models_skipped': 0
+        'execution_time': summary['execution_time'],
+        'models_executed': summary['nodes_executed'],
+        'models_success': summary['by_status'].get('success', 0),
+        'models_error': summary['by_status'].get('error', 0),
+        'models_skipped': summary['by_status'].get('skipped', 0),
+        'slowest_models': summary['slowest'],
+        'regressions': regressions
     }
     
     print(f"Execução dbt concluída: {run_results['models_success']} modelos com sucesso em {run_results['execution_time']:.1f}s")
+    for model in summary['slowest']:
+        print(f"  {model['name']}: {model['execution_time']:.1f}s")
+    for regression in regressions:
+        print(f"Regressão de tempo em {regression['name']}: {regression['execution_time']:.1f}s "
+              f"vs mediana {regression['median']:.1f}s das últimas {regression['runs']} execuções "
+              f"(+{regression['increase']:.0%})")
     
     # Armazena métricas para uso posterior
     task_instance.xcom_push(key='dbt_metrics', value=run_results)
@@ -132,17 +291,6 @@ def log_run_results(**context):
     return run_results
 
 # Definição das tarefas
-# Sensor para aguardar a conclusão do DAG de ETL
-wait_for_etl = ExternalTaskSensor(
-    task_id='wait_for_etl',
-    external_dag_id='flights_etl',
-    external_task_id='load_flights_to_postgres',
-    mode='poke',
-    poke_interval=300,  # Verificar a cada 5 minutos
-    timeout=3600,  # Timeout de 1 hora
-    dag=dag
-)
-
 # Verificação de disponibilidade de dados
 check_data = BranchPythonOperator(
     task_id='check_flights_data',
@@ -158,25 +306,48 @@ no_data = BashOperator(
     dag=dag
 )
 
+# Argumentos de seleção montados por select_models
+DBT_SELECTION_ARGS = "{{ ti.xcom_pull(task_ids='dbt_tasks.select_models', key='dbt_args') }}"
+
 # Grupo de tarefas dbt
 with TaskGroup(group_id='dbt_tasks', dag=dag) as dbt_tasks:
     
-    # Execução do dbt run
+    # Seleção dos modelos a executar (estado anterior + sources com dados novos)
+    select_models = PythonOperator(
+        task_id='select_models',
+        python_callable=select_dbt_models,
+        provide_context=True,
+        dag=dag
+    )
+    
+    # Execução do dbt run. O run_results.json anterior é removido: process_results
+    # roda mesmo com falha do dbt run e não deve registrar uma execução antiga
     dbt_run = BashOperator(
         task_id='dbt_run',
-        bash_command=f'cd {DBT_PROJECT_DIR} && DBT_PROFILES_DIR={DBT_PROFILES_DIR} dbt run --target {DBT_TARGET} --models tag:daily',
+        bash_command=(
+            f'cd {DBT_PROJECT_DIR} && rm -f {DBT_RUN_TARGET_PATH}/run_results.json && '
+            f'DBT_PROFILES_DIR={DBT_PROFILES_DIR} dbt run --target {DBT_TARGET} --target-path {DBT_RUN_TARGET_PATH} '
+            + DBT_SELECTION_ARGS
+        ),
         env={
             'DBT_PROFILES_DIR': DBT_PROFILES_DIR,
             'DBT_TARGET': DBT_TARGET,
-            'EXECUTION_DATE': '{{ ds }}'
+            # Data mais recente entre as partições carregadas pelo ETL
+            'EXECUTION_DATE': "{{ ti.xcom_pull(task_ids='check_flights_data', key='flight_dates') | last }}"
         },
         dag=dag
     )
     
-    # Execução dos testes dbt
+    # Execução dos testes dbt, apenas sobre os modelos reconstruídos.
+    # Testes reprovados não falham a tarefa: a decisão fica com check_test_results,
+    # a partir do run_results.json (removido antes, para não ler o de uma execução anterior)
     dbt_test = BashOperator(
         task_id='dbt_test',
-        bash_command=f'cd {DBT_PROJECT_DIR} && DBT_PROFILES_DIR={DBT_PROFILES_DIR} dbt test --target {DBT_TARGET} --models tag:daily',
+        bash_command=(
+            f'cd {DBT_PROJECT_DIR} && rm -f {DBT_TEST_TARGET_PATH}/run_results.json && '
+            f'(DBT_PROFILES_DIR={DBT_PROFILES_DIR} dbt test --target {DBT_TARGET} --target-path {DBT_TEST_TARGET_PATH} '
+            + DBT_SELECTION_ARGS + ' || echo "dbt test terminou com falhas")'
+        ),
         env={
             'DBT_PROFILES_DIR': DBT_PROFILES_DIR,
             'DBT_TARGET': DBT_TARGET
@@ -192,6 +363,14 @@ with TaskGroup(group_id='dbt_tasks', dag=dag) as dbt_tasks:
         dag=dag
     )
     
+    # Estado para a próxima seleção state:modified+
+    save_state = PythonOperator(
+        task_id='save_dbt_state',
+        python_callable=save_dbt_state,
+        provide_context=True,
+        dag=dag
+    )
+    
     # Geração de documentação
     generate_docs = BashOperator(
         task_id='generate_docs',
@@ -203,11 +382,12 @@ with TaskGroup(group_id='dbt_tasks', dag=dag) as dbt_tasks:
         dag=dag
     )
     
-    # Processamento dos resultados
+    # Processamento dos resultados do dbt run (também quando ele falha)
     process_results = PythonOperator(
         task_id='process_results',
         python_callable=log_run_results,
         provide_context=True,
+        trigger_rule=TriggerRule.NONE_SKIPPED,
         dag=dag
     )
     
@@ -227,10 +407,10 @@ with TaskGroup(group_id='dbt_tasks', dag=dag) as dbt_tasks:
     )
     
     # Definição de dependências dentro do grupo
-    dbt_run >> dbt_test >> check_tests
-    check_tests >> generate_docs >> process_docs >> process_results
+    select_models >> dbt_run >> dbt_test >> check_tests
+    dbt_run >> process_results
+    check_tests >> save_state >> generate_docs >> process_docs
     check_tests >> test_failure
 
 # Definição de dependências do DAG
-wait_for_etl >> check_data
 check_data >> [no_data, dbt_tasks]
@@ -13,14 +13,26 @@ from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.providers.http.sensors.http import HttpSensor
 from airflow.providers.http.operators.http import SimpleHttpOperator
-from airflow.providers.postgres.hooks.postgres import PostgresHook
 from airflow.providers.postgres.operators.postgres import PostgresOperator
 from airflow.models import Variable
 import json
 import requests
 import pandas as pd
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from flights_extractor import write_partitioned_ndjson
+from flights_normalizer import normalize_flight_files, write_processed_tables, read_processed_table
+from bulk_loader import copy_upsert, DEFAULT_CHUNK_SIZE
+from page_fetcher import fetch_pages, PageCheckpoint, DEFAULT_MAX_WORKERS, DEFAULT_RATE
+from flights_datasets import RAW_FLIGHTS_DATASET
+from pipeline_metrics import instrumented, track_stage, current_stage
+from connection_pool import pooled_connection
+from task_profiler import profiled
+from table_partitions import ensure_partitions, target_table, maintain_partitions, DEFAULT_PREMAKE_PERIODS
+
 # Definição dos argumentos default
 default_args = {
     'owner': 'data_engineering',
@@ -43,34 +55,95 @@ dag = DAG(
     schedule_interval='@daily',
     catchup=False,
     max_active_runs=1,
+    params={
+        # Executa o processamento e a carga sob o profiler (plugins/task_profiler.py)
+        'profile': False
+    },
     doc_md=__doc__
 )
 
+# Diretório compartilhado onde as páginas extraídas da API são gravadas
+FLIGHTS_LANDING_DIR = '/opt/airflow/data/flights'
+
+# Tamanho de página suportado pela API
+API_PAGE_LIMIT = 100
+
+# raw_flights é particionada por mês de flight_date
+RAW_FLIGHTS_TABLE = 'raw_flights'
+
+# Colunas carregadas em raw_flights
+RAW_FLIGHTS_COLUMNS = [
+    'flight_date', 'flight_status', 'flight_number', 'flight_iata', 'flight_icao',
+    'airline_iata', 'departure_airport_iata', 'arrival_airport_iata',
+    'departure_scheduled', 'departure_actual', 'departure_delay',
+    'arrival_scheduled', 'arrival_actual', 'arrival_estimated', 'arrival_delay',
+    'aircraft_registration', 'aircraft_model', 'extracted_date'
+]
+
 # Funções auxiliares
-def fetch_flights_data(**context):
+def _prepare_flight_partitions(flight_dates, context):
+    """
+    Cria as partições de raw_flights para as datas da carga, em uma
+    transação curta e separada da carga, e retorna a tabela de destino do
+    upsert: a própria partição quando todas as datas caem no mesmo mês.
+    """
+    with track_stage('prepare_partitions'), pooled_connection('postgres_flights', context) as conn:
+        created = ensure_partitions(conn, RAW_FLIGHTS_TABLE, flight_dates)
+        conn.commit()
+    if created:
+        print(f"Partições criadas: {', '.join(created)}")
+    return target_table(RAW_FLIGHTS_TABLE, flight_dates)
+
+def _record_load_manifest(conn, flights):
     """
-    Extrai dados da API de voos e os retorna como JSON.
+    Registra em raw_flights_load_manifest quantos voos cada data recebeu na
+    carga, na mesma transação do upsert. O DAG do dbt consulta o manifesto
+    para decidir se há dados, sem varrer raw_flights.
+    """
+    counts = flights.groupby('flight_date').size()
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            """
+            INSERT INTO raw_flights_load_manifest (flight_date, flights_count, loaded_at)
+            VALUES (%s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (flight_date) DO UPDATE
+            SET flights_count = EXCLUDED.flights_count,
+                loaded_at = EXCLUDED.loaded_at
+            """,
+            [(str(flight_date), int(count)) for flight_date, count in counts.items()]
+        )
+
+def _fetch_flights_page(flight_date, offset, limit):
+    """
+    Busca uma página de voos da API.
     """
     # Em um ambiente real, usaríamos uma API key armazenada no Airflow Variables
     # api_key = Variable.get("aviation_api_key")
     
     # Para simulação, usaremos dados fictícios
     # Num ambiente real:
-    # url = f"http://api.aviationstack.com/v1/flights?access_key={api_key}"
-    # response = requests.get(url)
-    # data = response.json()
+    # from page_fetcher import http_page_fetcher
+    # fetch_page = http_page_fetcher(
+    #     "http://api.aviationstack.com/v1/flights",
+    #     params={'access_key': api_key, 'flight_date': flight_date}
+    # )
+    # return fetch_page(offset, limit)
+    
+    # A simulação possui apenas uma página de dados
+    if offset > 0:
+        return {"pagination": {"limit": limit, "offset": offset, "count": 0, "total": 2}, "data": []}, {}
     
     # Dados simulados
     data = {
         "pagination": {
-            "limit": 100,
-            "offset": 0,
-            "count": 100,
-            "total": 324526
+            "limit": limit,
+            "offset": offset,
+            "count": 2,
+            "total": 2
         },
         "data": [
             {
-                "flight_date": context['ds'],
+                "flight_date": flight_date,
                 "flight_status": "active",
                 "departure": {
                     "airport": "San Francisco International",
@@ -108,7 +181,7 @@ def fetch_flights_data(**context):
                 }
             },
             {
-                "flight_date": context['ds'],
+                "flight_date": flight_date,
                 "flight_status": "landed",
                 "departure": {
                     "airport": "Los Angeles International",
@@ -148,236 +221,236 @@ def fetch_flights_data(**context):
         ]
     }
     
-    print(f"Extraídos {len(data['data'])} voos para a data {context['ds']}")
+    return data, {}
+
+@instrumented()
+def fetch_flights_data(**context):
+    """
+    Extrai os dados da API de voos, buscando as páginas concorrentemente,
+    e os grava em arquivos NDJSON particionados por data. Retorna apenas o
+    manifesto dos arquivos.
+    
+    As páginas já buscadas ficam em checkpoint até o fim da tarefa, de modo
+    que uma retentativa só busca as páginas que faltam.
+    """
+    flight_date = context['ds']
+    landing_dir = Variable.get("flights_landing_dir", default_var=FLIGHTS_LANDING_DIR)
+    output_dir = os.path.join(landing_dir, f"flight_date={flight_date}")
+    checkpoint_dir = os.path.join(output_dir, '_checkpoint')
+    
+    pages = fetch_pages(
+        lambda offset, limit: _fetch_flights_page(flight_date, offset, limit),
+        limit=API_PAGE_LIMIT,
+        max_workers=int(Variable.get("aviation_api_max_workers", default_var=DEFAULT_MAX_WORKERS)),
+        rate=float(Variable.get("aviation_api_rate_limit", default_var=DEFAULT_RATE)),
+        checkpoint_dir=checkpoint_dir,
+        on_retry=lambda: current_stage().add_retries()
+    )
+    manifest = write_partitioned_ndjson(pages, output_dir)
+    PageCheckpoint(checkpoint_dir).clear()
+    current_stage().add_rows(manifest['rows'])
+    current_stage().add_bytes_written(manifest['bytes'])
+    
+    print(f"Extraídos {manifest['rows']} voos para a data {flight_date} "
+          f"em {len(manifest['files'])} arquivo(s), {manifest['bytes']} bytes")
     
-    return data
+    return manifest
 
+@instrumented()
+@profiled()
 def process_flights_data(**context):
     """
     Transforma os dados de voos para formatos adequados para o banco de dados.
+    
+    A normalização é colunar: voos, aeroportos e companhias aéreas são
+    produzidos em uma única passada sobre os arquivos extraídos e gravados
+    em Parquet ao lado da partição de origem.
     """
-    # Recupera os dados extraídos da tarefa anterior
+    # Recupera o manifesto dos arquivos extraídos na tarefa anterior
     ti = context['ti']
-    data = ti.xcom_pull(task_ids='fetch_flights_data')
-    
-    # Processamento dos voos
-    processed_flights = []
-    processed_airports = []
-    processed_airlines = []
-    
-    unique_airports = {}
-    unique_airlines = {}
+    manifest = ti.xcom_pull(task_ids='fetch_flights_data')
     
     # Execução em data de simulação
     execution_date = context['ds']
     
-    for flight in data['data']:
-        # Processar dados de aeroporto de partida
-        if flight['departure']['iata'] not in unique_airports:
-            unique_airports[flight['departure']['iata']] = {
-                'iata_code': flight['departure']['iata'],
-                'icao_code': flight['departure']['icao'],
-                'name': flight['departure']['airport'],
-                'timezone': flight['departure']['timezone']
-            }
-        
-        # Processar dados de aeroporto de chegada
-        if flight['arrival']['iata'] not in unique_airports:
-            unique_airports[flight['arrival']['iata']] = {
-                'iata_code': flight['arrival']['iata'],
-                'icao_code': flight['arrival']['icao'],
-                'name': flight['arrival']['airport'],
-                'timezone': flight['arrival']['timezone']
-            }
-        
-        # Processar dados de companhia aérea
-        if flight['airline']['iata'] not in unique_airlines:
-            unique_airlines[flight['airline']['iata']] = {
-                'iata_code': flight['airline']['iata'],
-                'icao_code': flight['airline']['icao'],
-                'name': flight['airline']['name']
-            }
-        
-        # Processar dados do voo
-        processed_flight = {
-            'flight_date': flight['flight_date'],
-            'flight_status': flight['flight_status'],
-            'flight_number': flight['flight']['number'],
-            'flight_iata': flight['flight']['iata'],
-            'flight_icao': flight['flight']['icao'],
-            'airline_iata': flight['airline']['iata'],
-            'departure_airport_iata': flight['departure']['iata'],
-            'arrival_airport_iata': flight['arrival']['iata'],
-            'departure_scheduled': flight['departure']['scheduled'],
-            'departure_actual': flight['departure'].get('actual', None),
-            'departure_delay': flight['departure'].get('delay', 0),
-            'arrival_scheduled': flight['arrival']['scheduled'],
-            'arrival_actual': flight['arrival'].get('actual', None),
-            'arrival_estimated': flight['arrival'].get('estimated', None),
-            'arrival_delay': flight['arrival'].get('delay', 0),
-            'aircraft_registration': flight['aircraft'].get('registration', None),
-            'aircraft_model': flight['aircraft'].get('model', None),
-            'extracted_date': execution_date
-        }
-        
-        processed_flights.append(processed_flight)
-    
-    # Converter dicionários em listas
-    for airport_iata, airport_data in unique_airports.items():
-        processed_airports.append(airport_data)
-    
-    for airline_iata, airline_data in unique_airlines.items():
-        processed_airlines.append(airline_data)
+    flights, airports, airlines = normalize_flight_files(
+        [file_info['path'] for file_info in manifest['files']],
+        extracted_date=execution_date
+    )
     
     # Armazenar resultados processados
-    context['ti'].xcom_push(key='processed_flights', value=processed_flights)
-    context['ti'].xcom_push(key='processed_airports', value=processed_airports)
-    context['ti'].xcom_push(key='processed_airlines', value=processed_airlines)
+    tables = write_processed_tables(
+        os.path.join(manifest['output_dir'], 'processed'),
+        {'flights': flights, 'airports': airports, 'airlines': airlines}
+    )
+    
+    stage = current_stage()
+    stage.add_rows(len(flights))
+    for file_info in manifest['files']:
+        stage.add_file_read(file_info['path'])
+    for path in tables.values():
+        stage.add_file_written(path)
     
     return {
-        'flights_count': len(processed_flights),
-        'airports_count': len(processed_airports),
-        'airlines_count': len(processed_airlines)
+        'flights_count': len(flights),
+        'airports_count': len(airports),
+        'airlines_count': len(airlines),
+        'tables': tables
     }
 
+@instrumented()
+@profiled()
 def load_flights_to_postgres(**context):
     """
     Carrega os dados processados no PostgreSQL.
+    
+    Cada tabela é carregada via COPY para staging + upsert set-based; os
+    voos vão direto para a partição do mês quando a carga cabe em uma só.
+    As dimensões (aeroportos e companhias aéreas) são carregadas em paralelo,
+    em conexões de um pool, antes da tabela fato de voos. Junto com os voos,
+    na mesma transação, é gravado o manifesto de carga por data.
+    
+    O retorno (partição carregada e contagens) acompanha o evento do
+    dataset `RAW_FLIGHTS_DATASET`, que dispara o DAG do dbt.
     """
     ti = context['ti']
     processed_data = ti.xcom_pull(task_ids='process_flights_data')
     
     # Recuperar dados processados
-    processed_flights = ti.xcom_pull(key='processed_flights')
-    processed_airports = ti.xcom_pull(key='processed_airports')
-    processed_airlines = ti.xcom_pull(key='processed_airlines')
+    processed_flights = read_processed_table(processed_data['tables']['flights'])
+    processed_airports = read_processed_table(processed_data['tables']['airports'])
+    processed_airlines = read_processed_table(processed_data['tables']['airlines'])
+    for path in processed_data['tables'].values():
+        current_stage().add_file_read(path)
+    
+    # flight_date é a chave de partição; voos sem data pertencem à data consultada na API
+    processed_flights['flight_date'] = processed_flights['flight_date'].fillna(context['ds'])
     
-    # Conectar ao PostgreSQL
-    pg_hook = PostgresHook(postgres_conn_id='postgres_flights')
+    chunk_size = int(Variable.get("bulk_load_chunk_size", default_var=DEFAULT_CHUNK_SIZE))
+    flights_table = RAW_FLIGHTS_TABLE
+    if not processed_flights.empty:
+        flights_table = _prepare_flight_partitions(processed_flights['flight_date'].unique(), context)
     
     # Funções para inserir registros
-    def insert_flights(hook, flights):
-        if not flights:
+    def insert_flights(conn, flights):
+        if flights.empty:
             return 0
         
-        rows = []
-        for flight in flights:
-            rows.append(
-                (
-                    flight['flight_date'], 
-                    flight['flight_status'],
-                    flight['flight_number'],
-                    flight['flight_iata'],
-                    flight['flight_icao'],
-                    flight['airline_iata'],
-                    flight['departure_airport_iata'],
-                    flight['arrival_airport_iata'],
-                    flight['departure_scheduled'],
-                    flight['departure_actual'],
-                    flight['departure_delay'],
-                    flight['arrival_scheduled'],
-                    flight['arrival_actual'],
-                    flight['arrival_estimated'],
-                    flight['arrival_delay'],
-                    flight['aircraft_registration'],
-                    flight['aircraft_model'],
-                    flight['extracted_date']
-                )
-            )
-        
-        # Preparar query
-        insert_query = """
-        INSERT INTO raw_flights (
-            flight_date, flight_status, flight_number, flight_iata, flight_icao,
-            airline_iata, departure_airport_iata, arrival_airport_iata,
-            departure_scheduled, departure_actual, departure_delay,
-            arrival_scheduled, arrival_actual, arrival_estimated, arrival_delay,
-            aircraft_registration, aircraft_model, extracted_date
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (flight_iata, departure_scheduled) 
-        DO UPDATE SET
-            flight_status = EXCLUDED.flight_status,
-            departure_actual = EXCLUDED.departure_actual,
-            departure_delay = EXCLUDED.departure_delay,
-            arrival_actual = EXCLUDED.arrival_actual,
-            arrival_estimated = EXCLUDED.arrival_estimated,
-            arrival_delay = EXCLUDED.arrival_delay
-        """
-        
-        # Executar em batch
-        hook.insert_rows(table='raw_flights', rows=rows, target_fields=None, commit_every=100, replace=False)
-        
-        return len(rows)
+        _record_load_manifest(conn, flights)
+        return copy_upsert(
+            conn,
+            table=flights_table,
+            columns=RAW_FLIGHTS_COLUMNS,
+            conflict_columns=['flight_iata', 'departure_scheduled', 'flight_date'],
+            update_columns=[
+                'flight_status', 'departure_actual', 'departure_delay',
+                'arrival_actual', 'arrival_estimated', 'arrival_delay'
+            ],
+            records=flights[RAW_FLIGHTS_COLUMNS].itertuples(index=False, name=None),
+            chunk_size=chunk_size
+        )
     
-    def insert_airports(hook, airports):
-        if not airports:
+    def insert_airports(conn, airports):
+        if airports.empty:
             return 0
         
-        rows = []
-        for airport in airports:
-            rows.append(
-                (
-                    airport['iata_code'],
-                    airport['icao_code'],
-                    airport['name'],
-                    airport['timezone']
-                )
-            )
-        
-        # Preparar query
-        insert_query = """
-        INSERT INTO raw_airports (iata_code, icao_code, name, timezone)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (iata_code) 
-        DO UPDATE SET
-            name = EXCLUDED.name,
-            timezone = EXCLUDED.timezone
-        """
-        
-        # Executar em batch
-        hook.insert_rows(table='raw_airports', rows=rows, target_fields=None, commit_every=100, replace=False)
-        
-        return len(rows)
+        columns = ['iata_code', 'icao_code', 'name', 'timezone']
+        return copy_upsert(
+            conn,
+            table='raw_airports',
+            columns=columns,
+            conflict_columns=['iata_code'],
+            update_columns=['name', 'timezone'],
+            records=airports[columns].itertuples(index=False, name=None),
+            chunk_size=chunk_size
+        )
     
-    def insert_airlines(hook, airlines):
-        if not airlines:
+    def insert_airlines(conn, airlines):
+        if airlines.empty:
             return 0
         
-        rows = []
-        for airline in airlines:
-            rows.append(
-                (
-                    airline['iata_code'],
-                    airline['icao_code'],
-                    airline['name']
-                )
-            )
-        
-        # Preparar query
-        insert_query = """
-        INSERT INTO raw_airlines (iata_code, icao_code, name)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (iata_code) 
-        DO UPDATE SET
-            name = EXCLUDED.name
-        """
-        
-        # Executar em batch
-        hook.insert_rows(table='raw_airlines', rows=rows, target_fields=None, commit_every=100, replace=False)
-        
-        return len(rows)
+        columns = ['iata_code', 'icao_code', 'name']
+        return copy_upsert(
+            conn,
+            table='raw_airlines',
+            columns=columns,
+            conflict_columns=['iata_code'],
+            update_columns=['name'],
+            records=airlines[columns].itertuples(index=False, name=None),
+            chunk_size=chunk_size
+        )
+    
+    # Uma conexão do pool do DAG por carga concorrente de dimensão; a das
+    # partições e as das dimensões são reaproveitadas pela tabela fato
+    def run_load(insert_fn, frame):
+        with pooled_connection('postgres_flights', context) as conn:
+            try:
+                with track_stage(insert_fn.__name__) as stage:
+                    start = time.perf_counter()
+                    inserted = insert_fn(conn, frame)
+                    conn.commit()
+                    stage.add_rows(inserted)
+                return inserted, round(time.perf_counter() - start, 3)
+            except Exception:
+                conn.rollback()
+                raise
+    
+    # Executar inserções: dimensões em paralelo, depois a tabela fato
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        airports_future = executor.submit(run_load, insert_airports, processed_airports)
+        airlines_future = executor.submit(run_load, insert_airlines, processed_airlines)
+        airports_inserted, airports_seconds = airports_future.result()
+        airlines_inserted, airlines_seconds = airlines_future.result()
     
-    # Executar inserções
-    flights_inserted = insert_flights(pg_hook, processed_flights)
-    airports_inserted = insert_airports(pg_hook, processed_airports)
-    airlines_inserted = insert_airlines(pg_hook, processed_airlines)
+    flights_inserted, flights_seconds = run_load(insert_flights, processed_flights)
+    current_stage().add_rows(flights_inserted + airports_inserted + airlines_inserted)
+    
+    print(f"Carga concluída: {flights_inserted} voos em {flights_seconds}s, "
+          f"{airports_inserted} aeroportos em {airports_seconds}s, "
+          f"{airlines_inserted} companhias em {airlines_seconds}s")
     
     return {
+        'flight_date': context['ds'],
         'flights_inserted': flights_inserted,
         'airports_inserted': airports_inserted,
-        'airlines_inserted': airlines_inserted
+        'airlines_inserted': airlines_inserted,
+        'timings_seconds': {
+            'raw_flights': flights_seconds,
+            'raw_airports': airports_seconds,
+            'raw_airlines': airlines_seconds
+        }
     }
 
+def manage_partitions(**context):
+    """
+    Manutenção das partições de raw_flights: migra uma tabela anterior não
+    particionada, cria as partições do mês corrente e dos próximos
+    (Variable `partition_premake_months`) e, se a Variable
+    `raw_flights_retention_months` estiver definida, arquiva no schema
+    `archive` as partições mais antigas que a retenção.
+    """
+    retention = Variable.get("raw_flights_retention_months", default_var=None)
+    
+    with pooled_connection('postgres_flights', context) as conn:
+        try:
+            result = maintain_partitions(
+                conn,
+                RAW_FLIGHTS_TABLE,
+                'flight_date',
+                context['execution_date'],
+                premake=int(Variable.get("partition_premake_months", default_var=DEFAULT_PREMAKE_PERIODS)),
+                retention=int(retention) if retention else None
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    print(f"Linhas migradas da tabela não particionada: {result['migrated_rows']}")
+    print(f"Partições criadas: {', '.join(result['created']) or 'nenhuma'}")
+    print(f"Partições arquivadas: {', '.join(result['archived']) or 'nenhuma'}")
+    return result
+
 # Definição das tarefas
 create_tables = PostgresOperator(
     task_id='create_tables',
@@ -402,10 +475,23 @@ create_tables = PostgresOperator(
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
     
-    -- Tabela de voos
+    -- Uma raw_flights anterior, não particionada, é renomeada para ser
+    -- migrada pela tarefa manage_partitions; seus índices nomeados são
+    -- removidos para que os nomes sejam recriados na tabela particionada
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('raw_flights') AND relkind = 'r') THEN
+            ALTER TABLE raw_flights RENAME TO raw_flights_unpartitioned;
+            DROP INDEX IF EXISTS idx_flights_date, idx_flights_airline,
+                idx_flights_departure, idx_flights_arrival;
+        END IF;
+    END $$;
+    
+    -- Tabela de voos, particionada por mês de flight_date; as partições são
+    -- criadas por manage_partitions e pela carga
     CREATE TABLE IF NOT EXISTS raw_flights (
-        id SERIAL PRIMARY KEY,
-        flight_date DATE,
+        id SERIAL,
+        flight_date DATE NOT NULL,
         flight_status VARCHAR(50),
         flight_number VARCHAR(20),
         flight_iata VARCHAR(20),
@@ -424,18 +510,34 @@ create_tables = PostgresOperator(
         aircraft_model VARCHAR(100),
         extracted_date DATE,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        UNIQUE(flight_iata, departure_scheduled)
-    );
+        PRIMARY KEY (id, flight_date),
+        UNIQUE(flight_iata, departure_scheduled, flight_date)
+    ) PARTITION BY RANGE (flight_date);
     
-    -- Índices para melhorar performance de queries
+    -- Índices para melhorar performance de queries (valem para todas as partições)
     CREATE INDEX IF NOT EXISTS idx_flights_date ON raw_flights(flight_date);
     CREATE INDEX IF NOT EXISTS idx_flights_airline ON raw_flights(airline_iata);
     CREATE INDEX IF NOT EXISTS idx_flights_departure ON raw_flights(departure_airport_iata);
     CREATE INDEX IF NOT EXISTS idx_flights_arrival ON raw_flights(arrival_airport_iata);
+    
+    -- Manifesto de carga: voos recebidos por data na última carga
+    CREATE TABLE IF NOT EXISTS raw_flights_load_manifest (
+        flight_date DATE PRIMARY KEY,
+        flights_count INT NOT NULL,
+        loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
     """,
     dag=dag
 )
 
+# Migrar/criar/arquivar partições de raw_flights
+manage_partitions = PythonOperator(
+    task_id='manage_partitions',
+    python_callable=manage_partitions,
+    provide_context=True,
+    dag=dag
+)
+
 check_api = HttpSensor(
     task_id='check_api',
     http_conn_id='aviation_api',
@@ -461,14 +563,16 @@ process_flights_data = PythonOperator(
     dag=dag
 )
 
+# Ao concluir, publica o dataset raw_flights, que dispara o DAG do dbt
 load_flights_to_postgres = PythonOperator(
     task_id='load_flights_to_postgres',
     python_callable=load_flights_to_postgres,
     provide_context=True,
+    outlets=[RAW_FLIGHTS_DATASET],
     dag=dag
 )
 
 # Definição das dependências
 # A task de verificação da API é desativada em ambiente de desenvolvimento
 # check_api >> fetch_flights_data >> process_flights_data >> load_flights_to_postgres
-create_tables >> fetch_flights_data >> process_flights_data >> load_flights_to_postgres
+create_tables >> manage_partitions >> fetch_flights_data >> process_flights_data >> load_flights_to_postgres
@@ -0,0 +1,130 @@
+"""
+## Bulk Loader para PostgreSQL
+
+Carga em massa baseada em COPY FROM STDIN: os registros são transmitidos
+em blocos para uma tabela temporária de staging e, em seguida, mesclados
+na tabela final com um único INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+
+Substitui o padrão `cursor.executemany` com INSERT por linha, que faz uma
+ida e volta ao banco para cada registro.
+"""
+
+import csv
+import io
+from itertools import islice
+
+# Quantidade padrão de registros enviados por comando COPY
+DEFAULT_CHUNK_SIZE = 50000
+
+# Coluna do staging com a ordem de chegada das linhas (desempate do DISTINCT ON)
+STAGING_ORDER_COLUMN = '_load_order'
+
+
+def _chunked(records, chunk_size):
+    """
+    Divide um iterável de registros em blocos de até `chunk_size` itens,
+    sem materializar a sequência completa em memória.
+    """
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _to_csv_buffer(rows):
+    """
+    Serializa um bloco de tuplas em um buffer CSV pronto para o COPY.
+    Valores None são escritos como campo vazio, interpretado como NULL.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerows(rows)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_upsert(conn, table, columns, conflict_columns, records,
+                update_columns=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                hash_columns=None, hash_column='row_hash'):
+    """
+    Carrega `records` em `table` via COPY para staging + merge set-based.
+
+    - `columns`: ordem das colunas em cada tupla de `records`
+    - `conflict_columns`: chave única usada no ON CONFLICT
+    - `update_columns`: colunas atualizadas em caso de conflito
+      (por padrão, todas as colunas fora da chave)
+    - `chunk_size`: registros por comando COPY, limitando o uso de memória
+    - `hash_columns`: se informado, grava em `hash_column` um md5 do
+      conteúdo dessas colunas e só atualiza as linhas cujo hash mudou;
+      linhas inalteradas não geram nenhuma escrita
+
+    A função não faz commit; o controle da transação fica com o chamador.
+    Retorna a quantidade de registros enviados ao staging.
+    """
+    if update_columns is None:
+        update_columns = [col for col in columns if col not in conflict_columns]
+
+    staging_table = f"_staging_{table}"
+    column_list = ", ".join(columns)
+    conflict_list = ", ".join(conflict_columns)
+
+    cursor = conn.cursor()
+    try:
+        # Tabela temporária com a mesma estrutura das colunas carregadas,
+        # descartada automaticamente ao final da transação. pg_temp garante
+        # que só uma sobra temporária é removida, nunca uma tabela permanente
+        cursor.execute(f"DROP TABLE IF EXISTS pg_temp.{staging_table}")
+        cursor.execute(f"""
+            CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+            SELECT {column_list} FROM {table} WITH NO DATA
+        """)
+        # Ordem das linhas no COPY, para desempatar registros repetidos da chave
+        cursor.execute(
+            f"ALTER TABLE {staging_table} ADD COLUMN {STAGING_ORDER_COLUMN} BIGINT GENERATED ALWAYS AS IDENTITY"
+        )
+
+        copy_sql = f"COPY {staging_table} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+        total_records = 0
+        for chunk in _chunked(records, chunk_size):
+            cursor.copy_expert(copy_sql, _to_csv_buffer(chunk))
+            total_records += len(chunk)
+
+        if total_records == 0:
+            return 0
+
+        insert_columns = list(columns)
+        select_list = column_list
+        if hash_columns:
+            insert_columns.append(hash_column)
+            update_columns = list(update_columns) + [hash_column]
+            select_list += f", md5(ROW({', '.join(hash_columns)})::text)"
+
+        if update_columns:
+            update_clause = "DO UPDATE SET " + ", ".join(
+                f"{col} = EXCLUDED.{col}" for col in update_columns
+            )
+            if hash_columns:
+                update_clause += f" WHERE {table}.{hash_column} IS DISTINCT FROM EXCLUDED.{hash_column}"
+        else:
+            update_clause = "DO NOTHING"
+
+        # DISTINCT ON evita que o mesmo registro apareça duas vezes no
+        # mesmo comando, o que o ON CONFLICT DO UPDATE não permite; entre
+        # repetições, fica a última linha do lote
+        cursor.execute(f"""
+            INSERT INTO {table} ({", ".join(insert_columns)})
+            SELECT DISTINCT ON ({conflict_list}) {select_list}
+            FROM {staging_table}
+            ORDER BY {conflict_list}, {STAGING_ORDER_COLUMN} DESC
+            ON CONFLICT ({conflict_list})
+            {update_clause}
+        """)
+
+        print(f"{table}: {total_records} registros enviados, "
+              f"{cursor.rowcount} inseridos ou atualizados")
+
+        return total_records
+    finally:
+        cursor.close()
@@ -0,0 +1,243 @@
+"""
+## Pool de conexões Postgres das tarefas
+
+Provedor de conexões para os callables que acessam o Postgres. Em vez de
+abrir e fechar uma conexão (TCP, autenticação e SSL) a cada etapa, as
+conexões devolvidas ficam ociosas no pool do processo e são reaproveitadas
+pela próxima etapa ou thread da mesma tarefa.
+
+Uso:
+
+    with pooled_connection('postgres_pipeline', context) as conn:
+        ...
+        conn.commit()
+
+- um pool por conexão do Airflow e DAG, com até `size` conexões abertas
+  ao mesmo tempo; quem pede uma conexão com o pool cheio espera até
+  `postgres_pool_timeout` segundos
+- tamanho por DAG na Variable `postgres_pool_sizes` (JSON, ex.:
+  `{"financial_data_backfill": 2, "default": 4}`)
+- verificação de saúde na retirada: conexões fechadas ou em estado
+  inconsistente são descartadas, e as ociosas há mais de
+  `postgres_pool_health_check_seconds` passam por um `SELECT 1`
+- na devolução, transações não confirmadas são desfeitas (como no
+  `close()`) e o `autocommit` volta ao padrão
+- as conexões entregues são instrumentadas (`pipeline_metrics`): comandos
+  contados e cronometrados por tipo, e a espera pelo pool registrada em
+  `pipeline_db_pool_wait_seconds`
+
+O pool vive no processo da tarefa e não é compartilhado entre tarefas:
+cada instância de tarefa roda em um processo próprio e abre as suas
+conexões, fechadas ao final do processo. O ganho está nas tarefas com
+várias etapas ou threads no banco. Entre processos, o limite de conexões
+abertas por um DAG é o tamanho do pool vezes as instâncias simultâneas
+(ex.: `max_active_tis_per_dag` das tarefas mapeadas do backfill), o que
+a Variable permite ajustar por DAG abaixo de `max_connections`.
+Reaproveitar conexões entre tarefas exigiria um pooler externo (ex.:
+PgBouncer) entre o Airflow e o Postgres.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from pipeline_metrics import instrument_connection, observe
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CHECKOUT_TIMEOUT = 60  # segundos
+DEFAULT_HEALTH_CHECK_SECONDS = 30  # ociosidade a partir da qual a conexão é testada
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_idle(conn):
+    import psycopg2.extensions
+
+    return conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class ConnectionPool:
+    """
+    Pool limitado de conexões DB-API criadas por `connect()`, seguro entre
+    threads. Mantém também as contagens de conexões abertas, reaproveitadas
+    e descartadas.
+    """
+
+    def __init__(self, connect, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_CHECKOUT_TIMEOUT,
+                 health_check_seconds=DEFAULT_HEALTH_CHECK_SECONDS, name='postgres'):
+        self.connect = connect
+        self.size = max(int(size), 1)
+        self.timeout = timeout
+        self.health_check_seconds = health_check_seconds
+        self.name = name
+        self.stats = {'opened': 0, 'reused': 0, 'discarded': 0}
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+
+    def _healthy(self, conn, idle_since):
+        if conn.closed or not _is_idle(conn):
+            return False
+        if time.monotonic() - idle_since < self.health_check_seconds:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                conn = self.connect()
+                with self._lock:
+                    self.stats['opened'] += 1
+                return conn
+            conn, idle_since = item
+            if self._healthy(conn, idle_since):
+                with self._lock:
+                    self.stats['reused'] += 1
+                return conn
+            with self._lock:
+                self.stats['discarded'] += 1
+            _close_quietly(conn)
+
+    def getconn(self):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f"Nenhuma conexão livre no pool {self.name} ({self.size} conexões) após {self.timeout}s"
+            )
+        observe('pipeline_db_pool_wait_seconds', time.perf_counter() - start, pool=self.name)
+        try:
+            return self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            if conn.closed:
+                with self._lock:
+                    self.stats['discarded'] += 1
+                return
+            if not _is_idle(conn):
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        except Exception:
+            # Conexão quebrada (ex.: servidor reiniciado): não volta ao pool
+            with self._lock:
+                self.stats['discarded'] += 1
+            _close_quietly(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+
+# Pools do processo, por (conn_id, dag_id). Um processo criado por fork
+# (ex.: o executor do Airflow) não pode usar as conexões do processo pai:
+# os pools herdados são abandonados sem fechar os sockets compartilhados.
+_pools = {}
+_inherited = []
+_pools_lock = threading.Lock()
+_pid = os.getpid()
+
+
+def pool_size(dag_id, sizes):
+    """
+    Tamanho do pool de um DAG: `sizes[dag_id]`, `sizes['default']` ou
+    DEFAULT_POOL_SIZE. `sizes` pode ser um dict ou o JSON da Variable.
+    """
+    if isinstance(sizes, str):
+        sizes = json.loads(sizes) if sizes.strip() else {}
+    sizes = sizes or {}
+    return int(sizes.get(dag_id, sizes.get('default', DEFAULT_POOL_SIZE)))
+
+
+def _settings(dag_id):
+    from airflow.models import Variable
+    return {
+        'size': pool_size(dag_id, Variable.get("postgres_pool_sizes", default_var='{}')),
+        'timeout': float(Variable.get("postgres_pool_timeout", default_var=DEFAULT_CHECKOUT_TIMEOUT)),
+        'health_check_seconds': float(
+            Variable.get("postgres_pool_health_check_seconds", default_var=DEFAULT_HEALTH_CHECK_SECONDS)
+        ),
+    }
+
+
+def _hook_connect(conn_id):
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    return PostgresHook(postgres_conn_id=conn_id).get_conn
+
+
+def get_pool(conn_id, dag_id=None, settings=_settings, connect=None):
+    """
+    Pool da conexão `conn_id` para o DAG, criado na primeira chamada do
+    processo. `connect` substitui o `PostgresHook(conn_id).get_conn`.
+    """
+    global _pid
+    key = (conn_id, dag_id)
+    with _pools_lock:
+        if os.getpid() != _pid:
+            _inherited.extend(_pools.values())
+            _pools.clear()
+            _pid = os.getpid()
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                connect or _hook_connect(conn_id),
+                name=f"{conn_id}/{dag_id}" if dag_id else conn_id,
+                **settings(dag_id)
+            )
+        return _pools[key]
+
+
+@contextmanager
+def pooled_connection(conn_id, context=None):
+    """
+    Conexão instrumentada do pool de `conn_id` para o DAG da tarefa em
+    `context`, devolvida ao pool ao final do bloco.
+    """
+    dag_id = getattr((context or {}).get('ti'), 'dag_id', None)
+    with get_pool(conn_id, dag_id).connection() as conn:
+        yield instrument_connection(conn)
+
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values()) if os.getpid() == _pid else []
+    for pool in pools:
+        pool.closeall()
@@ -0,0 +1,197 @@
+"""
+## Artefatos do dbt: tempos por modelo e histórico
+
+Lê o `run_results.json` de um `dbt run`/`dbt test` junto com o
+`manifest.json` da mesma execução e extrai, para cada nó executado
+(modelo, teste, seed, snapshot), o status, o tempo de execução e as linhas
+afetadas. Os resultados são gravados na tabela `dbt_run_history`, e cada
+modelo é comparado com a mediana móvel das suas execuções anteriores para
+apontar regressões de tempo.
+"""
+
+import json
+import os
+
+HISTORY_TABLE = 'dbt_run_history'
+
+# Um nó é regressão quando leva mais que (1 + limite) x a mediana recente
+DEFAULT_REGRESSION_THRESHOLD = 0.5
+
+# Quantidade de execuções anteriores consideradas na mediana móvel
+DEFAULT_REGRESSION_WINDOW = 10
+
+# Nós abaixo deste tempo (s) são ignorados: variações ali são ruído
+DEFAULT_MIN_SECONDS = 1.0
+
+# Status de teste que reprovam a execução (warn não reprova)
+FAILED_TEST_STATUSES = ('fail', 'error')
+
+
+def load_artifact(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_run_results(run_results, manifest):
+    """
+    Uma linha por nó executado, com os atributos do manifest
+    (nome, tipo, materialização) e os tempos da execução.
+    """
+    nodes = manifest.get('nodes', {})
+    metadata = run_results.get('metadata', {})
+    command = run_results.get('args', {}).get('which')
+
+    rows = []
+    for result in run_results.get('results', []):
+        node = nodes.get(result['unique_id'], {})
+        timing = {step['name']: step for step in result.get('timing', [])}
+        adapter_response = result.get('adapter_response') or {}
+        rows.append({
+            'invocation_id': metadata.get('invocation_id'),
+            'command': command,
+            'unique_id': result['unique_id'],
+            'name': node.get('name', result['unique_id'].split('.')[-1]),
+            'resource_type': node.get('resource_type', result['unique_id'].split('.')[0]),
+            'materialized': node.get('config', {}).get('materialized'),
+            'status': result.get('status'),
+            'execution_time': round(result.get('execution_time') or 0.0, 3),
+            'rows_affected': adapter_response.get('rows_affected'),
+            'failures': result.get('failures'),
+            'started_at': timing.get('execute', {}).get('started_at'),
+            'message': result.get('message'),
+        })
+    return rows
+
+
+def summarize(rows, elapsed_time=None):
+    """
+    Totais por status e os nós mais lentos de uma execução.
+    """
+    by_status = {}
+    for row in rows:
+        by_status[row['status']] = by_status.get(row['status'], 0) + 1
+    slowest = sorted(rows, key=lambda row: row['execution_time'], reverse=True)[:5]
+    return {
+        'nodes_executed': len(rows),
+        'by_status': by_status,
+        'execution_time': round(elapsed_time if elapsed_time is not None
+                                else sum(row['execution_time'] for row in rows), 3),
+        'slowest': [
+            {'name': row['name'], 'execution_time': row['execution_time']} for row in slowest
+        ],
+    }
+
+
+def failed_tests(rows):
+    return [row for row in rows if row['resource_type'] == 'test' and row['status'] in FAILED_TEST_STATUSES]
+
+
+def read_results(target_path):
+    """
+    Lê `run_results.json` e `manifest.json` de um diretório de saída do dbt
+    (`--target-path`). Retorna `(linhas, resumo)`.
+    """
+    run_results = load_artifact(os.path.join(target_path, 'run_results.json'))
+    manifest = load_artifact(os.path.join(target_path, 'manifest.json'))
+    rows = parse_run_results(run_results, manifest)
+    return rows, summarize(rows, run_results.get('elapsed_time'))
+
+
+def record_history(conn, rows, dag_run_id=None):
+    """
+    Grava as linhas em `dbt_run_history`, criando a tabela se necessário.
+    Reexecuções da mesma invocação do dbt substituem as linhas anteriores.
+    Não faz commit.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+                invocation_id VARCHAR(64) NOT NULL,
+                command VARCHAR(20),
+                unique_id VARCHAR(500) NOT NULL,
+                name VARCHAR(255),
+                resource_type VARCHAR(20),
+                materialized VARCHAR(20),
+                status VARCHAR(20),
+                execution_time NUMERIC(12, 3),
+                rows_affected BIGINT,
+                failures INT,
+                started_at TIMESTAMP,
+                dag_run_id VARCHAR(250),
+                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (invocation_id, unique_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_{HISTORY_TABLE}_node
+                ON {HISTORY_TABLE}(unique_id, started_at);
+        """)
+        if not rows:
+            return 0
+        cursor.execute(
+            f"DELETE FROM {HISTORY_TABLE} WHERE invocation_id = %s",
+            (rows[0]['invocation_id'],)
+        )
+        cursor.executemany(f"""
+            INSERT INTO {HISTORY_TABLE} (
+                invocation_id, command, unique_id, name, resource_type, materialized,
+                status, execution_time, rows_affected, failures, started_at, dag_run_id
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, [
+            (row['invocation_id'], row['command'], row['unique_id'], row['name'],
+             row['resource_type'], row['materialized'], row['status'], row['execution_time'],
+             row['rows_affected'], row['failures'], row['started_at'], dag_run_id)
+            for row in rows
+        ])
+        return len(rows)
+    finally:
+        cursor.close()
+
+
+def find_regressions(conn, rows, threshold=DEFAULT_REGRESSION_THRESHOLD,
+                     window=DEFAULT_REGRESSION_WINDOW, min_seconds=DEFAULT_MIN_SECONDS):
+    """
+    Compara o tempo de cada nó bem-sucedido da execução com a mediana das
+    suas últimas `window` execuções bem-sucedidas anteriores, lida de
+    `dbt_run_history`. Retorna os nós acima de (1 + `threshold`) x mediana,
+    do maior para o menor aumento.
+    """
+    current = {
+        row['unique_id']: row for row in rows
+        if row['status'] == 'success' and row['execution_time'] >= min_seconds
+    }
+    if not current:
+        return []
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT unique_id, percentile_cont(0.5) WITHIN GROUP (ORDER BY execution_time), COUNT(*)
+            FROM (
+                SELECT unique_id, execution_time,
+                       ROW_NUMBER() OVER (PARTITION BY unique_id ORDER BY started_at DESC) AS position
+                FROM {HISTORY_TABLE}
+                WHERE unique_id = ANY(%s)
+                  AND status = 'success'
+                  AND invocation_id <> %s
+            ) previous
+            WHERE position <= %s
+            GROUP BY unique_id
+        """, (list(current), next(iter(current.values()))['invocation_id'], window))
+        medians = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    regressions = []
+    for unique_id, median, runs in medians:
+        row = current[unique_id]
+        median = float(median)
+        if median > 0 and row['execution_time'] > median * (1 + threshold):
+            regressions.append({
+                'unique_id': unique_id,
+                'name': row['name'],
+                'execution_time': row['execution_time'],
+                'median': round(median, 3),
+                'runs': runs,
+                'increase': round(row['execution_time'] / median - 1, 3),
+            })
+    return sorted(regressions, key=lambda regression: regression['increase'], reverse=True)
@@ -0,0 +1,37 @@
+"""
+## Datasets dos voos
+
+Datasets do Airflow compartilhados entre os DAGs de voos. A tarefa
+`load_flights_to_postgres` do DAG `flights_etl` publica
+`RAW_FLIGHTS_DATASET` ao concluir a carga, e o DAG do dbt é agendado por
+esse dataset, começando assim que os dados chegam ao banco.
+
+Na versão do Airflow usada (2.7) o evento do dataset não carrega dados
+próprios; o resumo da carga (partição e contagens) é o XCom de retorno
+da tarefa produtora, lido a partir da origem de cada evento.
+"""
+
+from airflow.datasets import Dataset
+from airflow.models import XCom
+
+RAW_FLIGHTS_DATASET = Dataset('postgres://postgres_flights/public/raw_flights')
+
+
+def loaded_partitions(context):
+    """
+    Resumos das cargas que dispararam a execução atual, um por evento
+    de dataset. Retorna lista vazia em execuções manuais.
+    """
+    summaries = []
+    for events in context.get('triggering_dataset_events', {}).values():
+        for event in events:
+            summary = XCom.get_one(
+                key='return_value',
+                dag_id=event.source_dag_id,
+                task_id=event.source_task_id,
+                run_id=event.source_run_id,
+                map_index=event.source_map_index,
+            )
+            if summary:
+                summaries.append(summary)
+    return summaries
@@ -0,0 +1,80 @@
+"""
+## Extrator paginado da API de voos
+
+Grava as páginas da API, recebidas de um gerador (`page_fetcher.fetch_pages`),
+de forma incremental em arquivos NDJSON particionados por data. Apenas um manifesto
+(caminhos, quantidade de linhas e tamanho em bytes) é passado adiante via
+XCom, de modo que o uso de memória e o tamanho do banco de metadados do
+Airflow não crescem com o volume diário de voos.
+"""
+
+import glob
+import json
+import os
+
+# Quantidade padrão de voos por arquivo de saída
+DEFAULT_ROWS_PER_FILE = 100000
+
+MANIFEST_FILENAME = '_manifest.json'
+
+
+def write_partitioned_ndjson(pages, output_dir, rows_per_file=DEFAULT_ROWS_PER_FILE):
+    """
+    Grava as páginas em `output_dir/part-NNNNN.jsonl`, abrindo um novo
+    arquivo a cada `rows_per_file` registros.
+
+    Arquivos de execuções anteriores na mesma partição são removidos antes
+    da escrita, tornando a tarefa idempotente. Retorna o manifesto gerado,
+    que também é salvo em `output_dir/_manifest.json`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for old_file in glob.glob(os.path.join(output_dir, 'part-*.jsonl')):
+        os.remove(old_file)
+
+    files = []
+    outfile = None
+    rows_in_file = 0
+
+    def close_current():
+        if outfile is not None:
+            outfile.close()
+            files[-1]['rows'] = rows_in_file
+            files[-1]['bytes'] = os.path.getsize(files[-1]['path'])
+
+    try:
+        for _, records in pages:
+            for record in records:
+                if outfile is None or rows_in_file >= rows_per_file:
+                    close_current()
+                    path = os.path.join(output_dir, f"part-{len(files):05d}.jsonl")
+                    outfile = open(path, 'w')
+                    files.append({'path': path, 'rows': 0, 'bytes': 0})
+                    rows_in_file = 0
+                outfile.write(json.dumps(record))
+                outfile.write('\n')
+                rows_in_file += 1
+    finally:
+        close_current()
+
+    manifest = {
+        'output_dir': output_dir,
+        'files': files,
+        'rows': sum(f['rows'] for f in files),
+        'bytes': sum(f['bytes'] for f in files)
+    }
+
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+
+    return manifest
+
+
+def iter_manifest_records(manifest):
+    """
+    Lê de volta, linha a linha, os registros listados em um manifesto.
+    """
+    for file_info in manifest['files']:
+        with open(file_info['path'], 'r') as infile:
+            for line in infile:
+                if line.strip():
+                    yield json.loads(line)
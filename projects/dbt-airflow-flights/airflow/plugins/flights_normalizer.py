@@ -0,0 +1,224 @@
+"""
+## Normalização colunar dos voos
+
+Converte os arquivos NDJSON extraídos da API em três tabelas colunares
+(voos, aeroportos e companhias aéreas) em uma única passada. O parsing e o
+achatamento dos objetos aninhados são feitos pelo leitor JSON do PyArrow;
+a deduplicação das dimensões usa `drop_duplicates` do pandas, baseado em
+hash, em vez de dicionários montados voo a voo.
+
+O leitor recebe um schema explícito só com os campos usados (identificadores
+como texto, horários como timestamp e atrasos como float); os demais campos
+da resposta são ignorados, então o tipo inferido para eles não derruba a
+leitura. O PyArrow não converte número em texto (nem o contrário): um
+arquivo em que um campo usado alterna entre os dois (ex.: `flight.number`
+ora `"123"`, ora `123`) é relido registro a registro, com a mesma conversão
+de tipos.
+
+Horários com offset (`2025-04-29T08:30:00+02:00`) são convertidos para UTC
+e gravados sem fuso nas colunas TIMESTAMP. Atrasos ausentes continuam
+nulos, e atrasos fracionários são arredondados para o minuto mais próximo.
+"""
+
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.json as pa_json
+import pyarrow.types as pa_types
+
+# Coluna de destino -> campo achatado na resposta da API
+FLIGHT_FIELDS = {
+    'flight_date': 'flight_date',
+    'flight_status': 'flight_status',
+    'flight_number': 'flight.number',
+    'flight_iata': 'flight.iata',
+    'flight_icao': 'flight.icao',
+    'airline_iata': 'airline.iata',
+    'departure_airport_iata': 'departure.iata',
+    'arrival_airport_iata': 'arrival.iata',
+    'departure_scheduled': 'departure.scheduled',
+    'departure_actual': 'departure.actual',
+    'departure_delay': 'departure.delay',
+    'arrival_scheduled': 'arrival.scheduled',
+    'arrival_actual': 'arrival.actual',
+    'arrival_estimated': 'arrival.estimated',
+    'arrival_delay': 'arrival.delay',
+    'aircraft_registration': 'aircraft.registration',
+    'aircraft_model': 'aircraft.model',
+}
+
+AIRPORT_FIELDS = {
+    'iata_code': 'iata',
+    'icao_code': 'icao',
+    'name': 'airport',
+    'timezone': 'timezone',
+}
+
+AIRLINE_FIELDS = {
+    'iata_code': 'airline.iata',
+    'icao_code': 'airline.icao',
+    'name': 'airline.name',
+}
+
+DELAY_COLUMNS = ['departure_delay', 'arrival_delay']
+
+TIMESTAMP_FIELDS = {
+    'flight_date', 'departure.scheduled', 'departure.actual',
+    'arrival.scheduled', 'arrival.actual', 'arrival.estimated',
+}
+DELAY_FIELDS = {'departure.delay', 'arrival.delay'}
+
+# Tamanho dos blocos lidos pelo PyArrow (padrão do leitor)
+READ_BLOCK_SIZE = 1 << 20
+
+
+def _field_type(field):
+    if field in TIMESTAMP_FIELDS:
+        return pa.timestamp('ms')
+    if field in DELAY_FIELDS:
+        return pa.float64()
+    return pa.string()
+
+
+def _source_fields():
+    """
+    Campos achatados lidos da API: os das três tabelas, sem repetição.
+    """
+    fields = list(FLIGHT_FIELDS.values()) + list(AIRLINE_FIELDS.values())
+    for prefix in ('departure.', 'arrival.'):
+        fields += [prefix + field for field in AIRPORT_FIELDS.values()]
+    return list(dict.fromkeys(fields))
+
+
+def _read_schema(fields):
+    """
+    Schema aninhado (structs por objeto da API) com o tipo de cada campo.
+    """
+    tree = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.split('.')
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = _field_type(field)
+
+    def build(node):
+        return [
+            pa.field(name, pa.struct(build(child)) if isinstance(child, dict) else child)
+            for name, child in node.items()
+        ]
+
+    return pa.schema(build(tree))
+
+
+def _read_records(path, fields):
+    """
+    Leitura registro a registro, para arquivos em que um campo alterna
+    entre número e texto: os valores são convertidos para os tipos do schema.
+    """
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    frame = pd.json_normalize(records).reindex(columns=fields)
+    for field in fields:
+        column = frame[field]
+        if field in TIMESTAMP_FIELDS:
+            frame[field] = pd.to_datetime(column, utc=True, errors='coerce').dt.tz_convert(None)
+        elif field in DELAY_FIELDS:
+            frame[field] = pd.to_numeric(column, errors='coerce')
+        else:
+            frame[field] = column.map(lambda value: None if pd.isna(value) else str(value))
+    return frame
+
+
+def _read_flattened(path):
+    """
+    Lê um arquivo NDJSON com o PyArrow e achata todos os structs
+    (`departure.iata`, `airline.name`, ...).
+    """
+    fields = _source_fields()
+    try:
+        table = pa_json.read_json(
+            path,
+            read_options=pa_json.ReadOptions(block_size=READ_BLOCK_SIZE),
+            parse_options=pa_json.ParseOptions(
+                explicit_schema=_read_schema(fields), unexpected_field_behavior='ignore'
+            )
+        )
+    except pa.ArrowInvalid:
+        return _read_records(path, fields)
+    while any(pa_types.is_struct(field.type) for field in table.schema):
+        table = table.flatten()
+    return table.to_pandas()
+
+
+def _select(frame, fields, prefix=''):
+    """
+    Seleciona e renomeia colunas; campos ausentes em todo o arquivo
+    viram colunas nulas.
+    """
+    source_columns = [prefix + field for field in fields.values()]
+    selected = frame.reindex(columns=source_columns)
+    selected.columns = list(fields.keys())
+    return selected
+
+
+def normalize_flights(frame, extracted_date):
+    """
+    Recebe os voos achatados e retorna `(voos, aeroportos, companhias)`.
+    """
+    flights = _select(frame, FLIGHT_FIELDS)
+    for column in DELAY_COLUMNS:
+        flights[column] = pd.to_numeric(flights[column], errors='coerce').round().astype('Int64')
+    flights['extracted_date'] = extracted_date
+
+    airports = pd.concat(
+        [_select(frame, AIRPORT_FIELDS, 'departure.'), _select(frame, AIRPORT_FIELDS, 'arrival.')],
+        ignore_index=True
+    )
+    airports = airports.dropna(subset=['iata_code']).drop_duplicates(subset='iata_code')
+
+    airlines = _select(frame, AIRLINE_FIELDS)
+    airlines = airlines.dropna(subset=['iata_code']).drop_duplicates(subset='iata_code')
+
+    return (
+        flights.reset_index(drop=True),
+        airports.reset_index(drop=True),
+        airlines.reset_index(drop=True)
+    )
+
+
+def normalize_flight_files(paths, extracted_date):
+    """
+    Normaliza todos os arquivos NDJSON de uma partição.
+    """
+    frames = [_read_flattened(path) for path in paths]
+    if not frames:
+        frame = pd.DataFrame()
+    else:
+        frame = pd.concat(frames, ignore_index=True)
+    return normalize_flights(frame, extracted_date)
+
+
+def write_processed_tables(output_dir, tables):
+    """
+    Grava cada DataFrame de `tables` em `output_dir/<nome>.parquet`
+    e retorna o caminho de cada tabela.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for name, frame in tables.items():
+        path = os.path.join(output_dir, f"{name}.parquet")
+        frame.to_parquet(path, index=False)
+        paths[name] = path
+    return paths
+
+
+def read_processed_table(path):
+    """
+    Lê uma tabela processada com valores nulos representados por None,
+    pronta para ser serializada linha a linha (ex.: COPY).
+    """
+    frame = pd.read_parquet(path)
+    return frame.astype(object).where(frame.notna(), None)
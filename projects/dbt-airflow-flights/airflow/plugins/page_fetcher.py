@@ -0,0 +1,265 @@
+"""
+## Busca concorrente de páginas de API
+
+Motor de extração que busca várias páginas em paralelo (pool de threads com
+janela limitada), respeitando um token bucket ajustado pelos cabeçalhos de
+rate limit da API, com retentativas por página usando backoff exponencial
+com jitter e checkpoints em disco: ao reexecutar uma tarefa, apenas as
+páginas ainda não salvas são buscadas novamente.
+
+`fetch_page(offset, limit)` deve retornar `(payload, headers)`, onde
+`payload` segue o formato `{"pagination": {...}, "data": [...]}`.
+Use `http_page_fetcher` para consumir uma API HTTP real ou um servidor
+stub local.
+"""
+
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RATE = 5.0  # requisições por segundo
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0  # segundos
+DEFAULT_BACKOFF_MAX = 60.0  # segundos
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe. A taxa de reposição pode ser ajustada em tempo
+    de execução a partir dos cabeçalhos de rate limit devolvidos pela API.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """
+        Bloqueia até que um token esteja disponível e o consome.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if now < self.paused_until:
+                    wait_time = self.paused_until - now
+                else:
+                    wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    def pause(self, seconds):
+        """
+        Suspende a emissão de tokens por `seconds` segundos (ex.: Retry-After).
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def update_from_headers(self, headers):
+        """
+        Ajusta o bucket a partir de `X-RateLimit-Remaining`,
+        `X-RateLimit-Reset` (segundos até a renovação) e `Retry-After`.
+        """
+        if not headers:
+            return
+
+        retry_after = _header_as_float(headers, 'Retry-After')
+        if retry_after is not None:
+            self.pause(retry_after)
+            return
+
+        remaining = _header_as_float(headers, 'X-RateLimit-Remaining')
+        reset = _header_as_float(headers, 'X-RateLimit-Reset')
+        if remaining is None:
+            return
+
+        if remaining <= 0 and reset:
+            self.pause(reset)
+            return
+
+        with self._lock:
+            self.tokens = min(self.tokens, remaining)
+            if reset and reset > 0:
+                # Distribui as requisições restantes ao longo da janela
+                self.rate = max(remaining / reset, 0.1)
+
+
+def _header_as_float(headers, name):
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(attempt, base=DEFAULT_BACKOFF_BASE, maximum=DEFAULT_BACKOFF_MAX):
+    """
+    Backoff exponencial com "full jitter".
+    """
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+def http_page_fetcher(url, params=None, session=None, timeout=30):
+    """
+    Cria um `fetch_page` que consulta `url` com os parâmetros `offset` e
+    `limit`. Erros HTTP são propagados como exceção; o motor aplica o
+    backoff apenas aos retentáveis (429 e 5xx).
+    """
+    session = session or requests.Session()
+    base_params = dict(params or {})
+
+    def fetch_page(offset, limit):
+        response = session.get(
+            url,
+            params={**base_params, 'offset': offset, 'limit': limit},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json(), response.headers
+
+    return fetch_page
+
+
+class PageCheckpoint:
+    """
+    Armazena cada página já buscada em `checkpoint_dir/page-<offset>.json`,
+    permitindo retomar uma extração interrompida.
+    """
+
+    def __init__(self, checkpoint_dir):
+        self.checkpoint_dir = checkpoint_dir
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def _path(self, offset):
+        return os.path.join(self.checkpoint_dir, f"page-{offset:010d}.json")
+
+    def has(self, offset):
+        return os.path.exists(self._path(offset))
+
+    def load(self, offset):
+        with open(self._path(offset), 'r') as infile:
+            return json.load(infile)
+
+    def save(self, offset, payload):
+        # Escrita atômica para não deixar páginas truncadas após uma falha
+        tmp_path = self._path(offset) + '.tmp'
+        with open(tmp_path, 'w') as outfile:
+            json.dump(payload, outfile)
+        os.replace(tmp_path, self._path(offset))
+
+    def clear(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+
+def _fetch_with_retry(fetch_page, offset, limit, bucket, max_retries, on_retry=None):
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        try:
+            payload, headers = fetch_page(offset=offset, limit=limit)
+            bucket.update_from_headers(headers)
+            return payload
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            if response is not None:
+                bucket.update_from_headers(response.headers)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise
+            if attempt == max_retries:
+                raise
+            if on_retry:
+                on_retry()
+            delay = _backoff_delay(attempt)
+            print(f"Falha ao buscar página offset={offset} (tentativa {attempt + 1}): {e}. "
+                  f"Nova tentativa em {delay:.1f}s")
+            time.sleep(delay)
+
+
+def fetch_pages(fetch_page, limit=100, max_workers=DEFAULT_MAX_WORKERS,
+                rate=DEFAULT_RATE, max_retries=DEFAULT_MAX_RETRIES,
+                checkpoint_dir=None, total=None, on_retry=None):
+    """
+    Gera `(offset, registros)` para todas as páginas da API, buscando-as
+    concorrentemente.
+
+    A primeira página é buscada antes das demais para descobrir o `total`
+    (a menos que ele seja informado) e o tamanho de página efetivo: APIs
+    que limitam a página abaixo de `limit` informam o valor aplicado em
+    `pagination.limit` (ou `pagination.count`), e os offsets seguintes
+    avançam por ele. No máximo `2 * max_workers` páginas
+    ficam em voo ao mesmo tempo, mantendo a memória limitada. As páginas
+    são entregues na ordem em que ficam prontas.
+
+    Com `checkpoint_dir`, páginas já salvas por uma execução anterior são
+    lidas do disco em vez de buscadas novamente. `on_retry`, se informado,
+    é chamado (sem argumentos) a cada retentativa de página.
+    """
+    bucket = TokenBucket(rate=rate)
+    checkpoint = PageCheckpoint(checkpoint_dir) if checkpoint_dir else None
+
+    def get_page(offset):
+        if checkpoint and checkpoint.has(offset):
+            return checkpoint.load(offset)
+        payload = _fetch_with_retry(fetch_page, offset, limit, bucket, max_retries, on_retry)
+        if checkpoint:
+            checkpoint.save(offset, payload)
+        return payload
+
+    first_page = get_page(0)
+    first_records = first_page.get('data') or []
+    pagination = first_page.get('pagination') or {}
+    if total is None:
+        total = pagination.get('total', len(first_records))
+    page_size = min(int(pagination.get('limit') or pagination.get('count') or len(first_records) or limit), limit)
+
+    if first_records:
+        yield 0, first_records
+    if not first_records or total <= len(first_records):
+        return
+
+    offsets = iter(range(page_size, total, page_size))
+    window = max_workers * 2
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+
+        def submit_next():
+            offset = next(offsets, None)
+            if offset is None:
+                return False
+            in_flight[executor.submit(get_page, offset)] = offset
+            return True
+
+        while len(in_flight) < window and submit_next():
+            pass
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                offset = in_flight.pop(future)
+                records = future.result().get('data') or []
+                if records:
+                    yield offset, records
+                submit_next()
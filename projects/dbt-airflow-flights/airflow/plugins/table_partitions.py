@@ -0,0 +1,252 @@
+"""
+## Particionamento das tabelas raw por data
+
+Manutenção de tabelas particionadas declarativamente por intervalo
+(`PARTITION BY RANGE`) em uma coluna de data, com uma partição por mês
+(ou por dia), nomeadas `<tabela>_pAAAA_MM` (ou `<tabela>_pAAAA_MM_DD`).
+
+- `ensure_partitions`: cria as partições que faltam para um conjunto de datas
+- `target_table`: partição que recebe uma carga, quando todas as datas
+  caem no mesmo período; o upsert vai direto para ela, sem roteamento de
+  linhas pela tabela pai e com o ON CONFLICT verificado em um índice menor
+- `archive_partitions`: desanexa as partições antigas e as move para um
+  schema de arquivo, onde continuam consultáveis
+- `absorb_unpartitioned`: migra para a tabela particionada os dados de uma
+  versão anterior, não particionada, renomeada para `<tabela>_unpartitioned`
+  pelo SQL de criação
+
+Nenhuma função faz commit; o controle da transação fica com o chamador.
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+MONTHLY = 'month'
+DAILY = 'day'
+
+# Schema que recebe as partições desanexadas
+DEFAULT_ARCHIVE_SCHEMA = 'archive'
+
+# Quantidade de períodos futuros criados antecipadamente
+DEFAULT_PREMAKE_PERIODS = 3
+
+UNPARTITIONED_SUFFIX = '_unpartitioned'
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def period_start(value, granularity=MONTHLY):
+    """
+    Primeiro dia do período (mês ou dia) que contém `value`.
+    """
+    day = _to_date(value)
+    return day.replace(day=1) if granularity == MONTHLY else day
+
+
+def next_period(start, granularity=MONTHLY):
+    """
+    Primeiro dia do período seguinte a `start`.
+    """
+    if granularity == MONTHLY:
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def shift_periods(value, count, granularity=MONTHLY):
+    """
+    Início do período `count` períodos depois (ou antes, se negativo) de `value`.
+    """
+    start = period_start(value, granularity)
+    if granularity == DAILY:
+        return start + timedelta(days=count)
+    months = start.year * 12 + start.month - 1 + count
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(table, value, granularity=MONTHLY):
+    start = period_start(value, granularity)
+    suffix = start.strftime('%Y_%m') if granularity == MONTHLY else start.strftime('%Y_%m_%d')
+    return f"{table}_p{suffix}"
+
+
+def _parse_partition_start(table, name):
+    match = re.match(rf"^{re.escape(table)}_p(\d{{4}})_(\d{{2}})(?:_(\d{{2}}))?$", name)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    return date(int(year), int(month), int(day or 1))
+
+
+def list_partitions(conn, table):
+    """
+    Nomes das partições atualmente anexadas a `table`.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+        """, (table,))
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def ensure_partitions(conn, table, dates, granularity=MONTHLY):
+    """
+    Garante uma partição para cada período que contém alguma das `dates`.
+    Só são criados os períodos presentes, de modo que uma data isolada muito
+    antiga não gera partições para todo o intervalo até ela.
+    Um advisory lock por tabela evita que cargas paralelas tentem criar a
+    mesma partição. Retorna os nomes das partições criadas.
+    """
+    wanted = {}
+    for value in dates:
+        start = period_start(value, granularity)
+        wanted[partition_name(table, start, granularity)] = start
+
+    # Caminho comum: todas as partições já existem e nenhum lock é tomado
+    if not set(wanted) - set(list_partitions(conn, table)):
+        return []
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table,))
+        existing = set(list_partitions(conn, table))
+        created = []
+        for name, lower in sorted(wanted.items()):
+            if name in existing:
+                continue
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{next_period(lower, granularity).isoformat()}')"
+            )
+            created.append(name)
+        return created
+    finally:
+        cursor.close()
+
+
+def target_table(table, dates, granularity=MONTHLY):
+    """
+    Tabela de destino de uma carga: a própria partição quando todas as
+    `dates` caem no mesmo período, ou a tabela pai (que roteia cada linha)
+    quando a carga atravessa períodos.
+    """
+    starts = {period_start(value, granularity) for value in dates}
+    if len(starts) == 1:
+        return partition_name(table, starts.pop(), granularity)
+    return table
+
+
+def archive_partitions(conn, table, before, granularity=MONTHLY,
+                       archive_schema=DEFAULT_ARCHIVE_SCHEMA):
+    """
+    Desanexa as partições cujo período termina até `before` e as move para
+    `archive_schema`. Os dados saem das consultas, índices e verificações
+    de conflito da tabela pai, mas continuam em `<schema>.<partição>`.
+    Retorna os nomes das partições arquivadas.
+    """
+    cutoff = period_start(before, granularity)
+    archived = []
+    cursor = conn.cursor()
+    try:
+        for name in list_partitions(conn, table):
+            start = _parse_partition_start(table, name)
+            if start is None or next_period(start, granularity) > cutoff:
+                continue
+            if not archived:
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}")
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            cursor.execute("SELECT to_regclass(%s)", (f"{archive_schema}.{name}",))
+            if cursor.fetchone()[0] is None:
+                cursor.execute(f"ALTER TABLE {name} SET SCHEMA {archive_schema}")
+            else:
+                # Período já arquivado antes (partição recriada por uma carga tardia)
+                cursor.execute(f"INSERT INTO {archive_schema}.{name} SELECT * FROM {name}")
+                cursor.execute(f"DROP TABLE {name}")
+            archived.append(name)
+        return archived
+    finally:
+        cursor.close()
+
+
+def absorb_unpartitioned(conn, table, date_column, granularity=MONTHLY, serial_column='id'):
+    """
+    Copia para `table` as linhas de `<tabela>_unpartitioned`, criando as
+    partições necessárias, ajusta a sequência de `serial_column` e remove
+    a tabela antiga. Retorna a quantidade de linhas migradas (0 se não
+    houver tabela antiga).
+    """
+    legacy = f"{table}{UNPARTITIONED_SUFFIX}"
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT to_regclass(%s)", (legacy,))
+        if cursor.fetchone()[0] is None:
+            return 0
+
+        cursor.execute(f"SELECT COUNT(*) FROM {legacy} WHERE {date_column} IS NULL")
+        null_dates = cursor.fetchone()[0]
+        if null_dates:
+            raise ValueError(
+                f"{legacy} tem {null_dates} linha(s) sem {date_column}; "
+                f"corrija-as antes de migrar para a tabela particionada"
+            )
+        cursor.execute(f"SELECT DISTINCT date_trunc(%s, {date_column})::date FROM {legacy}", (granularity,))
+        ensure_partitions(conn, table, [row[0] for row in cursor.fetchall()], granularity)
+
+        # Apenas as colunas presentes nas duas versões da tabela
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+            AND column_name IN (
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = %s
+            )
+            ORDER BY ordinal_position
+        """, (table, legacy))
+        column_list = ", ".join(row[0] for row in cursor.fetchall())
+
+        cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {legacy}")
+        migrated = cursor.rowcount
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, %s), "
+            f"(SELECT COALESCE(MAX({serial_column}), 0) + 1 FROM {table}), false)",
+            (table, serial_column)
+        )
+        cursor.execute(f"DROP TABLE {legacy}")
+        return migrated
+    finally:
+        cursor.close()
+
+
+def maintain_partitions(conn, table, date_column, today, premake=DEFAULT_PREMAKE_PERIODS,
+                        retention=None, granularity=MONTHLY,
+                        archive_schema=DEFAULT_ARCHIVE_SCHEMA):
+    """
+    Rotina periódica de manutenção de uma tabela particionada:
+    migra a versão não particionada (se houver), cria as partições do
+    período atual e dos `premake` seguintes e, se `retention` for
+    informado, arquiva as partições com mais de `retention` períodos.
+    """
+    migrated = absorb_unpartitioned(conn, table, date_column, granularity)
+    created = ensure_partitions(
+        conn, table, [shift_periods(today, count, granularity) for count in range(int(premake) + 1)],
+        granularity
+    )
+    archived = []
+    if retention is not None:
+        archived = archive_partitions(
+            conn, table, shift_periods(today, -int(retention), granularity),
+            granularity, archive_schema
+        )
+    return {'migrated_rows': migrated, 'created': created, 'archived': archived}
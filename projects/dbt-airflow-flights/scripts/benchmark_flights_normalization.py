@@ -0,0 +1,102 @@
+"""
+## Benchmark: normalização de voos (loop vs colunar)
+
+Compara o loop Python original de `process_flights_data` (um dicionário por
+voo, com aeroportos e companhias deduplicados em dicionários) com a
+normalização colunar de `plugins/flights_normalizer.py`, em voos/segundo.
+
+Uso:
+    python scripts/benchmark_flights_normalization.py --sizes 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'plugins'))
+
+from flights_extractor import write_partitioned_ndjson, iter_manifest_records  # noqa: E402
+from flights_normalizer import normalize_flight_files  # noqa: E402
+from stub_flights_api import build_flight  # noqa: E402
+
+FLIGHT_DATE = '2025-04-29'
+
+
+def legacy_normalize(manifest, execution_date):
+    """
+    Reprodução do loop original de `process_flights_data`.
+    """
+    processed_flights = []
+    unique_airports = {}
+    unique_airlines = {}
+
+    for flight in iter_manifest_records(manifest):
+        for side in ('departure', 'arrival'):
+            if flight[side]['iata'] not in unique_airports:
+                unique_airports[flight[side]['iata']] = {
+                    'iata_code': flight[side]['iata'],
+                    'icao_code': flight[side]['icao'],
+                    'name': flight[side]['airport'],
+                    'timezone': flight[side]['timezone']
+                }
+
+        if flight['airline']['iata'] not in unique_airlines:
+            unique_airlines[flight['airline']['iata']] = {
+                'iata_code': flight['airline']['iata'],
+                'icao_code': flight['airline']['icao'],
+                'name': flight['airline']['name']
+            }
+
+        processed_flights.append({
+            'flight_date': flight['flight_date'],
+            'flight_status': flight['flight_status'],
+            'flight_number': flight['flight']['number'],
+            'flight_iata': flight['flight']['iata'],
+            'flight_icao': flight['flight']['icao'],
+            'airline_iata': flight['airline']['iata'],
+            'departure_airport_iata': flight['departure']['iata'],
+            'arrival_airport_iata': flight['arrival']['iata'],
+            'departure_scheduled': flight['departure']['scheduled'],
+            'departure_actual': flight['departure'].get('actual', None),
+            'departure_delay': flight['departure'].get('delay', 0),
+            'arrival_scheduled': flight['arrival']['scheduled'],
+            'arrival_actual': flight['arrival'].get('actual', None),
+            'arrival_estimated': flight['arrival'].get('estimated', None),
+            'arrival_delay': flight['arrival'].get('delay', 0),
+            'aircraft_registration': flight['aircraft'].get('registration', None),
+            'aircraft_model': flight['aircraft'].get('model', None),
+            'extracted_date': execution_date
+        })
+
+    return processed_flights, list(unique_airports.values()), list(unique_airlines.values())
+
+
+def columnar_normalize(manifest, execution_date):
+    return normalize_flight_files([f['path'] for f in manifest['files']], execution_date)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--rows-per-file', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'voos':>10} | {'método':<10} | {'tempo (s)':>10} | {'voos/s':>12}")
+    print("-" * 52)
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as output_dir:
+            records = (build_flight(i, FLIGHT_DATE) for i in range(rows))
+            manifest = write_partitioned_ndjson([(0, records)], output_dir, rows_per_file=args.rows_per_file)
+
+            for name, normalize in (('loop', legacy_normalize), ('colunar', columnar_normalize)):
+                start = time.perf_counter()
+                flights, _, _ = normalize(manifest, FLIGHT_DATE)
+                elapsed = time.perf_counter() - start
+                assert len(flights) == rows
+                print(f"{rows:>10} | {name:<10} | {elapsed:>10.2f} | {rows / elapsed:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+## Harness dos benchmarks de callables dos DAGs
+
+Executa callables de `PythonOperator` fora do scheduler, com um contexto
+mínimo (XCom em memória), e mede para cada caso e volume de dados:
+
+- tempo (melhor de `--repeat` execuções) e linhas por segundo
+- pico de memória alocada pelo Python (`tracemalloc`), em uma execução
+  separada, para não distorcer o tempo
+
+Os resultados podem ser gravados como baseline (`--save-baseline`) e
+comparados com ela (`--check`): uma vazão abaixo ou um pico de memória
+acima da baseline além de `--tolerance` é uma regressão, e o script sai
+com código 1.
+
+Usado pelos scripts `benchmark_callables.py`, que definem os geradores de
+dados sintéticos e os casos de cada projeto.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+DEFAULT_SIZES = [1000, 100000]
+DEFAULT_TOLERANCE = 0.2
+
+
+class FakeTaskInstance:
+    """
+    TaskInstance mínima: XCom em memória, identificada por (task_id, key).
+    """
+
+    def __init__(self, dag_id, task_id, run_id, xcoms=None):
+        self.dag_id = dag_id
+        self.task_id = task_id
+        self.run_id = run_id
+        self.try_number = 1
+        self.map_index = -1
+        self.xcoms = dict(xcoms or {})
+
+    def xcom_push(self, key, value):
+        self.xcoms[(self.task_id, key)] = value
+
+    def xcom_pull(self, task_ids=None, key='return_value'):
+        return self.xcoms.get((task_ids or self.task_id, key))
+
+
+def make_context(dag_id, task_id, ds, xcoms=None, params=None):
+    """
+    Contexto de execução com as chaves usadas pelos callables do repositório.
+    `xcoms` mapeia `(task_id, key)` para o valor publicado pela tarefa.
+    """
+    execution_date = datetime.strptime(ds, '%Y-%m-%d')
+    run_id = f"benchmark__{ds}"
+    ti = FakeTaskInstance(dag_id, task_id, run_id, xcoms)
+    return {
+        'ti': ti,
+        'task_instance': ti,
+        'ds': ds,
+        'execution_date': execution_date,
+        'logical_date': execution_date,
+        'run_id': run_id,
+        'params': dict(params or {}),
+    }
+
+
+class Case:
+    """
+    Caso de benchmark. `setup(rows)` prepara os dados (fora da medição) e
+    retorna o contexto; `run(context)` executa o callable. Casos com
+    `requires_db` só rodam quando há um banco configurado; `memory=False`
+    dispensa a medição de memória (ex.: trabalho feito em outro processo).
+    """
+
+    def __init__(self, name, setup, run, requires_db=False, memory=True):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.requires_db = requires_db
+        self.memory = memory
+
+
+def _timed(case, rows):
+    context = case.setup(rows)
+    start = time.perf_counter()
+    case.run(context)
+    return time.perf_counter() - start
+
+
+def _peak_memory(case, rows):
+    context = case.setup(rows)
+    tracemalloc.start()
+    try:
+        case.run(context)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case, rows, repeat=1, memory=True):
+    seconds = min(_timed(case, rows) for _ in range(max(repeat, 1)))
+    return {
+        'case': case.name,
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_memory_mb': round(_peak_memory(case, rows) / 1024 ** 2, 2) if memory and case.memory else None,
+    }
+
+
+def _key(result):
+    return f"{result['case']}@{result['rows']}"
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(path, results):
+    """
+    Grava (ou substitui) a baseline dos casos medidos, mantendo as demais.
+    """
+    baselines = load_baselines(path)
+    for result in results:
+        baselines[_key(result)] = {
+            'rows_per_second': result['rows_per_second'],
+            'peak_memory_mb': result['peak_memory_mb'],
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        }
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+def find_regressions(results, baselines, tolerance=DEFAULT_TOLERANCE):
+    """
+    Mensagens para cada caso com vazão abaixo de (1 - tolerance) x baseline
+    ou pico de memória acima de (1 + tolerance) x baseline.
+    """
+    regressions = []
+    for result in results:
+        baseline = baselines.get(_key(result))
+        if not baseline:
+            continue
+        expected, measured = baseline.get('rows_per_second'), result['rows_per_second']
+        if expected and measured and measured < expected * (1 - tolerance):
+            regressions.append(
+                f"{_key(result)}: {measured:.0f} linhas/s, baseline {expected:.0f} "
+                f"({measured / expected - 1:+.0%})"
+            )
+        expected, measured = baseline.get('peak_memory_mb'), result['peak_memory_mb']
+        if expected and measured and measured > expected * (1 + tolerance):
+            regressions.append(
+                f"{_key(result)}: pico de {measured:.1f} MB, baseline {expected:.1f} MB "
+                f"({measured / expected - 1:+.0%})"
+            )
+    return regressions
+
+
+def add_arguments(parser, default_baseline):
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Volumes de dados (linhas), de 1000 a 10000000')
+    parser.add_argument('--cases', nargs='+', help='Executa apenas os casos informados')
+    parser.add_argument('--repeat', type=int, default=1, help='Execuções cronometradas por caso')
+    parser.add_argument('--no-memory', action='store_true', help='Não mede o pico de memória')
+    parser.add_argument('--baseline', default=default_baseline)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='Falha se houver regressão em relação à baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+
+def run_suite(cases, args, has_db=False):
+    """
+    Executa os casos selecionados, imprime a tabela de resultados e aplica
+    `--save-baseline`/`--check`. Retorna o código de saída.
+    """
+    selected = [case for case in cases if not args.cases or case.name in args.cases]
+    print(f"{'caso':<28} | {'linhas':>10} | {'tempo (s)':>10} | {'linhas/s':>12} | {'pico (MB)':>10}")
+    print("-" * 82)
+    results = []
+    for case in selected:
+        if case.requires_db and not has_db:
+            print(f"{case.name:<28} | ignorado: requer --dsn")
+            continue
+        for rows in args.sizes:
+            result = run_case(case, rows, args.repeat, memory=not args.no_memory)
+            results.append(result)
+            peak = f"{result['peak_memory_mb']:>10.1f}" if result['peak_memory_mb'] is not None else f"{'-':>10}"
+            print(f"{case.name:<28} | {rows:>10} | {result['seconds']:>10.3f} | "
+                  f"{result['rows_per_second'] or 0:>12.0f} | {peak}", flush=True)
+
+    if args.check:
+        regressions = find_regressions(results, load_baselines(args.baseline), args.tolerance)
+        if regressions:
+            print("\nRegressões em relação à baseline:\n" + "\n".join(f"- {line}" for line in regressions))
+            return 1
+        print(f"\nSem regressões em relação a {args.baseline} (tolerância {args.tolerance:.0%})")
+    if args.save_baseline:
+        save_baselines(args.baseline, results)
+        print(f"Baseline gravada em {args.baseline}")
+    return 0
+
+
+def main(build_cases, description, default_baseline, extra_arguments=None):
+    """
+    Ponto de entrada comum: `build_cases(args)` retorna `(casos, has_db)`.
+    """
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser, default_baseline)
+    if extra_arguments:
+        extra_arguments(parser)
+    args = parser.parse_args()
+    cases, has_db = build_cases(args)
+    sys.exit(run_suite(cases, args, has_db))
@@ -0,0 +1,156 @@
+"""
+## Servidor stub da API de voos
+
+Servidor HTTP local que imita a paginação da Aviation Stack API
+(`offset`/`limit`), devolve cabeçalhos de rate limit e injeta falhas
+aleatórias (429/503), para exercitar o motor de busca concorrente
+(`plugins/page_fetcher.py`) sem depender da API real.
+
+Uso:
+    python scripts/stub_flights_api.py --total 5000 --port 8765 --error-rate 0.05
+
+Em outro terminal:
+    python scripts/stub_flights_api.py --run-client --port 8765
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+AIRPORTS = [
+    ('SFO', 'KSFO', 'San Francisco International', 'America/Los_Angeles'),
+    ('JFK', 'KJFK', 'John F Kennedy International', 'America/New_York'),
+    ('LAX', 'KLAX', 'Los Angeles International', 'America/Los_Angeles'),
+    ('ORD', 'KORD', "O'Hare International", 'America/Chicago'),
+]
+AIRLINES = [
+    ('UA', 'UAL', 'United Airlines'),
+    ('AA', 'AAL', 'American Airlines'),
+]
+
+
+def build_flight(index, flight_date):
+    dep = AIRPORTS[index % len(AIRPORTS)]
+    arr = AIRPORTS[(index + 1) % len(AIRPORTS)]
+    airline = AIRLINES[index % len(AIRLINES)]
+    number = f"{airline[0]}{index}"
+    return {
+        "flight_date": flight_date,
+        "flight_status": "scheduled",
+        "departure": {"airport": dep[2], "timezone": dep[3], "iata": dep[0], "icao": dep[1],
+                      "scheduled": f"{flight_date}T08:00:00+00:00", "delay": index % 30},
+        "arrival": {"airport": arr[2], "timezone": arr[3], "iata": arr[0], "icao": arr[1],
+                    "scheduled": f"{flight_date}T14:00:00+00:00", "delay": index % 20},
+        "airline": {"name": airline[2], "iata": airline[0], "icao": airline[1]},
+        "flight": {"number": number, "iata": number, "icao": f"{airline[1]}{index}"},
+        "aircraft": {"registration": f"N{index:05d}", "model": "Boeing 737-800"},
+    }
+
+
+def make_handler(total, error_rate, requests_per_window, window_seconds):
+    state = {'window_start': time.monotonic(), 'count': 0}
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, str(value))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', ['100'])[0])
+            flight_date = query.get('flight_date', ['2025-04-29'])[0]
+
+            with lock:
+                now = time.monotonic()
+                if now - state['window_start'] >= window_seconds:
+                    state['window_start'] = now
+                    state['count'] = 0
+                state['count'] += 1
+                remaining = max(requests_per_window - state['count'], 0)
+                reset = window_seconds - (now - state['window_start'])
+
+            rate_headers = {
+                'X-RateLimit-Limit': requests_per_window,
+                'X-RateLimit-Remaining': remaining,
+                'X-RateLimit-Reset': f"{reset:.2f}",
+            }
+
+            if remaining == 0:
+                self._send(429, {"error": "rate limit"}, {**rate_headers, 'Retry-After': f"{reset:.2f}"})
+                return
+            if random.random() < error_rate:
+                self._send(503, {"error": "injected failure"}, rate_headers)
+                return
+
+            end = min(offset + limit, total)
+            data = [build_flight(i, flight_date) for i in range(offset, end)]
+            body = {
+                "pagination": {"limit": limit, "offset": offset, "count": len(data), "total": total},
+                "data": data,
+            }
+            self._send(200, body, rate_headers)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def run_client(port, limit, max_workers, checkpoint_dir):
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'plugins'))
+    from page_fetcher import fetch_pages, http_page_fetcher
+
+    fetch_page = http_page_fetcher(f"http://localhost:{port}/v1/flights", params={'flight_date': '2025-04-29'})
+    start = time.perf_counter()
+    pages = rows = 0
+    for _, records in fetch_pages(fetch_page, limit=limit, max_workers=max_workers,
+                                  rate=50, checkpoint_dir=checkpoint_dir):
+        pages += 1
+        rows += len(records)
+    elapsed = time.perf_counter() - start
+    print(f"{pages} páginas, {rows} voos em {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--total', type=int, default=5000)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--requests-per-window', type=int, default=100)
+    parser.add_argument('--window-seconds', type=float, default=1.0)
+    parser.add_argument('--run-client', action='store_true',
+                        help='Executa o motor de busca contra um stub já em execução')
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--checkpoint-dir', default=None)
+    args = parser.parse_args()
+
+    if args.run_client:
+        run_client(args.port, args.limit, args.max_workers, args.checkpoint_dir)
+        return
+
+    handler = make_handler(args.total, args.error_rate, args.requests_per_window, args.window_seconds)
+    server = ThreadingHTTPServer(('localhost', args.port), handler)
+    print(f"Stub da API de voos em http://localhost:{args.port}/v1/flights ({args.total} voos)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
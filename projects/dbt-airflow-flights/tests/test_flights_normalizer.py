@@ -0,0 +1,74 @@
+"""
+Testes da leitura e normalização colunar dos arquivos NDJSON de voos.
+"""
+
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'plugins'))
+
+import flights_normalizer  # noqa: E402
+from flights_normalizer import normalize_flight_files  # noqa: E402
+
+
+def _flight(index, number, delay, scheduled='2025-04-29T08:30:00+02:00'):
+    return {
+        'flight_date': '2025-04-29',
+        'flight_status': 'landed',
+        'flight': {'number': number, 'iata': f"AA{index}", 'icao': f"AAL{index}"},
+        'airline': {'name': 'American Airlines', 'iata': 'AA', 'icao': 'AAL'},
+        'departure': {'airport': 'John F Kennedy', 'iata': 'JFK', 'icao': 'KJFK',
+                      'timezone': 'America/New_York', 'scheduled': scheduled, 'delay': 5},
+        'arrival': {'airport': 'Guarulhos', 'iata': 'GRU', 'icao': 'SBGR',
+                    'timezone': 'America/Sao_Paulo', 'delay': delay},
+        'live': None,
+    }
+
+
+def _as_objects(frame):
+    # Nulos como None, independente do dtype (como em read_processed_table)
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def _write(path, records):
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    return str(path)
+
+
+def test_mixed_types_across_blocks(tmp_path, monkeypatch):
+    # Blocos pequenos: os tipos mudam em blocos diferentes do mesmo arquivo
+    monkeypatch.setattr(flights_normalizer, 'READ_BLOCK_SIZE', 2048)
+    records = [_flight(index, str(1000 + index), 10) for index in range(40)]
+    records += [_flight(40, 1040, '12.6'), _flight(41, '1041', None), _flight(42, 1042.0, 'n/a')]
+    # Campo não mapeado com tipo variável também não interrompe a leitura
+    records[-1]['live'] = {'updated': '2025-04-29T10:00:00+00:00'}
+    path = _write(tmp_path / 'part-00000.jsonl', records)
+
+    flights, airports, airlines = normalize_flight_files([path], '2025-04-29')
+
+    assert len(flights) == 43
+    assert flights['flight_number'].tolist()[-4:] == ['1039', '1040', '1041', '1042.0']
+    assert _as_objects(flights)['arrival_delay'].tolist()[-4:] == [10, 13, None, None]
+    assert flights['departure_scheduled'].iloc[-1] == pd.Timestamp('2025-04-29 06:30:00')
+    assert sorted(airports['iata_code']) == ['GRU', 'JFK']
+    assert airlines['iata_code'].tolist() == ['AA']
+
+
+def test_consistent_types_match_fallback(tmp_path):
+    records = [_flight(index, str(1000 + index), 10.4) for index in range(3)]
+    records[1]['arrival']['delay'] = None
+    del records[2]['flight']['icao']
+    typed = _write(tmp_path / 'typed.jsonl', records)
+    mixed = _write(tmp_path / 'mixed.jsonl', records + [_flight(3, 1003, '10')])
+
+    typed_flights = _as_objects(normalize_flight_files([typed], '2025-04-29')[0])
+    mixed_flights = _as_objects(normalize_flight_files([mixed], '2025-04-29')[0].iloc[:3])
+
+    pd.testing.assert_frame_equal(typed_flights, mixed_flights)
+    assert typed_flights['arrival_delay'].tolist() == [10, None, 10]
+    assert typed_flights['flight_icao'].tolist() == ['AAL0', 'AAL1', None]
@@ -18,6 +18,11 @@ CREATE TABLE raw_orders (
     amount DECIMAL(10,2)
 );
 
+-- Índices usados pelo recálculo incremental de customer_orders: pedidos por
+-- cliente e busca dos clientes com pedidos recentes (filtro só por data)
+CREATE INDEX idx_raw_orders_customer_date ON raw_orders (customer_id, order_date);
+CREATE INDEX idx_raw_orders_order_date ON raw_orders (order_date);
+
 -- Inserir dados de exemplo em clientes
 INSERT INTO raw_customers (first_name, last_name, email)
 VALUES
@@ -1,9 +1,22 @@
-{{{
+{{
     config(
-        materialized='table',
-        tags=['finance', 'daily']
+        materialized='incremental',
+        unique_key='customer_id',
+        incremental_strategy='delete+insert',
+        on_schema_change='fail',
+        tags=['finance', 'daily'],
+        pre_hook=[
+            "create index if not exists idx_raw_orders_customer_date on raw_orders (customer_id, order_date)",
+            "create index if not exists idx_raw_orders_order_date on raw_orders (order_date)"
+        ]
     )
-}}}
+}}
+
+-- Incremental por cliente: cada execução recalcula apenas os clientes com
+-- pedidos a partir da data mais recente já processada (e os clientes ainda
+-- ausentes do mart), substituindo suas linhas pela chave customer_id.
+-- Pedidos lançados com data retroativa e alterações cadastrais de clientes
+-- sem novos pedidos só entram com `dbt run --full-refresh`.
 
 with customers as (
     select * from {{ ref('stg_customers') }}
@@ -13,6 +26,22 @@ orders as (
     select * from {{ ref('stg_orders') }}
 ),
 
+{% if is_incremental() %}
+affected_customers as (
+    select customer_id
+    from orders
+    where order_date >= (
+        select coalesce(max(most_recent_order_date), '1900-01-01'::date) from {{ this }}
+    )
+
+    union
+
+    select customer_id
+    from customers
+    where customer_id not in (select customer_id from {{ this }})
+),
+{% endif %}
+
 customer_orders as (
     select
         customers.customer_id,
@@ -25,7 +54,10 @@ customer_orders as (
         sum(orders.amount) as lifetime_value
     from customers
     left join orders on customers.customer_id = orders.customer_id
+    {% if is_incremental() %}
+    where customers.customer_id in (select customer_id from affected_customers)
+    {% endif %}
     group by 1, 2, 3, 4
 )
 
-select * from customer_orders
\ No newline at end of file
+select * from customer_orders
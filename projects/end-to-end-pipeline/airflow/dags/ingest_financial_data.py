@@ -19,17 +19,33 @@ from airflow.operators.python import PythonOperator, BranchPythonOperator
 from airflow.operators.bash import BashOperator
 from airflow.providers.postgres.operators.postgres import PostgresOperator
 from airflow.providers.postgres.hooks.postgres import PostgresHook
-from airflow.providers.http.sensors.http import HttpSensor
 from airflow.providers.http.operators.http import SimpleHttpOperator
 from airflow.utils.task_group import TaskGroup
 from airflow.models import Variable
 import json
-import csv
 import requests
 import pandas as pd
 import os
 from pathlib import Path
 
+from bulk_loader import copy_upsert_frames, copy_insert_frames, copy_insert, DEFAULT_CHUNK_SIZE
+from page_fetcher import fetch_pages, PageCheckpoint, DEFAULT_MAX_WORKERS, DEFAULT_RATE
+from watermarks import get_watermark, advance_watermark, incremental_window, is_new
+from stock_validation import (
+    REQUIRED_COLUMNS, validate_stock_frame, summarize, failure_ratio, split_quarantine,
+    write_quarantine, read_quarantine, format_summary
+)
+from deferrable_http_sensor import DeferrableHttpSensor
+from stock_storage import write_stock_table, read_stock_table, iter_stock_batches, read_stock_metadata
+from pipeline_metrics import instrumented, track_stage, current_stage
+from connection_pool import pooled_connection
+from task_profiler import profiled
+from table_partitions import (
+    ensure_partitions, target_table, maintain_partitions, is_empty, next_period,
+    create_loading_table, build_partition_indexes, attach_loading_table,
+    DEFAULT_PREMAKE_PERIODS, DEFAULT_INDEX_BUILD_WORKERS
+)
+
 # Definição dos argumentos default
 default_args = {
     'owner': 'data_engineering',
@@ -52,10 +68,155 @@ dag = DAG(
     schedule_interval='0 6 * * *',  # Executa diariamente às 6h
     catchup=False,
     max_active_runs=1,
+    params={
+        # No modo incremental, apenas dados posteriores ao watermark de cada fonte são buscados
+        'incremental': True,
+        # Executa as tarefas de validação e carga sob o profiler (plugins/task_profiler.py)
+        'profile': False
+    },
     doc_md=__doc__
 )
 
+# raw_stock_prices é particionada por mês de trading_date
+RAW_STOCK_PRICES_TABLE = 'raw_stock_prices'
+
+# Colunas carregadas em raw_stock_prices e sua chave de unicidade
+RAW_STOCK_PRICES_COLUMNS = [
+    'symbol', 'trading_date', 'open_price', 'high_price', 'low_price',
+    'close_price', 'volume', 'exchange', 'ingestion_date'
+]
+RAW_STOCK_PRICES_KEY = ['symbol', 'trading_date']
+
+# Campo da API/CSV -> coluna de raw_stock_prices
+STOCK_FIELDS_TO_RAW = {
+    'symbol': 'symbol', 'date': 'trading_date', 'open': 'open_price', 'high': 'high_price',
+    'low': 'low_price', 'close': 'close_price', 'volume': 'volume', 'exchange': 'exchange'
+}
+
+# Colunas cujo conteúdo define se uma cotação mudou (hash por symbol/trading_date)
+RAW_STOCK_PRICES_HASHED = [
+    'open_price', 'high_price', 'low_price', 'close_price', 'volume', 'exchange'
+]
+
+# Colunas carregadas na tabela de quarentena
+RAW_STOCK_PRICES_QUARANTINE_COLUMNS = ['source', 'batch_id', 'symbol', 'record', 'failed_rules']
+
+# Fração máxima de registros inválidos tolerada por lote antes de bloquear a carga
+DEFAULT_MAX_FAILURE_RATIO = 0.05
+
+# Fontes com watermark próprio em ingestion_watermarks
+API_SOURCE = 'api'
+HISTORICAL_SOURCE = 'historical_csv'
+
+# Diretório compartilhado entre os workers para os arquivos intermediários (Parquet)
+FINANCIAL_DATA_DIR = '/opt/airflow/data/financial'
+
+# Tamanho de página usado nas consultas à API financeira
+API_PAGE_LIMIT = 500
+
+# Máximo de shards processados simultaneamente no DAG de backfill.
+# Lido do ambiente (e não de uma Variable) por ser usado no parse do DAG.
+BACKFILL_MAX_PARALLEL = int(os.environ.get('FINANCIAL_BACKFILL_MAX_PARALLEL', 8))
+
 # Funções auxiliares
+def _get_bulk_load_chunk_size():
+    """
+    Quantidade de registros por comando COPY nas cargas em massa.
+    Pode ser ajustada pela Variable `bulk_load_chunk_size`.
+    """
+    return int(Variable.get("bulk_load_chunk_size", default_var=DEFAULT_CHUNK_SIZE))
+
+def _data_path(*parts):
+    """
+    Caminho de um arquivo intermediário no diretório compartilhado
+    (Variable `financial_data_dir`), visível por todos os workers.
+    """
+    return os.path.join(Variable.get("financial_data_dir", default_var=FINANCIAL_DATA_DIR), *parts)
+
+def _get_max_failure_ratio():
+    """
+    Fração máxima de registros inválidos aceita em um lote. Até esse limite
+    as linhas inválidas vão para a quarentena e as válidas seguem para a
+    carga; acima dele, a carga do lote é bloqueada. Pode ser ajustada pela
+    Variable `validation_max_failure_ratio` (0 volta ao tudo-ou-nada).
+    """
+    return float(Variable.get("validation_max_failure_ratio", default_var=DEFAULT_MAX_FAILURE_RATIO))
+
+def _is_incremental(context):
+    """
+    Indica se a execução está no modo incremental (padrão).
+    """
+    return bool(context.get('params', {}).get('incremental', True))
+
+def _get_overlap_days():
+    """
+    Dias já carregados que a janela incremental volta a buscar (Variable
+    `incremental_overlap_days`); 0 busca apenas as datas novas.
+    """
+    return int(Variable.get("incremental_overlap_days", default_var=0))
+
+def _get_source_watermark(source, context=None):
+    """
+    Lê o watermark atual de uma fonte de dados.
+    """
+    with pooled_connection('postgres_pipeline', context) as conn:
+        return get_watermark(conn, source)
+
+def _read_stock_dates(data_path):
+    """
+    Datas de pregão distintas de um arquivo, lendo apenas a coluna `date`.
+    """
+    dates = pd.to_datetime(read_stock_table(data_path, columns=['date'])['date'], errors='coerce')
+    return dates.dropna().dt.normalize().unique()
+
+def _prepare_stock_partitions(data_path, context):
+    """
+    Cria as partições de raw_stock_prices para as datas de um arquivo, em
+    uma transação curta e separada da carga (o lock da criação não fica
+    preso durante o COPY), e retorna a tabela de destino do upsert: a
+    própria partição quando o arquivo cobre um único mês.
+    """
+    dates = _read_stock_dates(data_path)
+    if len(dates) == 0:
+        return RAW_STOCK_PRICES_TABLE
+    
+    with track_stage('prepare_partitions'), pooled_connection('postgres_pipeline', context) as conn:
+        created = ensure_partitions(conn, RAW_STOCK_PRICES_TABLE, dates)
+        conn.commit()
+    if created:
+        print(f"Partições criadas: {', '.join(created)}")
+    return target_table(RAW_STOCK_PRICES_TABLE, dates)
+
+def _manage_partitions(**context):
+    """
+    Manutenção das partições de raw_stock_prices: migra uma tabela anterior
+    não particionada, cria as partições do mês corrente e dos próximos
+    (Variable `partition_premake_months`) e, se a Variable
+    `raw_stock_prices_retention_months` estiver definida, arquiva no schema
+    `archive` as partições mais antigas que a retenção.
+    """
+    retention = Variable.get("raw_stock_prices_retention_months", default_var=None)
+    
+    with pooled_connection('postgres_pipeline', context) as conn:
+        try:
+            result = maintain_partitions(
+                conn,
+                RAW_STOCK_PRICES_TABLE,
+                'trading_date',
+                context['execution_date'],
+                premake=int(Variable.get("partition_premake_months", default_var=DEFAULT_PREMAKE_PERIODS)),
+                retention=int(retention) if retention else None
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+    
+    print(f"Linhas migradas da tabela não particionada: {result['migrated_rows']}")
+    print(f"Partições criadas: {', '.join(result['created']) or 'nenhuma'}")
+    print(f"Partições arquivadas: {', '.join(result['archived']) or 'nenhuma'}")
+    return result
+
 def _get_current_data_date(**context):
     """
     Determina a data de referência para os dados a serem processados.
@@ -73,28 +234,30 @@ def _get_current_data_date(**context):
     context['ti'].xcom_push(key='data_date', value=data_date)
     return data_date
 
-def _fetch_api_data(**context):
+def _fetch_api_page(data_date, offset, limit):
     """
-    Busca dados da API financeira.
+    Busca uma página de cotações da API financeira.
     Em um cenário real, usaríamos uma chave de API e endpoint real.
     """
-    # Obter a data de referência
-    data_date = context['ti'].xcom_pull(key='data_date')
-    
     # Em um cenário real, teríamos um endpoint e chave de API
     # api_key = Variable.get("finance_api_key", default_var="demo_key")
-    # url = f"https://api.financial-data.com/stocks/daily?date={data_date}&apikey={api_key}"
+    # from page_fetcher import http_page_fetcher
+    # fetch_page = http_page_fetcher(
+    #     "https://api.financial-data.com/stocks/daily",
+    #     params={'date': data_date, 'apikey': api_key}
+    # )
+    # return fetch_page(offset, limit)
     
-    # Simulação de chamada de API
-    # response = requests.get(url)
-    # api_data = response.json()
+    # A simulação possui apenas uma página de dados
+    if offset > 0:
+        return {"pagination": {"offset": offset, "limit": limit, "total": 3}, "data": []}, {}
     
     # Para este exemplo, simulamos os dados da API
-    api_data = {
-        "metadata": {
-            "date": data_date,
-            "symbols": 100,
-            "status": "success"
+    api_page = {
+        "pagination": {
+            "offset": offset,
+            "limit": limit,
+            "total": 3
         },
         "data": [
             {
@@ -131,62 +294,168 @@ def _fetch_api_data(**context):
         ]
     }
     
-    # Salvar os dados para posterior processamento
-    output_path = f"/tmp/api_data_{data_date}.json"
-    with open(output_path, 'w') as outfile:
-        json.dump(api_data, outfile)
+    return api_page, {}
+
+def _fetch_api_records(fetch_dates):
+    """
+    Busca as cotações de todas as datas informadas.
+    Retorna os registros e os diretórios de checkpoint usados, que devem
+    ser removidos quando os dados estiverem persistidos.
+    """
+    max_workers = int(Variable.get("finance_api_max_workers", default_var=DEFAULT_MAX_WORKERS))
+    rate = float(Variable.get("finance_api_rate_limit", default_var=DEFAULT_RATE))
+    
+    records = []
+    checkpoint_dirs = []
+    for fetch_date in fetch_dates:
+        checkpoint_dir = _data_path('api', '_pages', fetch_date)
+        checkpoint_dirs.append(checkpoint_dir)
+        pages = fetch_pages(
+            lambda offset, limit, fetch_date=fetch_date: _fetch_api_page(fetch_date, offset, limit),
+            limit=API_PAGE_LIMIT,
+            max_workers=max_workers,
+            rate=rate,
+            checkpoint_dir=checkpoint_dir,
+            on_retry=lambda: current_stage().add_retries()
+        )
+        for _, page_records in pages:
+            records.extend(page_records)
+    
+    return records, checkpoint_dirs
+
+@instrumented()
+def _fetch_api_data(**context):
+    """
+    Busca dados da API financeira, com as páginas buscadas concorrentemente.
+    As páginas já obtidas ficam em checkpoint até o fim da tarefa, de modo
+    que uma retentativa só busca as páginas que faltam.
+    
+    No modo incremental, busca as datas posteriores ao watermark da API até
+    a data de referência, cobrindo execuções de catch-up em uma só rodada.
+    Com tudo já carregado, nenhuma página é buscada.
+    """
+    # Obter a data de referência
+    data_date = context['ti'].xcom_pull(key='data_date')
+    
+    if _is_incremental(context):
+        fetch_dates = incremental_window(
+            _get_source_watermark(API_SOURCE, context), data_date, _get_overlap_days()
+        )
+    else:
+        fetch_dates = [data_date]
+    
+    records, checkpoint_dirs = _fetch_api_records(fetch_dates)
+    
+    if fetch_dates:
+        print(f"Buscadas {len(records)} cotações para {len(fetch_dates)} data(s): "
+              f"{fetch_dates[0]} a {fetch_dates[-1]}")
+    else:
+        print(f"Watermark da API já cobre {data_date}; nenhuma data a buscar")
+    
+    metadata = {
+        "date": data_date,
+        "window": fetch_dates,
+        "symbols": len(records),
+        "status": "success"
+    }
+    
+    # Salvar os dados em Parquet para as próximas tarefas
+    output_path = write_stock_table(
+        _data_path('api', f"data_date={data_date}", 'fetched.parquet'),
+        pd.DataFrame(records),
+        metadata
+    )
+    
+    for checkpoint_dir in checkpoint_dirs:
+        PageCheckpoint(checkpoint_dir).clear()
+    
+    stage = current_stage()
+    stage.add_rows(len(records))
+    stage.add_file_written(output_path)
     
     # Retornar informações sobre os dados obtidos
     return {
         "data_date": data_date,
-        "symbols_count": len(api_data["data"]),
+        "window": fetch_dates,
+        "symbols_count": len(records),
         "output_path": output_path
     }
 
-def _validate_api_data(**context):
+def _validate_and_split(frame, max_failure_ratio, quarantine_path):
     """
-    Valida os dados obtidos da API para garantir qualidade.
+    Aplica o motor de validação colunar e separa as linhas válidas das
+    inválidas; as inválidas são gravadas em `quarantine_path`.
+    Retorna `(erros, resumo, válidas)`. Só há erros se o lote estiver vazio
+    ou se a fração de inválidos ultrapassar `max_failure_ratio`.
     """
-    # Obter informações da tarefa anterior
-    task_info = context['ti'].xcom_pull(task_ids='fetch_api_data')
-    data_path = task_info['output_path']
-    
-    # Carregar os dados
-    with open(data_path, 'r') as infile:
-        api_data = json.load(infile)
-    
-    # Validações básicas
     validation_errors = []
     
     # 1. Verificar se há dados
-    if len(api_data["data"]) == 0:
-        validation_errors.append("Nenhum dado recebido da API")
+    if frame.empty:
+        validation_errors.append("Nenhum dado recebido")
+        return validation_errors, None, frame
+    
+    # 2. Avaliar todas as regras de uma vez sobre o DataFrame
+    invalid, rule_masks = validate_stock_frame(frame)
+    summary = summarize(frame, invalid, rule_masks)
+    summary['failure_ratio'] = failure_ratio(summary)
+    summary['max_failure_ratio'] = max_failure_ratio
     
-    # 2. Verificar campos obrigatórios
-    required_fields = ["symbol", "date", "open", "high", "low", "close", "volume", "exchange"]
-    missing_fields = []
+    # 3. Separar as linhas inválidas em quarentena
+    valid, quarantined = split_quarantine(frame, invalid, rule_masks)
+    summary['quarantine_path'] = write_quarantine(quarantined, quarantine_path)
     
-    for item in api_data["data"]:
-        for field in required_fields:
-            if field not in item:
-                missing_fields.append(f"Campo '{field}' ausente para o símbolo {item.get('symbol', 'UNKNOWN')}")
+    # 4. Bloquear o lote apenas se a fração de inválidos passar do limite
+    if summary['failure_ratio'] > max_failure_ratio:
+        validation_errors.append(format_summary(summary))
+        validation_errors.append(
+            f"Fração de inválidos ({summary['failure_ratio']:.2%}) acima do limite ({max_failure_ratio:.2%})"
+        )
+        validation_errors.append(f"Linhas em quarentena: {summary['quarantine_path']}")
+    elif summary['invalid_rows']:
+        print(f"{summary['invalid_rows']} registro(s) em quarentena ({summary['failure_ratio']:.2%}); "
+              f"a carga segue com {len(valid)} registro(s) válidos\n{format_summary(summary)}")
+    
+    return validation_errors, summary, valid
+
+@instrumented()
+@profiled()
+def _validate_api_data(**context):
+    """
+    Valida os dados obtidos da API para garantir qualidade.
+    
+    Registros inválidos não bloqueiam o dia inteiro: enquanto a fração de
+    inválidos ficar dentro do limite configurado, eles vão para a quarentena
+    e apenas os válidos seguem para `load_to_raw_database`.
+    """
+    # Obter informações da tarefa anterior
+    task_info = context['ti'].xcom_pull(task_ids='fetch_api_data')
+    data_path = task_info['output_path']
+    data_date = task_info['data_date']
     
-    if missing_fields:
-        validation_errors.append("\n".join(missing_fields))
+    # Janela incremental vazia: não há o que validar, e a carga não grava nada
+    if not task_info.get('window', [data_date]):
+        context['ti'].xcom_push(key='validation_status', value='up_to_date')
+        context['ti'].xcom_push(key='validated_data', value={'output_path': data_path, 'quarantine_path': None})
+        return 'load_to_raw_database'
     
-    # 3. Verificar valores válidos (exemplo)
-    invalid_values = []
-    for item in api_data["data"]:
-        if "volume" in item and (not isinstance(item["volume"], (int, float)) or item["volume"] <= 0):
-            invalid_values.append(f"Volume inválido para {item['symbol']}: {item['volume']}")
+    # Carregar apenas as colunas validadas
+    frame = read_stock_table(data_path, columns=REQUIRED_COLUMNS)
+    current_stage().add_rows(len(frame))
+    current_stage().add_file_read(data_path)
     
-    if invalid_values:
-        validation_errors.append("\n".join(invalid_values))
+    # Validar e separar as linhas inválidas
+    validation_errors, summary, valid = _validate_and_split(
+        frame,
+        _get_max_failure_ratio(),
+        _data_path('api', f"data_date={data_date}", 'quarantine.jsonl')
+    )
+    context['ti'].xcom_push(key='validation_summary', value=summary)
     
     # Decidir o próximo passo com base na validação
     if validation_errors:
         # Registrar erros
-        error_log = f"/tmp/validation_errors_{task_info['data_date']}.log"
+        error_log = _data_path('api', f"data_date={data_date}", 'validation_errors.log')
         with open(error_log, 'w') as outfile:
             outfile.write("\n".join(validation_errors))
         
@@ -194,78 +463,132 @@ def _validate_api_data(**context):
         context['ti'].xcom_push(key='validation_errors', value=error_log)
         return 'send_validation_failure_notification'
     else:
-        context['ti'].xcom_push(key='validation_status', value='success')
+        # Apenas as linhas válidas seguem para a carga
+        valid_path = write_stock_table(
+            _data_path('api', f"data_date={data_date}", 'valid.parquet'),
+            valid,
+            read_stock_metadata(data_path)
+        )
+        current_stage().add_file_written(valid_path)
+        context['ti'].xcom_push(key='validation_status', value='partial' if summary['invalid_rows'] else 'success')
+        context['ti'].xcom_push(key='validated_data', value={
+            'output_path': valid_path,
+            'quarantine_path': summary['quarantine_path']
+        })
         return 'load_to_raw_database'
 
+def _to_raw_stock_frame(frame, ingestion_date):
+    """
+    Renomeia um bloco de cotações para as colunas de raw_stock_prices
+    e aplica o timestamp de ingestão do lote.
+    """
+    raw = frame[list(STOCK_FIELDS_TO_RAW)].rename(columns=STOCK_FIELDS_TO_RAW)
+    return raw.assign(ingestion_date=ingestion_date)
+
+def _raw_stock_batches(batches, latest_dates):
+    """
+    Converte blocos de cotações validadas para o layout de raw_stock_prices,
+    com um único timestamp de ingestão, acumulando em `latest_dates` a
+    maior data de cada bloco.
+    """
+    ingestion_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for batch in batches:
+        if not batch.empty:
+            latest_dates.append(batch['date'].max())
+            yield _to_raw_stock_frame(batch, ingestion_date)
+
+def _upsert_stock_batches(conn, batches, source, table=RAW_STOCK_PRICES_TABLE):
+    """
+    Faz o upsert em massa de blocos de cotações já validadas e avança o
+    watermark da fonte na mesma transação. Os blocos são consumidos sob
+    demanda e todos recebem o mesmo timestamp de ingestão. `table` pode ser
+    a partição de destino (ver `_prepare_stock_partitions`).
+    O commit fica a cargo do chamador. Retorna a quantidade de registros.
+    """
+    latest_dates = []
+    with track_stage('upsert_stock_batches') as stage:
+        records_count = copy_upsert_frames(
+            conn,
+            table=table,
+            columns=RAW_STOCK_PRICES_COLUMNS,
+            conflict_columns=RAW_STOCK_PRICES_KEY,
+            frames=_raw_stock_batches(batches, latest_dates),
+            hash_columns=RAW_STOCK_PRICES_HASHED
+        )
+        stage.add_rows(records_count)
+        if latest_dates:
+            advance_watermark(conn, source, max(latest_dates))
+    return records_count
+
+def _quarantine_stock_prices(conn, quarantine_path, source, batch_id):
+    """
+    Registra em raw_stock_prices_quarantine as linhas em quarentena de um
+    lote, substituindo as de uma execução anterior do mesmo lote. Não faz
+    commit: deve ser chamado na mesma transação da carga das linhas válidas.
+    Retorna a quantidade de linhas registradas.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "DELETE FROM raw_stock_prices_quarantine WHERE source = %s AND batch_id = %s",
+            (source, batch_id)
+        )
+    finally:
+        cursor.close()
+    
+    entries = read_quarantine(quarantine_path)
+    return copy_insert(
+        conn,
+        table='raw_stock_prices_quarantine',
+        columns=RAW_STOCK_PRICES_QUARANTINE_COLUMNS,
+        records=(
+            (source, batch_id, entry['record'].get('symbol'), json.dumps(entry['record']), entry['failed_rules'])
+            for entry in entries
+        ),
+        chunk_size=_get_bulk_load_chunk_size()
+    )
+
+@instrumented()
+@profiled()
 def _load_data_to_database(**context):
     """
     Carrega os dados validados no banco de dados raw.
     """
-    # Obter informações da tarefa de coleta de dados
+    # Obter informações da tarefa de coleta de dados e das linhas validadas
     task_info = context['ti'].xcom_pull(task_ids='fetch_api_data')
-    data_path = task_info['output_path']
+    validated = context['ti'].xcom_pull(task_ids='validate_api_data', key='validated_data')
+    data_path = validated['output_path']
     data_date = task_info['data_date']
     
-    # Carregar os dados
-    with open(data_path, 'r') as infile:
-        api_data = json.load(infile)
+    # Conexões do pool do DAG: a das partições é reaproveitada na carga
+    table = _prepare_stock_partitions(data_path, context)
+    current_stage().add_file_read(data_path)
     
-    # Conectar ao PostgreSQL
-    pg_hook = PostgresHook(postgres_conn_id='postgres_pipeline')
-    conn = pg_hook.get_conn()
-    cursor = conn.cursor()
+    with pooled_connection('postgres_pipeline', context) as conn:
+        try:
+            # Os dados validados são lidos e enviados ao COPY em blocos
+            records_count = _upsert_stock_batches(
+                conn, iter_stock_batches(data_path, _get_bulk_load_chunk_size()), API_SOURCE, table
+            )
+            quarantined = _quarantine_stock_prices(conn, validated['quarantine_path'], API_SOURCE, data_date)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+    current_stage().add_rows(records_count)
     
-    # Preparar inserção em lote
-    insert_query = """
-    INSERT INTO raw_stock_prices 
-    (symbol, trading_date, open_price, high_price, low_price, close_price, volume, exchange, ingestion_date)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-    ON CONFLICT (symbol, trading_date) 
-    DO UPDATE SET
-        open_price = EXCLUDED.open_price,
-        high_price = EXCLUDED.high_price,
-        low_price = EXCLUDED.low_price,
-        close_price = EXCLUDED.close_price,
-        volume = EXCLUDED.volume,
-        exchange = EXCLUDED.exchange,
-        ingestion_date = EXCLUDED.ingestion_date
-    """
-    
-    # Processar e inserir os dados
-    records = []
-    for item in api_data["data"]:
-        records.append((
-            item["symbol"],
-            item["date"],
-            item["open"],
-            item["high"],
-            item["low"],
-            item["close"],
-            item["volume"],
-            item["exchange"],
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        ))
+    # Registrar sucesso
+    context['ti'].xcom_push(key='load_status', value='success')
+    context['ti'].xcom_push(key='records_loaded', value=records_count)
     
-    try:
-        cursor.executemany(insert_query, records)
-        conn.commit()
-        
-        # Registrar sucesso
-        context['ti'].xcom_push(key='load_status', value='success')
-        context['ti'].xcom_push(key='records_loaded', value=len(records))
-        
-        return {
-            'data_date': data_date,
-            'records_processed': len(records),
-            'status': 'success'
-        }
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
+    return {
+        'data_date': data_date,
+        'records_processed': records_count,
+        'records_quarantined': quarantined,
+        'status': 'success'
+    }
 
+@instrumented()
 def _process_historical_data(**context):
     """
     Processa dados históricos de CSV para complementar dados da API.
@@ -274,22 +597,27 @@ def _process_historical_data(**context):
     # Obter a data de referência
     data_date = context['ti'].xcom_pull(key='data_date')
     
-    # Em um ambiente real, buscaríamos em um local específico
-    # Aqui simulamos um arquivo CSV
+    # Em um ambiente real, leríamos o CSV de um local específico
+    # Aqui simulamos o conteúdo do arquivo
     historical_data = [
         {"symbol": "AMZN", "date": data_date, "open": 125.67, "high": 126.98, "low": 125.01, "close": 126.45, "volume": 38291045, "exchange": "NASDAQ"},
         {"symbol": "FB", "date": data_date, "open": 201.34, "high": 204.56, "low": 200.87, "close": 203.98, "volume": 28765432, "exchange": "NASDAQ"},
         {"symbol": "TSLA", "date": data_date, "open": 267.89, "high": 270.12, "low": 265.43, "close": 269.75, "volume": 45678912, "exchange": "NASDAQ"}
     ]
     
-    # Salvar em CSV temporário
-    output_path = f"/tmp/historical_data_{data_date}.csv"
-    with open(output_path, 'w', newline='') as csvfile:
-        fieldnames = ["symbol", "date", "open", "high", "low", "close", "volume", "exchange"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in historical_data:
-            writer.writerow(row)
+    # No modo incremental, descartar linhas já cobertas pelo watermark do CSV histórico
+    if _is_incremental(context):
+        watermark = _get_source_watermark(HISTORICAL_SOURCE, context)
+        overlap_days = _get_overlap_days()
+        historical_data = [row for row in historical_data if is_new(row["date"], watermark, overlap_days)]
+    
+    # Salvar em Parquet para a tarefa de carga
+    output_path = write_stock_table(
+        _data_path('historical', f"data_date={data_date}", 'historical.parquet'),
+        pd.DataFrame(historical_data, columns=REQUIRED_COLUMNS)
+    )
+    current_stage().add_rows(len(historical_data))
+    current_stage().add_file_written(output_path)
     
     return {
         "data_date": data_date,
@@ -312,6 +640,7 @@ def _send_notification(**context):
     Data de referência: {context['ti'].xcom_pull(key='data_date')}
     Registros da API processados: {api_results['records_processed']}
     Registros históricos processados: {historical_results['records_count']}
+    Registros em quarentena: {api_results['records_quarantined'] + historical_results['records_quarantined']}
     
     Data/hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
     """
@@ -339,63 +668,286 @@ def _send_error_notification(**context):
     print(message)
     return {"status": "error_notified", "timestamp": datetime.now().isoformat()}
 
+@instrumented()
+@profiled()
 def _load_historical_data(**context):
     """
     Carrega dados históricos no banco de dados.
+    
+    O arquivo é lido em blocos de `bulk_load_chunk_size` linhas; cada bloco é
+    validado, tem as linhas inválidas enviadas para a quarentena e segue
+    para o COPY como buffer CSV, de modo que apenas um bloco fica em
+    memória mesmo para arquivos de vários GB. O arquivo inteiro é carregado
+    em uma única transação, desfeita se a fração de inválidos do arquivo
+    ultrapassar o limite configurado.
+    
+    A regra `duplicate_key` é avaliada dentro de cada bloco; repetições
+    entre blocos são resolvidas pelo merge do staging (DISTINCT ON).
     """
     # Obter informações da tarefa de processamento de dados históricos
     task_info = context['ti'].xcom_pull(task_ids='process_historical_data')
-    csv_path = task_info['output_path']
+    data_path = task_info['output_path']
+    data_date = task_info['data_date']
+    
+    chunk_size = _get_bulk_load_chunk_size()
+    max_failure_ratio = _get_max_failure_ratio()
+    quarantine_path = _data_path('historical', f"data_date={data_date}", 'quarantine.jsonl')
+    if os.path.exists(quarantine_path):
+        os.remove(quarantine_path)
+    
+    summary = {'total_rows': 0, 'invalid_rows': 0, 'rules': {}}
+    
+    def valid_chunks():
+        for chunk in iter_stock_batches(data_path, chunk_size, columns=REQUIRED_COLUMNS):
+            # Aplicar as mesmas regras usadas para a API
+            invalid, rule_masks = validate_stock_frame(chunk)
+            chunk_summary = summarize(chunk, invalid, rule_masks)
+            summary['total_rows'] += chunk_summary['total_rows']
+            summary['invalid_rows'] += chunk_summary['invalid_rows']
+            for rule, count in chunk_summary['rules'].items():
+                summary['rules'][rule] = summary['rules'].get(rule, 0) + count
+            
+            valid, quarantined = split_quarantine(chunk, invalid, rule_masks)
+            write_quarantine(quarantined, quarantine_path, append=True)
+            yield valid
+    
+    # Conexões do pool do DAG: a das partições é reaproveitada na carga
+    table = _prepare_stock_partitions(data_path, context)
+    current_stage().add_file_read(data_path)
+    
+    with pooled_connection('postgres_pipeline', context) as conn:
+        try:
+            records_count = _upsert_stock_batches(conn, valid_chunks(), HISTORICAL_SOURCE, table)
+            
+            # O limite só pode ser verificado com o arquivo inteiro lido
+            if failure_ratio(summary) > max_failure_ratio:
+                raise ValueError(
+                    f"Falha na validação do CSV histórico:\n{format_summary(summary)}\n"
+                    f"Fração de inválidos ({failure_ratio(summary):.2%}) acima do limite ({max_failure_ratio:.2%})\n"
+                    f"Linhas em quarentena: {quarantine_path}"
+                )
+            
+            quarantined = _quarantine_stock_prices(conn, quarantine_path, HISTORICAL_SOURCE, data_date)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+    current_stage().add_rows(summary['total_rows'])
+    return {"records_count": records_count, "records_quarantined": quarantined, "status": "success"}
+
+def _plan_backfill_shards(**context):
+    """
+    Divide o intervalo [start_date, end_date] do backfill em shards de
+    `shard_days` dias. Cada shard vira uma instância mapeada das tarefas
+    de busca, validação e carga.
+    
+    Com `bulk_load`, cada shard cobre exatamente um mês (a partição que
+    será carregada em massa) e `shard_days` é ignorado.
+    """
+    params = context['params']
+    if not params.get('start_date') or not params.get('end_date'):
+        raise ValueError("Informe 'start_date' e 'end_date' na configuração do backfill")
+    
+    start = datetime.strptime(params['start_date'], '%Y-%m-%d')
+    end = datetime.strptime(params['end_date'], '%Y-%m-%d')
+    shard_days = max(int(params.get('shard_days', 7)), 1)
+    
+    if end < start:
+        raise ValueError(f"Intervalo de backfill inválido: {params['start_date']} > {params['end_date']}")
+    
+    shards = []
+    shard_start = start
+    while shard_start <= end:
+        if params.get('bulk_load'):
+            month_end = datetime.combine(next_period(shard_start.date().replace(day=1)), datetime.min.time())
+            shard_end = min(month_end - timedelta(days=1), end)
+        else:
+            shard_end = min(shard_start + timedelta(days=shard_days - 1), end)
+        shards.append({
+            'shard_start': shard_start.strftime('%Y-%m-%d'),
+            'shard_end': shard_end.strftime('%Y-%m-%d')
+        })
+        shard_start = shard_end + timedelta(days=1)
+    
+    print(f"Backfill de {params['start_date']} a {params['end_date']} dividido em {len(shards)} shard(s)")
+    return shards
+
+@instrumented()
+def _fetch_backfill_shard(shard_start, shard_end, **context):
+    """
+    Busca na API todas as datas de um shard do backfill.
+    """
+    start = datetime.strptime(shard_start, '%Y-%m-%d')
+    end = datetime.strptime(shard_end, '%Y-%m-%d')
+    fetch_dates = [
+        (start + timedelta(days=offset)).strftime('%Y-%m-%d')
+        for offset in range((end - start).days + 1)
+    ]
+    
+    records, checkpoint_dirs = _fetch_api_records(fetch_dates)
+    
+    output_path = write_stock_table(
+        _data_path('backfill', f"{shard_start}_{shard_end}", 'fetched.parquet'),
+        pd.DataFrame(records),
+        {"window": fetch_dates}
+    )
+    
+    for checkpoint_dir in checkpoint_dirs:
+        PageCheckpoint(checkpoint_dir).clear()
+    
+    current_stage().add_rows(len(records))
+    current_stage().add_file_written(output_path)
+    
+    return {
+        'shard_start': shard_start,
+        'shard_end': shard_end,
+        'output_path': output_path
+    }
+
+@instrumented()
+@profiled()
+def _validate_backfill_shard(shard_start, shard_end, output_path, **context):
+    """
+    Valida os dados de um shard. Linhas inválidas vão para a quarentena;
+    um shard acima do limite de inválidos falha isoladamente, sem
+    interromper os demais.
+    """
+    frame = read_stock_table(output_path, columns=REQUIRED_COLUMNS)
+    current_stage().add_rows(len(frame))
+    current_stage().add_file_read(output_path)
+    validation_errors, summary, valid = _validate_and_split(
+        frame,
+        _get_max_failure_ratio(),
+        _data_path('backfill', f"{shard_start}_{shard_end}", 'quarantine.jsonl')
+    )
+    if validation_errors:
+        raise ValueError(
+            f"Falha na validação do shard {shard_start} a {shard_end}:\n" + "\n".join(validation_errors)
+        )
+    
+    valid_path = write_stock_table(
+        _data_path('backfill', f"{shard_start}_{shard_end}", 'valid.parquet'),
+        valid,
+        read_stock_metadata(output_path)
+    )
+    current_stage().add_file_written(valid_path)
+    
+    return {
+        'shard_start': shard_start,
+        'shard_end': shard_end,
+        'output_path': valid_path,
+        'quarantine_path': summary['quarantine_path']
+    }
+
+def _bulk_load_stock_partition(pg_hook, data_path, quarantine_path, batch_id, context):
+    """
+    Carga em massa de um mês inteiro de cotações: as linhas vão para uma
+    tabela avulsa sem índices, os índices são construídos depois, em
+    paralelo (Variable `bulk_load_index_workers`), e a tabela é anexada
+    como partição. O ATTACH, o watermark e a quarentena são gravados em uma
+    única transação, de modo que os dados só ficam visíveis completos.
     
-    # Carregar o CSV em um DataFrame
-    df = pd.read_csv(csv_path)
+    Retorna `(registros, em_quarentena)`, ou None se o arquivo não couber
+    em uma única partição ou se a partição já tiver dados (caso em que a
+    carga com upsert deve ser usada).
     
-    # Conectar ao PostgreSQL
+    A carga usa uma conexão do pool do DAG; cada índice é construído em uma
+    conexão nova de `pg_hook`, fora do pool, com `autocommit`.
+    """
+    dates = _read_stock_dates(data_path)
+    if len(dates) == 0 or target_table(RAW_STOCK_PRICES_TABLE, dates) == RAW_STOCK_PRICES_TABLE:
+        return None
+    
+    with pooled_connection('postgres_pipeline', context) as conn:
+        loading_table = None
+        try:
+            partition = target_table(RAW_STOCK_PRICES_TABLE, dates)
+            if not is_empty(conn, partition):
+                print(f"{partition} já tem dados; carga em massa não se aplica")
+                return None
+            
+            loading_table = create_loading_table(conn, RAW_STOCK_PRICES_TABLE, 'trading_date', dates[0])
+            latest_dates = []
+            with track_stage('copy_loading_table') as stage:
+                records_count = copy_insert_frames(
+                    conn,
+                    table=loading_table,
+                    columns=RAW_STOCK_PRICES_COLUMNS,
+                    distinct_columns=RAW_STOCK_PRICES_KEY,
+                    frames=_raw_stock_batches(iter_stock_batches(data_path, _get_bulk_load_chunk_size()), latest_dates),
+                    hash_columns=RAW_STOCK_PRICES_HASHED
+                )
+                conn.commit()
+                stage.add_rows(records_count)
+            
+            with track_stage('build_partition_indexes'):
+                build_partition_indexes(
+                    pg_hook.get_conn, RAW_STOCK_PRICES_TABLE, loading_table,
+                    max_workers=int(Variable.get("bulk_load_index_workers", default_var=DEFAULT_INDEX_BUILD_WORKERS))
+                )
+            
+            attach_loading_table(conn, RAW_STOCK_PRICES_TABLE, loading_table, 'trading_date', dates[0])
+            if latest_dates:
+                advance_watermark(conn, API_SOURCE, max(latest_dates))
+            quarantined = _quarantine_stock_prices(conn, quarantine_path, API_SOURCE, batch_id)
+            conn.commit()
+            loading_table = None
+            print(f"Partição {partition} carregada em massa e anexada")
+            return records_count, quarantined
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            # Tabela avulsa de uma tentativa que falhou antes do ATTACH
+            if loading_table:
+                cursor = conn.cursor()
+                cursor.execute(f"DROP TABLE IF EXISTS {loading_table}")
+                conn.commit()
+                cursor.close()
+
+@instrumented()
+@profiled()
+def _load_backfill_shard(shard_start, shard_end, output_path, quarantine_path=None, **context):
+    """
+    Carrega os dados validados de um shard em raw_stock_prices e registra
+    as linhas em quarentena do shard. Com o parâmetro `bulk_load`, um mês
+    ainda vazio é carregado em massa, com os índices construídos depois
+    da carga; nos demais casos, é feito o upsert na partição.
+    """
     pg_hook = PostgresHook(postgres_conn_id='postgres_pipeline')
-    conn = pg_hook.get_conn()
-    cursor = conn.cursor()
+    batch_id = f"backfill_{shard_start}_{shard_end}"
     
-    # Preparar inserção em lote
-    insert_query = """
-    INSERT INTO raw_stock_prices 
-    (symbol, trading_date, open_price, high_price, low_price, close_price, volume, exchange, ingestion_date)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-    ON CONFLICT (symbol, trading_date) 
-    DO UPDATE SET
-        open_price = EXCLUDED.open_price,
-        high_price = EXCLUDED.high_price,
-        low_price = EXCLUDED.low_price,
-        close_price = EXCLUDED.close_price,
-        volume = EXCLUDED.volume,
-        exchange = EXCLUDED.exchange,
-        ingestion_date = EXCLUDED.ingestion_date
-    """
-    
-    # Processar e inserir os dados
-    records = []
-    for _, row in df.iterrows():
-        records.append((
-            row["symbol"],
-            row["date"],
-            row["open"],
-            row["high"],
-            row["low"],
-            row["close"],
-            row["volume"],
-            row["exchange"],
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        ))
+    if context['params'].get('bulk_load'):
+        result = _bulk_load_stock_partition(pg_hook, output_path, quarantine_path, batch_id, context)
+        if result is not None:
+            records_count, quarantined = result
+            current_stage().add_rows(records_count)
+            return {
+                'shard_start': shard_start,
+                'shard_end': shard_end,
+                'records_processed': records_count,
+                'records_quarantined': quarantined
+            }
     
-    try:
-        cursor.executemany(insert_query, records)
-        conn.commit()
-        return {"records_count": len(records), "status": "success"}
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
+    table = _prepare_stock_partitions(output_path, context)
+    with pooled_connection('postgres_pipeline', context) as conn:
+        try:
+            records_count = _upsert_stock_batches(
+                conn, iter_stock_batches(output_path, _get_bulk_load_chunk_size()), API_SOURCE, table
+            )
+            quarantined = _quarantine_stock_prices(conn, quarantine_path, API_SOURCE, batch_id)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+    current_stage().add_rows(records_count)
+    
+    return {
+        'shard_start': shard_start,
+        'shard_end': shard_end,
+        'records_processed': records_count,
+        'records_quarantined': quarantined
+    }
 
 # Definição das tarefas do DAG
 
@@ -404,8 +956,21 @@ create_tables = PostgresOperator(
     task_id='create_tables',
     postgres_conn_id='postgres_pipeline',
     sql="""
+    -- Uma raw_stock_prices anterior, não particionada, é renomeada para ser
+    -- migrada pela tarefa manage_partitions; seus índices nomeados são
+    -- removidos para que os nomes sejam recriados na tabela particionada
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('raw_stock_prices') AND relkind = 'r') THEN
+            ALTER TABLE raw_stock_prices RENAME TO raw_stock_prices_unpartitioned;
+            DROP INDEX IF EXISTS idx_stock_symbol, idx_stock_date;
+        END IF;
+    END $$;
+    
+    -- Particionada por mês de trading_date; as partições são criadas por
+    -- manage_partitions e pelas cargas
     CREATE TABLE IF NOT EXISTS raw_stock_prices (
-        id SERIAL PRIMARY KEY,
+        id SERIAL,
         symbol VARCHAR(10) NOT NULL,
         trading_date DATE NOT NULL,
         open_price NUMERIC(10, 2) NOT NULL,
@@ -415,15 +980,46 @@ create_tables = PostgresOperator(
         volume BIGINT NOT NULL,
         exchange VARCHAR(20) NOT NULL,
         ingestion_date TIMESTAMP NOT NULL,
+        row_hash CHAR(32),
+        PRIMARY KEY (id, trading_date),
         UNIQUE(symbol, trading_date)
-    );
+    ) PARTITION BY RANGE (trading_date);
     
+    -- Índices criados na tabela pai valem para todas as partições
     CREATE INDEX IF NOT EXISTS idx_stock_symbol ON raw_stock_prices(symbol);
     CREATE INDEX IF NOT EXISTS idx_stock_date ON raw_stock_prices(trading_date);
+    
+    -- Linhas rejeitadas pela validação, com o registro original e as regras violadas
+    CREATE TABLE IF NOT EXISTS raw_stock_prices_quarantine (
+        id SERIAL PRIMARY KEY,
+        source VARCHAR(50) NOT NULL,
+        batch_id VARCHAR(50) NOT NULL,
+        symbol TEXT,
+        record JSONB NOT NULL,
+        failed_rules TEXT NOT NULL,
+        quarantined_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_quarantine_batch ON raw_stock_prices_quarantine(source, batch_id);
+    
+    -- Watermarks da ingestão incremental, por fonte de dados
+    CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+        source VARCHAR(50) PRIMARY KEY,
+        high_water_mark DATE NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
     """,
     dag=dag
 )
 
+# Migrar/criar/arquivar partições de raw_stock_prices
+manage_partitions = PythonOperator(
+    task_id='manage_partitions',
+    python_callable=_manage_partitions,
+    provide_context=True,
+    dag=dag
+)
+
 # Obter a data de referência para os dados
 get_data_date = PythonOperator(
     task_id='get_data_date',
@@ -433,15 +1029,15 @@ get_data_date = PythonOperator(
 )
 
 # Verificar se a API está disponível
-check_api = HttpSensor(
+# Enquanto a API estiver fora, a espera fica no triggerer, sem ocupar slot de worker
+check_api = DeferrableHttpSensor(
     task_id='check_api',
     http_conn_id='financial_api',
     endpoint='status',
     request_params={},
-    response_check=lambda response: response.status_code == 200,
+    expected_status=200,
     poke_interval=60,  # verificar a cada 60 segundos
     timeout=600,  # timeout após 10 minutos
-    mode='poke',
     dag=dag
 )
 
@@ -510,10 +1106,78 @@ trigger_spark_processing = BashOperator(
 )
 
 # Definição das dependências do DAG
-create_tables >> get_data_date >> check_api >> fetch_api_data >> validate_api_data
+create_tables >> manage_partitions >> get_data_date >> check_api >> fetch_api_data >> validate_api_data
 
 validate_api_data >> [load_to_raw_database, send_validation_failure_notification]
 
 load_to_raw_database >> process_historical_data >> load_historical_data >> send_success_notification
 
 send_success_notification >> trigger_spark_processing
+
+# DAG de backfill paralelo por intervalo de datas
+# Disparado manualmente, por exemplo:
+# airflow dags trigger financial_data_backfill --conf '{"start_date": "2024-01-01", "end_date": "2024-12-31"}'
+backfill_dag = DAG(
+    'financial_data_backfill',
+    default_args=default_args,
+    description='Backfill paralelo de dados financeiros por intervalo de datas',
+    schedule_interval=None,
+    catchup=False,
+    max_active_runs=1,
+    params={
+        'start_date': None,  # YYYY-MM-DD, obrigatório
+        'end_date': None,  # YYYY-MM-DD, obrigatório
+        'shard_days': 7,
+        # Carrega cada mês ainda vazio em uma partição nova, sem índices,
+        # e constrói os índices depois da carga (um shard por mês)
+        'bulk_load': False,
+        # Executa as tarefas de validação e carga sob o profiler (plugins/task_profiler.py)
+        'profile': False
+    },
+    doc_md=__doc__
+)
+
+backfill_create_tables = PostgresOperator(
+    task_id='create_tables',
+    postgres_conn_id='postgres_pipeline',
+    sql=create_tables.sql,
+    dag=backfill_dag
+)
+
+backfill_manage_partitions = PythonOperator(
+    task_id='manage_partitions',
+    python_callable=_manage_partitions,
+    provide_context=True,
+    dag=backfill_dag
+)
+
+plan_backfill_shards = PythonOperator(
+    task_id='plan_backfill_shards',
+    python_callable=_plan_backfill_shards,
+    provide_context=True,
+    dag=backfill_dag
+)
+
+# Tarefas mapeadas: uma instância por shard, limitadas a BACKFILL_MAX_PARALLEL simultâneas
+fetch_backfill_shard = PythonOperator.partial(
+    task_id='fetch_backfill_shard',
+    python_callable=_fetch_backfill_shard,
+    max_active_tis_per_dag=BACKFILL_MAX_PARALLEL,
+    dag=backfill_dag
+).expand(op_kwargs=plan_backfill_shards.output)
+
+validate_backfill_shard = PythonOperator.partial(
+    task_id='validate_backfill_shard',
+    python_callable=_validate_backfill_shard,
+    max_active_tis_per_dag=BACKFILL_MAX_PARALLEL,
+    dag=backfill_dag
+).expand(op_kwargs=fetch_backfill_shard.output)
+
+load_backfill_shard = PythonOperator.partial(
+    task_id='load_backfill_shard',
+    python_callable=_load_backfill_shard,
+    max_active_tis_per_dag=BACKFILL_MAX_PARALLEL,
+    dag=backfill_dag
+).expand(op_kwargs=validate_backfill_shard.output)
+
+backfill_create_tables >> backfill_manage_partitions >> plan_backfill_shards
@@ -0,0 +1,264 @@
+"""
+## Bulk Loader para PostgreSQL
+
+Carga em massa baseada em COPY FROM STDIN: os registros são transmitidos
+em blocos para uma tabela temporária de staging e, em seguida, mesclados
+na tabela final com um único INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+
+Substitui o padrão `cursor.executemany` com INSERT por linha, que faz uma
+ida e volta ao banco para cada registro.
+
+`copy_upsert` recebe tuplas; `copy_upsert_frames` recebe blocos de
+DataFrame já no layout da tabela, serializados direto para CSV.
+`copy_insert_frames` faz a mesma carga em uma tabela vazia e sem índices
+(ex.: partição em carga em massa), sem depender de ON CONFLICT.
+"""
+
+import csv
+import io
+from itertools import islice
+
+# Quantidade padrão de registros enviados por comando COPY
+DEFAULT_CHUNK_SIZE = 50000
+
+# Coluna do staging com a ordem de chegada das linhas (desempate do DISTINCT ON)
+STAGING_ORDER_COLUMN = '_load_order'
+
+
+def _chunked(records, chunk_size):
+    """
+    Divide um iterável de registros em blocos de até `chunk_size` itens,
+    sem materializar a sequência completa em memória.
+    """
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _to_csv_buffer(rows):
+    """
+    Serializa um bloco de tuplas em um buffer CSV pronto para o COPY.
+    Valores None são escritos como campo vazio, interpretado como NULL.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerows(rows)
+    buffer.seek(0)
+    return buffer
+
+
+def _create_staging(cursor, table, columns):
+    """
+    Cria a tabela temporária de staging com a mesma estrutura das colunas
+    carregadas, descartada automaticamente ao final da transação. A coluna
+    `_load_order`, preenchida pelo COPY na ordem das linhas, desempata
+    registros repetidos da chave: vale o último do lote.
+    """
+    staging_table = f"_staging_{table}"
+    # Sobra de uma carga anterior na mesma transação; pg_temp garante que
+    # só a tabela temporária é removida, nunca uma permanente de mesmo nome
+    cursor.execute(f"DROP TABLE IF EXISTS pg_temp.{staging_table}")
+    cursor.execute(f"""
+        CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+        SELECT {", ".join(columns)} FROM {table} WITH NO DATA
+    """)
+    cursor.execute(
+        f"ALTER TABLE {staging_table} ADD COLUMN {STAGING_ORDER_COLUMN} BIGINT GENERATED ALWAYS AS IDENTITY"
+    )
+    return staging_table
+
+
+def _copy_frames(cursor, staging_table, columns, frames):
+    """
+    Envia cada DataFrame de `frames` ao staging em um comando COPY.
+    Retorna a quantidade de registros enviados.
+    """
+    copy_sql = f"COPY {staging_table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    total_records = 0
+    for frame in frames:
+        if frame.empty:
+            continue
+        buffer = io.StringIO()
+        frame.to_csv(buffer, columns=columns, header=False, index=False)
+        buffer.seek(0)
+        cursor.copy_expert(copy_sql, buffer)
+        total_records += len(frame)
+    return total_records
+
+
+def _merge_staging(cursor, table, staging_table, columns, conflict_columns,
+                   update_columns, hash_columns, hash_column):
+    """
+    Mescla o staging na tabela final com um único INSERT ... SELECT ... ON CONFLICT.
+    Retorna a quantidade de linhas inseridas ou atualizadas.
+    """
+    if update_columns is None:
+        update_columns = [col for col in columns if col not in conflict_columns]
+
+    column_list = ", ".join(columns)
+    conflict_list = ", ".join(conflict_columns)
+
+    insert_columns = list(columns)
+    select_list = column_list
+    if hash_columns:
+        insert_columns.append(hash_column)
+        update_columns = list(update_columns) + [hash_column]
+        select_list += f", md5(ROW({', '.join(hash_columns)})::text)"
+
+    if update_columns:
+        update_clause = "DO UPDATE SET " + ", ".join(
+            f"{col} = EXCLUDED.{col}" for col in update_columns
+        )
+        if hash_columns:
+            update_clause += f" WHERE {table}.{hash_column} IS DISTINCT FROM EXCLUDED.{hash_column}"
+    else:
+        update_clause = "DO NOTHING"
+
+    # DISTINCT ON evita que o mesmo registro apareça duas vezes no
+    # mesmo comando, o que o ON CONFLICT DO UPDATE não permite; entre
+    # repetições, fica a última linha do lote
+    cursor.execute(f"""
+        INSERT INTO {table} ({", ".join(insert_columns)})
+        SELECT DISTINCT ON ({conflict_list}) {select_list}
+        FROM {staging_table}
+        ORDER BY {conflict_list}, {STAGING_ORDER_COLUMN} DESC
+        ON CONFLICT ({conflict_list})
+        {update_clause}
+    """)
+    return cursor.rowcount
+
+
+def copy_upsert(conn, table, columns, conflict_columns, records,
+                update_columns=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                hash_columns=None, hash_column='row_hash'):
+    """
+    Carrega `records` em `table` via COPY para staging + merge set-based.
+
+    - `columns`: ordem das colunas em cada tupla de `records`
+    - `conflict_columns`: chave única usada no ON CONFLICT
+    - `update_columns`: colunas atualizadas em caso de conflito
+      (por padrão, todas as colunas fora da chave)
+    - `chunk_size`: registros por comando COPY, limitando o uso de memória
+    - `hash_columns`: se informado, grava em `hash_column` um md5 do
+      conteúdo dessas colunas e só atualiza as linhas cujo hash mudou;
+      linhas inalteradas não geram nenhuma escrita
+
+    A função não faz commit; o controle da transação fica com o chamador.
+    Retorna a quantidade de registros enviados ao staging.
+    """
+    cursor = conn.cursor()
+    try:
+        staging_table = _create_staging(cursor, table, columns)
+
+        copy_sql = f"COPY {staging_table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        total_records = 0
+        for chunk in _chunked(records, chunk_size):
+            cursor.copy_expert(copy_sql, _to_csv_buffer(chunk))
+            total_records += len(chunk)
+
+        if total_records == 0:
+            return 0
+
+        affected = _merge_staging(cursor, table, staging_table, columns, conflict_columns,
+                                  update_columns, hash_columns, hash_column)
+
+        print(f"{table}: {total_records} registros enviados, "
+              f"{affected} inseridos ou atualizados")
+
+        return total_records
+    finally:
+        cursor.close()
+
+
+def copy_upsert_frames(conn, table, columns, conflict_columns, frames,
+                       update_columns=None, hash_columns=None, hash_column='row_hash'):
+    """
+    Variante de `copy_upsert` para um iterável de DataFrames (ex.: os blocos
+    de `pd.read_csv(chunksize=...)`). Cada bloco é serializado diretamente
+    em um buffer CSV com `DataFrame.to_csv`, sem passar por tuplas Python,
+    e enviado em um comando COPY; o merge é feito uma única vez ao final.
+    Como os blocos são consumidos sob demanda, apenas um fica em memória.
+
+    Os DataFrames devem conter `columns`. Valores nulos viram NULL.
+    A função não faz commit. Retorna a quantidade de registros enviados.
+    """
+    cursor = conn.cursor()
+    try:
+        staging_table = _create_staging(cursor, table, columns)
+        total_records = _copy_frames(cursor, staging_table, columns, frames)
+
+        if total_records == 0:
+            return 0
+
+        affected = _merge_staging(cursor, table, staging_table, columns, conflict_columns,
+                                  update_columns, hash_columns, hash_column)
+
+        print(f"{table}: {total_records} registros enviados, "
+              f"{affected} inseridos ou atualizados")
+
+        return total_records
+    finally:
+        cursor.close()
+
+
+def copy_insert_frames(conn, table, columns, distinct_columns, frames,
+                       hash_columns=None, hash_column='row_hash'):
+    """
+    Carrega blocos de DataFrame em uma tabela vazia e sem índices: COPY
+    para staging e um único INSERT ... SELECT DISTINCT ON, que remove as
+    repetições de `distinct_columns` sem exigir um índice único para o
+    ON CONFLICT (entre repetições, fica a última linha do lote).
+    `hash_columns` grava o mesmo hash de `copy_upsert`, para
+    que upserts posteriores continuem descartando linhas inalteradas.
+
+    A função não faz commit. Retorna a quantidade de registros enviados.
+    """
+    cursor = conn.cursor()
+    try:
+        staging_table = _create_staging(cursor, table, columns)
+        total_records = _copy_frames(cursor, staging_table, columns, frames)
+
+        if total_records == 0:
+            return 0
+
+        insert_columns = list(columns)
+        select_list = ", ".join(columns)
+        if hash_columns:
+            insert_columns.append(hash_column)
+            select_list += f", md5(ROW({', '.join(hash_columns)})::text)"
+
+        distinct_list = ", ".join(distinct_columns)
+        cursor.execute(f"""
+            INSERT INTO {table} ({", ".join(insert_columns)})
+            SELECT DISTINCT ON ({distinct_list}) {select_list}
+            FROM {staging_table}
+            ORDER BY {distinct_list}, {STAGING_ORDER_COLUMN} DESC
+        """)
+
+        print(f"{table}: {total_records} registros enviados, {cursor.rowcount} inseridos")
+
+        return total_records
+    finally:
+        cursor.close()
+
+
+def copy_insert(conn, table, columns, records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Anexa `records` a `table` diretamente via COPY, sem staging nem merge.
+    Adequado para tabelas sem chave de unicidade (ex.: quarentena, logs).
+
+    A função não faz commit. Retorna a quantidade de registros enviados.
+    """
+    copy_sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    total_records = 0
+    cursor = conn.cursor()
+    try:
+        for chunk in _chunked(records, chunk_size):
+            cursor.copy_expert(copy_sql, _to_csv_buffer(chunk))
+            total_records += len(chunk)
+        return total_records
+    finally:
+        cursor.close()
@@ -0,0 +1,141 @@
+"""
+## Sensor HTTP deferrable
+
+Versão deferrable do `HttpSensor`: em vez de ocupar um slot de worker
+entre uma verificação e outra (mode='poke'), a tarefa faz uma verificação
+imediata e, se o endpoint ainda não estiver disponível, é suspensa
+(estado `deferred`) e a espera passa para um trigger assíncrono executado
+no triggerer. Um único triggerer atende centenas de esperas simultâneas,
+e o slot do worker só volta a ser usado quando o endpoint responde.
+
+A requisição HTTP em si continua síncrona (`HttpHook`), mas é executada
+em uma thread do executor do event loop, sem bloquear os demais triggers.
+"""
+
+import asyncio
+from datetime import timedelta
+
+import requests
+from airflow.exceptions import AirflowException
+from airflow.providers.http.hooks.http import HttpHook
+from airflow.sensors.base import BaseSensorOperator
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+# Timeout de cada requisição de verificação, em segundos
+DEFAULT_REQUEST_TIMEOUT = 30
+
+
+def check_http_status(http_conn_id, endpoint, method='GET', request_params=None,
+                      request_timeout=DEFAULT_REQUEST_TIMEOUT):
+    """
+    Faz uma requisição ao endpoint e retorna o status HTTP,
+    ou None se a conexão falhar.
+    """
+    hook = HttpHook(method=method, http_conn_id=http_conn_id)
+    try:
+        response = hook.run(
+            endpoint,
+            data=request_params,
+            extra_options={'check_response': False, 'timeout': request_timeout}
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Falha ao consultar {endpoint}: {e}")
+        return None
+    return response.status_code
+
+
+class HttpStatusTrigger(BaseTrigger):
+    """
+    Consulta o endpoint a cada `poke_interval` segundos até obter
+    `expected_status`. O timeout total é controlado pelo `defer` do sensor.
+    """
+
+    def __init__(self, http_conn_id, endpoint, method='GET', request_params=None,
+                 expected_status=200, poke_interval=60.0):
+        super().__init__()
+        self.http_conn_id = http_conn_id
+        self.endpoint = endpoint
+        self.method = method
+        self.request_params = request_params
+        self.expected_status = expected_status
+        self.poke_interval = poke_interval
+
+    def serialize(self):
+        return (
+            "deferrable_http_sensor.HttpStatusTrigger",
+            {
+                'http_conn_id': self.http_conn_id,
+                'endpoint': self.endpoint,
+                'method': self.method,
+                'request_params': self.request_params,
+                'expected_status': self.expected_status,
+                'poke_interval': self.poke_interval,
+            }
+        )
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            status = await loop.run_in_executor(
+                None, check_http_status,
+                self.http_conn_id, self.endpoint, self.method, self.request_params
+            )
+            if status == self.expected_status:
+                yield TriggerEvent({'status': 'success', 'http_status': status})
+                return
+            self.log.info("Endpoint %s respondeu %s; nova verificação em %ss",
+                          self.endpoint, status, self.poke_interval)
+            await asyncio.sleep(self.poke_interval)
+
+
+class DeferrableHttpSensor(BaseSensorOperator):
+    """
+    Aguarda um endpoint HTTP responder `expected_status` sem ocupar um
+    slot de worker durante a espera.
+
+    Com `deferrable=False`, comporta-se como um sensor comum
+    (respeitando `mode`), útil em ambientes sem triggerer.
+    """
+
+    template_fields = ('endpoint', 'request_params')
+
+    def __init__(self, *, http_conn_id, endpoint, method='GET', request_params=None,
+                 expected_status=200, deferrable=True, **kwargs):
+        super().__init__(**kwargs)
+        self.http_conn_id = http_conn_id
+        self.endpoint = endpoint
+        self.method = method
+        self.request_params = request_params
+        self.expected_status = expected_status
+        self.deferrable = deferrable
+
+    def poke(self, context):
+        status = check_http_status(self.http_conn_id, self.endpoint, self.method, self.request_params)
+        self.log.info("Endpoint %s respondeu %s", self.endpoint, status)
+        return status == self.expected_status
+
+    def execute(self, context):
+        if not self.deferrable:
+            return super().execute(context)
+
+        # Verificação imediata: se o endpoint já está disponível, não há defer
+        if self.poke(context):
+            return
+
+        self.defer(
+            trigger=HttpStatusTrigger(
+                http_conn_id=self.http_conn_id,
+                endpoint=self.endpoint,
+                method=self.method,
+                request_params=self.request_params,
+                expected_status=self.expected_status,
+                poke_interval=self.poke_interval,
+            ),
+            method_name='execute_complete',
+            timeout=timedelta(seconds=self.timeout),
+        )
+
+    def execute_complete(self, context, event=None):
+        if not event or event.get('status') != 'success':
+            raise AirflowException(f"Endpoint {self.endpoint} indisponível: {event}")
+        self.log.info("Endpoint %s disponível (HTTP %s)", self.endpoint, event['http_status'])
@@ -0,0 +1,104 @@
+"""
+## Armazenamento intermediário de cotações em Parquet
+
+Camada de troca de dados entre as tarefas do DAG de ingestão financeira.
+Cada etapa grava as cotações uma única vez em Parquet comprimido, com o
+esquema de `STOCK_SCHEMA`, e as etapas seguintes leem o arquivo com
+memory map e apenas as colunas de que precisam, sem reinterpretar JSON
+ou CSV a cada tarefa.
+
+Os arquivos ficam em um diretório compartilhado entre os workers (e não
+no `/tmp` local de cada um), de modo que tarefas de um mesmo run podem
+ser executadas em máquinas diferentes.
+"""
+
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Esquema das cotações no formato da API / CSV histórico
+STOCK_SCHEMA = pa.schema([
+    ('symbol', pa.string()),
+    ('date', pa.string()),
+    ('open', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+    ('volume', pa.int64()),
+    ('exchange', pa.string()),
+])
+
+DEFAULT_COMPRESSION = 'zstd'
+
+# Chave dos metadados do lote (janela buscada, data de referência, ...) no Parquet
+METADATA_KEY = b'stock_metadata'
+
+
+def _to_arrow_column(values, field):
+    """
+    Converte uma coluna para o tipo do esquema. Colunas com valores que não
+    podem ser convertidos (ex.: texto em campo numérico vindo da API) são
+    mantidas como texto, para que a validação as identifique e a quarentena
+    preserve o valor original.
+    """
+    try:
+        return pa.array(values, type=field.type, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        as_text = values.astype(object).where(values.isna(), values.astype(str))
+        return pa.array(as_text, type=pa.string(), from_pandas=True)
+
+
+def write_stock_table(path, frame, metadata=None, compression=DEFAULT_COMPRESSION):
+    """
+    Grava as cotações de `frame` em `path`. Colunas ausentes viram colunas
+    nulas e colunas fora do esquema são descartadas.
+    Retorna o caminho gravado.
+    """
+    arrays = []
+    fields = []
+    for field in STOCK_SCHEMA:
+        if field.name in frame.columns:
+            array = _to_arrow_column(frame[field.name], field)
+        else:
+            array = pa.nulls(len(frame), type=field.type)
+        arrays.append(array)
+        fields.append(pa.field(field.name, array.type))
+
+    schema_metadata = {METADATA_KEY: json.dumps(metadata or {}).encode()}
+    table = pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata=schema_metadata))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Grava em arquivo temporário e renomeia, para que uma retentativa
+    # nunca encontre um Parquet pela metade
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression=compression)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_stock_table(path, columns=None):
+    """
+    Lê as cotações de `path` como DataFrame, com memory map e apenas
+    as colunas informadas.
+    """
+    return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+
+def iter_stock_batches(path, batch_size, columns=None):
+    """
+    Lê as cotações de `path` em blocos de até `batch_size` linhas,
+    mantendo apenas um bloco em memória por vez.
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas()
+
+
+def read_stock_metadata(path):
+    """
+    Retorna os metadados do lote gravados com `write_stock_table`.
+    """
+    schema_metadata = pq.read_schema(path, memory_map=True).metadata or {}
+    return json.loads(schema_metadata.get(METADATA_KEY, b'{}'))
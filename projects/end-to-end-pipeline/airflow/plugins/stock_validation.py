@@ -0,0 +1,186 @@
+"""
+## Validação colunar de cotações
+
+Motor de validação baseado em regras: os dados são carregados uma única vez
+em um DataFrame e cada regra é avaliada como uma máscara vetorizada sobre as
+colunas, em vez de laços Python por registro. Usado tanto pelos dados da API
+quanto pelo CSV histórico, que compartilham o mesmo layout de colunas.
+
+Regras:
+- `missing_<coluna>`: campo obrigatório ausente ou nulo
+- `invalid_type_<coluna>`: valor não numérico em coluna numérica
+- `invalid_type_date`: data fora do formato `YYYY-MM-DD` ou inexistente
+  (ex.: 2024-02-30), que quebraria o COPY na coluna DATE e o watermark
+- `price_out_of_range`: open/close fora do intervalo [low, high]
+- `non_positive_volume`: volume menor ou igual a zero
+- `non_integer_volume`: volume fracionário (ex.: 5.5), que a conversão
+  para inteiro truncaria
+- `duplicate_key`: (symbol, date) repetido (a primeira ocorrência é mantida)
+
+No modo de aceitação parcial, `split_quarantine` separa as linhas válidas,
+que seguem para a carga, das inválidas, que vão para a quarentena com a
+lista de regras violadas.
+"""
+
+import json
+import os
+
+import pandas as pd
+
+REQUIRED_COLUMNS = ["symbol", "date", "open", "high", "low", "close", "volume", "exchange"]
+NUMERIC_COLUMNS = ["open", "high", "low", "close", "volume"]
+KEY_COLUMNS = ["symbol", "date"]
+
+
+def evaluate_rules(frame):
+    """
+    Avalia todas as regras e retorna `{regra: máscara}`; cada máscara marca
+    com True as linhas que violam a regra. Regras sem violações são omitidas.
+    """
+    masks = {}
+    numeric = {}
+
+    for column in REQUIRED_COLUMNS:
+        if column not in frame.columns:
+            masks[f"missing_{column}"] = pd.Series(True, index=frame.index)
+        else:
+            masks[f"missing_{column}"] = frame[column].isna()
+
+    for column in NUMERIC_COLUMNS:
+        if column not in frame.columns:
+            continue
+        values = frame[column]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            numeric[column] = values
+        else:
+            numeric[column] = pd.to_numeric(values, errors='coerce')
+            masks[f"invalid_type_{column}"] = numeric[column].isna() & values.notna()
+
+    if "date" in frame.columns:
+        dates = frame["date"]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            # Mesmo formato lido pelo watermark (os 10 primeiros caracteres)
+            parsed = pd.to_datetime(dates.astype(str).str[:10], format='%Y-%m-%d', errors='coerce')
+            masks["invalid_type_date"] = parsed.isna() & dates.notna()
+
+    if all(column in numeric for column in ("open", "high", "low", "close")):
+        low, high = numeric["low"], numeric["high"]
+        in_range = (
+            numeric["open"].between(low, high) & numeric["close"].between(low, high)
+        )
+        all_present = pd.concat(
+            [numeric[column] for column in ("open", "high", "low", "close")], axis=1
+        ).notna().all(axis=1)
+        masks["price_out_of_range"] = all_present & ~in_range
+
+    if "volume" in numeric:
+        masks["non_positive_volume"] = numeric["volume"] <= 0
+        masks["non_integer_volume"] = numeric["volume"].notna() & (numeric["volume"] % 1 != 0)
+
+    if all(column in frame.columns for column in KEY_COLUMNS):
+        masks["duplicate_key"] = frame.duplicated(subset=KEY_COLUMNS, keep='first')
+
+    return {rule: mask for rule, mask in masks.items() if mask.any()}
+
+
+def validate_stock_frame(frame):
+    """
+    Retorna `(máscara_inválidos, máscaras_por_regra)`.
+    """
+    rule_masks = evaluate_rules(frame)
+    invalid = pd.Series(False, index=frame.index)
+    for mask in rule_masks.values():
+        invalid |= mask
+    return invalid, rule_masks
+
+
+def summarize(frame, invalid, rule_masks):
+    """
+    Resumo compacto da validação, adequado para XCom e logs.
+    """
+    return {
+        'total_rows': int(len(frame)),
+        'invalid_rows': int(invalid.sum()),
+        'rules': {rule: int(mask.sum()) for rule, mask in rule_masks.items()}
+    }
+
+
+def failure_ratio(summary):
+    """
+    Fração de linhas inválidas (0.0 para um lote vazio).
+    """
+    if not summary['total_rows']:
+        return 0.0
+    return summary['invalid_rows'] / summary['total_rows']
+
+
+def failed_rules(rule_masks, index):
+    """
+    Série com as regras violadas por cada linha de `index`, separadas por vírgula.
+    """
+    reasons = pd.Series('', index=index, dtype=object)
+    for rule, mask in rule_masks.items():
+        hit = mask.reindex(index, fill_value=False)
+        reasons = reasons.where(~hit, reasons + rule + ',')
+    return reasons.str.rstrip(',')
+
+
+def split_quarantine(frame, invalid, rule_masks):
+    """
+    Retorna `(válidas, quarentena)`. A quarentena recebe a coluna
+    `failed_rules` com as regras violadas por cada linha.
+
+    As colunas numéricas das linhas válidas são convertidas de volta para
+    tipos numéricos (volume como inteiro, sem perda: volumes fracionários
+    já estão na quarentena), pois nulos ou textos nas linhas inválidas
+    podem ter alterado o dtype inferido para a coluna inteira.
+    """
+    quarantined = frame[invalid].copy()
+    quarantined['failed_rules'] = failed_rules(rule_masks, quarantined.index)
+
+    valid = frame[~invalid].copy()
+    if not valid.empty:
+        for column in NUMERIC_COLUMNS:
+            valid[column] = pd.to_numeric(valid[column])
+        valid['volume'] = valid['volume'].astype('int64')
+    return valid, quarantined
+
+
+def write_quarantine(quarantined, path, append=False):
+    """
+    Grava as linhas em quarentena em JSON Lines, um objeto
+    `{"record": {...}, "failed_rules": "..."}` por linha, preservando
+    os valores originais para inspeção e reprocessamento. Com `append`,
+    acrescenta ao arquivo existente (carga em blocos).
+    Retorna o caminho gravado, ou None se a quarentena estiver vazia.
+    """
+    if quarantined.empty:
+        return None
+
+    records = quarantined.drop(columns=['failed_rules'])
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a' if append else 'w') as outfile:
+        lines = records.to_json(orient='records', lines=True).splitlines()
+        for line, rules in zip(lines, quarantined['failed_rules']):
+            outfile.write(f'{{"record": {line}, "failed_rules": {json.dumps(rules)}}}\n')
+    return path
+
+
+def read_quarantine(path):
+    """
+    Lê um arquivo gravado por `write_quarantine` como lista de dicionários.
+    """
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, 'r') as infile:
+        return [json.loads(line) for line in infile if line.strip()]
+
+
+def format_summary(summary):
+    """
+    Representação textual do resumo para o log de erros.
+    """
+    lines = [f"{summary['invalid_rows']} de {summary['total_rows']} registros inválidos"]
+    for rule, count in sorted(summary['rules'].items()):
+        lines.append(f"- {rule}: {count}")
+    return "\n".join(lines)
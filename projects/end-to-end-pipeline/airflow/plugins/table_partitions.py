@@ -0,0 +1,439 @@
+"""
+## Particionamento das tabelas raw por data
+
+Manutenção de tabelas particionadas declarativamente por intervalo
+(`PARTITION BY RANGE`) em uma coluna de data, com uma partição por mês
+(ou por dia), nomeadas `<tabela>_pAAAA_MM` (ou `<tabela>_pAAAA_MM_DD`).
+
+- `ensure_partitions`: cria as partições que faltam para um conjunto de datas
+- `target_table`: partição que recebe uma carga, quando todas as datas
+  caem no mesmo período; o upsert vai direto para ela, sem roteamento de
+  linhas pela tabela pai e com o ON CONFLICT verificado em um índice menor
+- `archive_partitions`: desanexa as partições antigas e as move para um
+  schema de arquivo, onde continuam consultáveis
+- `create_loading_table`, `build_partition_indexes` e
+  `attach_loading_table`: carga em massa de um período inteiro em uma
+  tabela avulsa, sem índices, que só recebe os índices depois de carregada
+  e então é anexada como partição
+- `absorb_unpartitioned`: migra para a tabela particionada os dados de uma
+  versão anterior, não particionada, renomeada para `<tabela>_unpartitioned`
+  pelo SQL de criação
+
+Nenhuma função faz commit; o controle da transação fica com o chamador.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+MONTHLY = 'month'
+DAILY = 'day'
+
+# Schema que recebe as partições desanexadas
+DEFAULT_ARCHIVE_SCHEMA = 'archive'
+
+# Quantidade de períodos futuros criados antecipadamente
+DEFAULT_PREMAKE_PERIODS = 3
+
+UNPARTITIONED_SUFFIX = '_unpartitioned'
+
+# Sufixo da tabela avulsa usada na carga em massa de uma partição
+LOADING_SUFFIX = '_bulk'
+
+# Índices construídos simultaneamente após a carga em massa
+DEFAULT_INDEX_BUILD_WORKERS = 4
+
+# Tamanho máximo de identificadores no PostgreSQL
+_MAX_IDENTIFIER_LENGTH = 63
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def period_start(value, granularity=MONTHLY):
+    """
+    Primeiro dia do período (mês ou dia) que contém `value`.
+    """
+    day = _to_date(value)
+    return day.replace(day=1) if granularity == MONTHLY else day
+
+
+def next_period(start, granularity=MONTHLY):
+    """
+    Primeiro dia do período seguinte a `start`.
+    """
+    if granularity == MONTHLY:
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def shift_periods(value, count, granularity=MONTHLY):
+    """
+    Início do período `count` períodos depois (ou antes, se negativo) de `value`.
+    """
+    start = period_start(value, granularity)
+    if granularity == DAILY:
+        return start + timedelta(days=count)
+    months = start.year * 12 + start.month - 1 + count
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(table, value, granularity=MONTHLY):
+    start = period_start(value, granularity)
+    suffix = start.strftime('%Y_%m') if granularity == MONTHLY else start.strftime('%Y_%m_%d')
+    return f"{table}_p{suffix}"
+
+
+def _parse_partition_start(table, name):
+    match = re.match(rf"^{re.escape(table)}_p(\d{{4}})_(\d{{2}})(?:_(\d{{2}}))?$", name)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    return date(int(year), int(month), int(day or 1))
+
+
+def list_partitions(conn, table):
+    """
+    Nomes das partições atualmente anexadas a `table`.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+        """, (table,))
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def ensure_partitions(conn, table, dates, granularity=MONTHLY):
+    """
+    Garante uma partição para cada período que contém alguma das `dates`.
+    Só são criados os períodos presentes, de modo que uma data isolada muito
+    antiga não gera partições para todo o intervalo até ela.
+    Um advisory lock por tabela evita que cargas paralelas tentem criar a
+    mesma partição. Retorna os nomes das partições criadas.
+    """
+    wanted = {}
+    for value in dates:
+        start = period_start(value, granularity)
+        wanted[partition_name(table, start, granularity)] = start
+
+    # Caminho comum: todas as partições já existem e nenhum lock é tomado
+    if not set(wanted) - set(list_partitions(conn, table)):
+        return []
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table,))
+        existing = set(list_partitions(conn, table))
+        created = []
+        for name, lower in sorted(wanted.items()):
+            if name in existing:
+                continue
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{next_period(lower, granularity).isoformat()}')"
+            )
+            created.append(name)
+        return created
+    finally:
+        cursor.close()
+
+
+def target_table(table, dates, granularity=MONTHLY):
+    """
+    Tabela de destino de uma carga: a própria partição quando todas as
+    `dates` caem no mesmo período, ou a tabela pai (que roteia cada linha)
+    quando a carga atravessa períodos.
+    """
+    starts = {period_start(value, granularity) for value in dates}
+    if len(starts) == 1:
+        return partition_name(table, starts.pop(), granularity)
+    return table
+
+
+def archive_partitions(conn, table, before, granularity=MONTHLY,
+                       archive_schema=DEFAULT_ARCHIVE_SCHEMA):
+    """
+    Desanexa as partições cujo período termina até `before` e as move para
+    `archive_schema`. Os dados saem das consultas, índices e verificações
+    de conflito da tabela pai, mas continuam em `<schema>.<partição>`.
+    Retorna os nomes das partições arquivadas.
+    """
+    cutoff = period_start(before, granularity)
+    archived = []
+    cursor = conn.cursor()
+    try:
+        for name in list_partitions(conn, table):
+            start = _parse_partition_start(table, name)
+            if start is None or next_period(start, granularity) > cutoff:
+                continue
+            if not archived:
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}")
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            cursor.execute("SELECT to_regclass(%s)", (f"{archive_schema}.{name}",))
+            if cursor.fetchone()[0] is None:
+                cursor.execute(f"ALTER TABLE {name} SET SCHEMA {archive_schema}")
+            else:
+                # Período já arquivado antes (partição recriada por uma carga tardia)
+                cursor.execute(f"INSERT INTO {archive_schema}.{name} SELECT * FROM {name}")
+                cursor.execute(f"DROP TABLE {name}")
+            archived.append(name)
+        return archived
+    finally:
+        cursor.close()
+
+
+def is_empty(conn, name):
+    """
+    Indica se a tabela `name` não existe ou não tem linhas.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT to_regclass(%s)", (name,))
+        if cursor.fetchone()[0] is None:
+            return True
+        cursor.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {name})")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def create_loading_table(conn, table, date_column, value, granularity=MONTHLY):
+    """
+    Cria `<partição>_bulk`, tabela avulsa com as colunas e defaults da
+    tabela pai e nenhum índice, para receber a carga do período de `value`.
+    Um CHECK com os limites do período permite que o ATTACH dispense a
+    varredura de validação. Sobras de uma tentativa anterior são removidas.
+    Retorna o nome da tabela.
+    """
+    lower = period_start(value, granularity)
+    loading_table = partition_name(table, lower, granularity) + LOADING_SUFFIX
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {loading_table}")
+        cursor.execute(f"CREATE TABLE {loading_table} (LIKE {table} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"ALTER TABLE {loading_table} ADD CONSTRAINT {loading_table}_bounds "
+            f"CHECK ({date_column} >= '{lower.isoformat()}' "
+            f"AND {date_column} < '{next_period(lower, granularity).isoformat()}')"
+        )
+        return loading_table
+    finally:
+        cursor.close()
+
+
+def _child_index_name(table, parent_index, name):
+    suffix = parent_index[len(table) + 1:] if parent_index.startswith(f"{table}_") else parent_index
+    return f"{name}_{suffix}"[:_MAX_IDENTIFIER_LENGTH]
+
+
+def _loading_index_statements(conn, table, loading_table):
+    """
+    Comandos que recriam em `loading_table` cada índice da tabela pai, com
+    nomes derivados dos da tabela avulsa (`<partição>_bulk_<sufixo>`): os
+    nomes definitivos podem ainda pertencer a uma partição vazia do período,
+    que só é removida no attach. Índices de PRIMARY KEY/UNIQUE viram
+    constraints (o ATTACH só os reaproveita como constraints).
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT index_class.relname, pg_get_indexdef(pg_index.indexrelid), pg_constraint.contype
+            FROM pg_index
+            JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+            LEFT JOIN pg_constraint ON pg_constraint.conindid = pg_index.indexrelid
+                AND pg_constraint.conrelid = pg_index.indrelid
+            WHERE pg_index.indrelid = to_regclass(%s)
+        """, (table,))
+        indexes = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    statements = []
+    for parent_index, definition, constraint_type in indexes:
+        index_name = _child_index_name(table, parent_index, loading_table)
+        match = re.match(r"^CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (USING .*)$", definition)
+        commands = [f"CREATE {match.group(1) or ''}INDEX {index_name} ON {loading_table} {match.group(2)}"]
+        if constraint_type in ('p', 'u'):
+            kind = 'PRIMARY KEY' if constraint_type == 'p' else 'UNIQUE'
+            commands.append(
+                f"ALTER TABLE {loading_table} ADD CONSTRAINT {index_name} {kind} USING INDEX {index_name}"
+            )
+        statements.append(commands)
+    return statements
+
+
+def _rename_partition_indexes(cursor, table, name):
+    """
+    Dá aos índices da partição `name`, já anexada, os nomes definitivos
+    (`<partição>_<sufixo do índice pai>`, ex.: `<partição>_pkey`). Renomear
+    o índice renomeia também a constraint associada.
+    """
+    cursor.execute("""
+        SELECT child.relname, parent.relname
+        FROM pg_index
+        JOIN pg_class child ON child.oid = pg_index.indexrelid
+        JOIN pg_inherits ON pg_inherits.inhrelid = pg_index.indexrelid
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        WHERE pg_index.indrelid = to_regclass(%s)
+    """, (name,))
+    for child_index, parent_index in cursor.fetchall():
+        index_name = _child_index_name(table, parent_index, name)
+        if child_index != index_name:
+            cursor.execute(f"ALTER INDEX {child_index} RENAME TO {index_name}")
+
+
+def build_partition_indexes(connect, table, loading_table, max_workers=DEFAULT_INDEX_BUILD_WORKERS):
+    """
+    Constrói em `loading_table`, já carregada, os índices da tabela pai,
+    até `max_workers` ao mesmo tempo, cada um em uma conexão própria
+    (`connect()` deve retornar uma nova conexão). Como a tabela ainda não é
+    partição, nenhuma consulta ou carga fica bloqueada durante a construção.
+    Os índices recebem nomes provisórios, trocados pelos definitivos no
+    `attach_loading_table`. Ao final, atualiza as estatísticas da tabela. Retorna os comandos executados.
+    """
+    conn = connect()
+    try:
+        statements = _loading_index_statements(conn, table, loading_table)
+    finally:
+        conn.close()
+
+    def build(commands):
+        build_conn = connect()
+        build_conn.autocommit = True
+        try:
+            cursor = build_conn.cursor()
+            for command in commands:
+                cursor.execute(command)
+            cursor.close()
+        finally:
+            build_conn.close()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(build, statements))
+
+    conn = connect()
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"ANALYZE {loading_table}")
+        cursor.close()
+    finally:
+        conn.close()
+    return [command for commands in statements for command in commands]
+
+
+def attach_loading_table(conn, table, loading_table, date_column, value, granularity=MONTHLY):
+    """
+    Anexa `loading_table`, já indexada, como a partição do período de
+    `value`. Uma partição vazia já existente para o período (ex.: criada
+    antecipadamente) é substituída; uma partição com dados faz a operação
+    falhar, pois a carga em massa não mescla linhas. Os índices da partição
+    são associados aos da tabela pai sem reconstrução e, com a partição
+    antiga já removida, renomeados para os nomes definitivos. Retorna o
+    nome da partição.
+    """
+    lower = period_start(value, granularity)
+    name = partition_name(table, lower, granularity)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table,))
+        if name in list_partitions(conn, table):
+            if not is_empty(conn, name):
+                raise ValueError(f"A partição {name} já tem dados; use a carga com upsert")
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+        cursor.execute(f"ALTER TABLE {loading_table} RENAME TO {name}")
+        cursor.execute(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{next_period(lower, granularity).isoformat()}')"
+        )
+        _rename_partition_indexes(cursor, table, name)
+        # O CHECK só servia para dispensar a validação do ATTACH
+        cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {loading_table}_bounds")
+        return name
+    finally:
+        cursor.close()
+
+
+def absorb_unpartitioned(conn, table, date_column, granularity=MONTHLY, serial_column='id'):
+    """
+    Copia para `table` as linhas de `<tabela>_unpartitioned`, criando as
+    partições necessárias, ajusta a sequência de `serial_column` e remove
+    a tabela antiga. Retorna a quantidade de linhas migradas (0 se não
+    houver tabela antiga).
+    """
+    legacy = f"{table}{UNPARTITIONED_SUFFIX}"
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT to_regclass(%s)", (legacy,))
+        if cursor.fetchone()[0] is None:
+            return 0
+
+        cursor.execute(f"SELECT COUNT(*) FROM {legacy} WHERE {date_column} IS NULL")
+        null_dates = cursor.fetchone()[0]
+        if null_dates:
+            raise ValueError(
+                f"{legacy} tem {null_dates} linha(s) sem {date_column}; "
+                f"corrija-as antes de migrar para a tabela particionada"
+            )
+        cursor.execute(f"SELECT DISTINCT date_trunc(%s, {date_column})::date FROM {legacy}", (granularity,))
+        ensure_partitions(conn, table, [row[0] for row in cursor.fetchall()], granularity)
+
+        # Apenas as colunas presentes nas duas versões da tabela
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+            AND column_name IN (
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = %s
+            )
+            ORDER BY ordinal_position
+        """, (table, legacy))
+        column_list = ", ".join(row[0] for row in cursor.fetchall())
+
+        cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {legacy}")
+        migrated = cursor.rowcount
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, %s), "
+            f"(SELECT COALESCE(MAX({serial_column}), 0) + 1 FROM {table}), false)",
+            (table, serial_column)
+        )
+        cursor.execute(f"DROP TABLE {legacy}")
+        return migrated
+    finally:
+        cursor.close()
+
+
+def maintain_partitions(conn, table, date_column, today, premake=DEFAULT_PREMAKE_PERIODS,
+                        retention=None, granularity=MONTHLY,
+                        archive_schema=DEFAULT_ARCHIVE_SCHEMA):
+    """
+    Rotina periódica de manutenção de uma tabela particionada:
+    migra a versão não particionada (se houver), cria as partições do
+    período atual e dos `premake` seguintes e, se `retention` for
+    informado, arquiva as partições com mais de `retention` períodos.
+    """
+    migrated = absorb_unpartitioned(conn, table, date_column, granularity)
+    created = ensure_partitions(
+        conn, table, [shift_periods(today, count, granularity) for count in range(int(premake) + 1)],
+        granularity
+    )
+    archived = []
+    if retention is not None:
+        archived = archive_partitions(
+            conn, table, shift_periods(today, -int(retention), granularity),
+            granularity, archive_schema
+        )
+    return {'migrated_rows': migrated, 'created': created, 'archived': archived}
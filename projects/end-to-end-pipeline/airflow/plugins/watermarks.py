@@ -0,0 +1,87 @@
+"""
+## High-water marks de ingestão
+
+Mantém, por fonte de dados (API, CSV histórico, ...), a maior data de
+pregão já carregada na tabela `ingestion_watermarks`. No modo incremental
+as tarefas buscam apenas as datas posteriores ao watermark, em vez de
+reprocessar dias inteiros já carregados. Para reabrir os últimos dias
+carregados (ex.: fontes que corrigem o pregão anterior), informe
+`overlap_days`.
+"""
+
+from datetime import date, datetime, timedelta
+
+WATERMARKS_TABLE = 'ingestion_watermarks'
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def get_watermark(conn, source):
+    """
+    Retorna o watermark da fonte como `date`, ou None se ela nunca foi carregada.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT high_water_mark FROM {WATERMARKS_TABLE} WHERE source = %s",
+            (source,)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+
+
+def advance_watermark(conn, source, value):
+    """
+    Avança o watermark da fonte para `value`. O watermark nunca retrocede,
+    de modo que recargas de datas antigas não reabrem janelas já cobertas.
+    Não faz commit: deve ser chamado na mesma transação da carga.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            INSERT INTO {WATERMARKS_TABLE} (source, high_water_mark, updated_at)
+            VALUES (%s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (source) DO UPDATE SET
+                high_water_mark = GREATEST({WATERMARKS_TABLE}.high_water_mark, EXCLUDED.high_water_mark),
+                updated_at = EXCLUDED.updated_at
+        """, (source, _to_date(value)))
+    finally:
+        cursor.close()
+
+
+def _window_start(watermark, overlap_days=0):
+    return _to_date(watermark) + timedelta(days=1 - int(overlap_days))
+
+
+def incremental_window(watermark, data_date, overlap_days=0):
+    """
+    Lista (YYYY-MM-DD) das datas a buscar até `data_date`: do dia seguinte
+    ao watermark (ou `overlap_days` dias antes dele) até `data_date`. Sem
+    watermark, apenas `data_date` é processada; com tudo já carregado até
+    `data_date` (ex.: reexecução no mesmo dia), a janela é vazia.
+    """
+    end = _to_date(data_date)
+    if watermark is None:
+        return [end.strftime('%Y-%m-%d')]
+
+    current = _window_start(watermark, overlap_days)
+    window = []
+    while current <= end:
+        window.append(current.strftime('%Y-%m-%d'))
+        current += timedelta(days=1)
+    return window
+
+
+def is_new(value, watermark, overlap_days=0):
+    """
+    Indica se `value` está dentro da janela incremental posterior a `watermark`.
+    """
+    return watermark is None or _to_date(value) >= _window_start(watermark, overlap_days)
@@ -0,0 +1,130 @@
+"""
+## Benchmark: validação por laços vs motor colunar
+
+Compara as validações originais de `_validate_api_data` (dois laços Python
+por registro, com uma string de erro por item) com o motor de regras
+vetorizado de `plugins/stock_validation.py`, a partir do mesmo payload
+da API (lista de dicionários). O motor colunar é medido como o DAG o usa:
+regras, separação das linhas válidas (`split_quarantine`) e gravação da
+quarentena em JSON Lines (`write_quarantine`).
+
+O tempo do motor colunar é reportado com e sem a montagem do DataFrame a
+partir da lista de dicionários, custo que desaparece quando o payload já
+é lido em formato colunar.
+
+Uso:
+    python scripts/benchmark_validation.py --sizes 1000000 --invalid-ratio 0.01
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'plugins'))
+
+from stock_validation import (  # noqa: E402
+    validate_stock_frame, summarize, split_quarantine, write_quarantine
+)
+
+
+def generate_payload(rows, invalid_ratio, seed=42):
+    """
+    Gera itens sintéticos no formato da API, com uma fração de registros
+    inválidos (campo ausente, volume negativo ou fracionário, preço fora do
+    intervalo ou data inválida). Retorna `(itens, quantidade_de_inválidos)`.
+    """
+    rng = random.Random(seed)
+    items = []
+    injected = 0
+    for i in range(rows):
+        price = 100 + (i % 97)
+        item = {
+            "symbol": f"S{i // 250:06d}", "date": f"2024-{1 + (i % 250) // 28:02d}-{1 + (i % 28):02d}",
+            "open": price, "high": price + 1.5, "low": price - 1.5, "close": price + 0.5,
+            "volume": 1000 + i, "exchange": "NASDAQ"
+        }
+        if rng.random() < invalid_ratio:
+            injected += 1
+            kind = rng.randrange(5)
+            if kind == 0:
+                del item["exchange"]
+            elif kind == 1:
+                item["volume"] = -1
+            elif kind == 2:
+                item["close"] = price + 10
+            elif kind == 3:
+                item["date"] = "not-a-date"
+            else:
+                item["volume"] = 5.5
+        items.append(item)
+    return items, injected
+
+
+def legacy_validate(items):
+    """
+    Reprodução dos laços originais de `_validate_api_data`.
+    """
+    validation_errors = []
+    required_fields = ["symbol", "date", "open", "high", "low", "close", "volume", "exchange"]
+    missing_fields = []
+    for item in items:
+        for field in required_fields:
+            if field not in item:
+                missing_fields.append(f"Campo '{field}' ausente para o símbolo {item.get('symbol', 'UNKNOWN')}")
+    if missing_fields:
+        validation_errors.append("\n".join(missing_fields))
+
+    invalid_values = []
+    for item in items:
+        if "volume" in item and (not isinstance(item["volume"], (int, float)) or item["volume"] <= 0):
+            invalid_values.append(f"Volume inválido para {item['symbol']}: {item['volume']}")
+    if invalid_values:
+        validation_errors.append("\n".join(invalid_values))
+    return validation_errors
+
+
+def columnar_validate(frame, quarantine_path):
+    invalid, rule_masks = validate_stock_frame(frame)
+    summary = summarize(frame, invalid, rule_masks)
+    _, quarantined = split_quarantine(frame, invalid, rule_masks)
+    write_quarantine(quarantined, quarantine_path)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000])
+    parser.add_argument('--invalid-ratio', type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"{'linhas':>10} | {'método':<10} | {'tempo (s)':>10} | {'linhas/s':>12}")
+    print("-" * 52)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.sizes:
+            items, injected = generate_payload(rows, args.invalid_ratio)
+
+            start = time.perf_counter()
+            legacy_validate(items)
+            elapsed = time.perf_counter() - start
+            print(f"{rows:>10} | {'laços':<10} | {elapsed:>10.2f} | {rows / elapsed:>12.0f}")
+
+            start = time.perf_counter()
+            frame = pd.DataFrame(items)
+            load_elapsed = time.perf_counter() - start
+            summary = columnar_validate(frame, os.path.join(tmp_dir, 'quarantine.jsonl'))
+            elapsed = time.perf_counter() - start
+            rules_elapsed = elapsed - load_elapsed
+            print(f"{rows:>10} | {'regras':<10} | {rules_elapsed:>10.2f} | {rows / rules_elapsed:>12.0f}")
+            print(f"{rows:>10} | {'carga+regr':<10} | {elapsed:>10.2f} | {rows / elapsed:>12.0f}")
+            print(f"{'':>10}   regras: {summary['rules']}")
+            if summary['invalid_rows'] != injected:
+                sys.exit(f"Esperados {injected} registros inválidos, detectados {summary['invalid_rows']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+## Sensor Load Test
+
+DAGs auxiliares para medir quantos slots de worker os sensores ocupam
+enquanto esperam. Os dois DAGs aguardam o mesmo endpoint indisponível:
+
+- `sensor_load_test_poke`: `HttpSensor` com mode='poke' (um slot por espera)
+- `sensor_load_test_deferrable`: `DeferrableHttpSensor` (espera no triggerer)
+
+São disparados em massa por `scripts/loadtest_deferrable_sensors.py`; não
+têm agendamento. Ficam fora de `airflow/dags/` para não serem implantados
+nem processados pelo scheduler em produção: `docker-compose.loadtest.yml`
+monta esta pasta no scheduler só durante o teste. A conexão `sensor_load_test_api` (criada pelo script)
+aponta para o próprio webserver do Airflow, em um caminho da API que
+sempre responde 404, status que o `HttpSensor` trata como "ainda não".
+"""
+
+from datetime import datetime
+from airflow import DAG
+from airflow.providers.http.sensors.http import HttpSensor
+
+from deferrable_http_sensor import DeferrableHttpSensor
+
+default_args = {
+    'owner': 'data_engineering',
+    'retries': 0,
+    'start_date': datetime(2025, 4, 29),
+    'tags': ['load_test']
+}
+
+# Parâmetros comuns às duas versões do sensor
+SENSOR_KWARGS = {
+    'task_id': 'wait_for_api',
+    'http_conn_id': 'sensor_load_test_api',
+    'endpoint': 'api/v1/sensor-load-test',
+    'poke_interval': 30,
+    'timeout': 1800,
+}
+
+for dag_id, deferrable in (('sensor_load_test_poke', False), ('sensor_load_test_deferrable', True)):
+    dag = DAG(
+        dag_id,
+        default_args=default_args,
+        description='Teste de carga de sensores (uso de slots de worker)',
+        schedule_interval=None,
+        catchup=False,
+        max_active_runs=100,
+        max_active_tasks=100,
+        doc_md=__doc__
+    )
+
+    if deferrable:
+        DeferrableHttpSensor(expected_status=200, dag=dag, **SENSOR_KWARGS)
+    else:
+        HttpSensor(
+            response_check=lambda response: response.status_code == 200,
+            mode='poke',
+            dag=dag,
+            **SENSOR_KWARGS
+        )
+
+    globals()[dag_id] = dag
@@ -0,0 +1,141 @@
+"""
+## Teste de carga: slots de worker ocupados por sensores em espera
+
+Dispara N execuções simultâneas de cada DAG de
+`scripts/loadtest_dags/sensor_load_test.py` (sensor HTTP em mode='poke' e
+sensor deferrable) pela API REST do Airflow e amostra o estado das instâncias do sensor durante a espera:
+
+- `running`: a tarefa ocupa um slot de worker
+- `queued`/`scheduled`: aguarda um slot livre (parallelism do executor esgotado)
+- `deferred`: a espera está no triggerer, sem slot de worker
+
+Ao final, imprime o pico de cada estado por modo e marca as execuções
+do teste como falhas, liberando o ambiente.
+
+Requer o webserver com autenticação básica na API e um triggerer em
+execução (ambos configurados no docker-compose.yml) e os DAGs do teste
+montados no scheduler por `docker-compose.loadtest.yml`.
+
+Uso:
+    docker-compose -f docker-compose.yml -f docker-compose.loadtest.yml up -d
+    python scripts/loadtest_deferrable_sensors.py --runs 50 --duration 180
+    docker-compose up -d  # volta o scheduler sem os DAGs do teste
+"""
+
+import argparse
+import time
+import uuid
+
+import requests
+
+DAG_IDS = {
+    'poke': 'sensor_load_test_poke',
+    'deferrable': 'sensor_load_test_deferrable',
+}
+CONN_ID = 'sensor_load_test_api'
+SAMPLED_STATES = ['running', 'queued', 'scheduled', 'deferred', 'up_for_reschedule']
+
+
+class AirflowApi:
+    def __init__(self, base_url, user, password):
+        self.base_url = base_url.rstrip('/') + '/api/v1'
+        self.session = requests.Session()
+        self.session.auth = (user, password)
+
+    def request(self, method, path, **kwargs):
+        response = self.session.request(method, self.base_url + path, timeout=30, **kwargs)
+        response.raise_for_status()
+        return response.json() if response.content else None
+
+    def ensure_connection(self, host, user, password):
+        """
+        Cria a conexão usada pelos sensores: o próprio webserver, autenticado,
+        para que o caminho inexistente responda 404 e não 401.
+        """
+        response = self.session.get(f"{self.base_url}/connections/{CONN_ID}", timeout=30)
+        if response.status_code == 200:
+            return
+        self.request('POST', '/connections', json={
+            'connection_id': CONN_ID, 'conn_type': 'http', 'host': host,
+            'login': user, 'password': password
+        })
+
+    def trigger(self, dag_id, runs, tag):
+        self.request('PATCH', f"/dags/{dag_id}", json={'is_paused': False})
+        run_ids = []
+        for index in range(runs):
+            run_id = f"loadtest_{tag}_{index:03d}"
+            self.request('POST', f"/dags/{dag_id}/dagRuns", json={'dag_run_id': run_id})
+            run_ids.append(run_id)
+        return run_ids
+
+    def count_states(self, dag_id):
+        body = {'dag_ids': [dag_id], 'state': SAMPLED_STATES, 'page_limit': 1000}
+        task_instances = self.request('POST', '/dags/~/dagRuns/~/taskInstances/list', json=body)
+        counts = dict.fromkeys(SAMPLED_STATES, 0)
+        for task_instance in task_instances['task_instances']:
+            counts[task_instance['state']] += 1
+        return counts
+
+    def finish(self, dag_id, run_ids):
+        for run_id in run_ids:
+            self.request('PATCH', f"/dags/{dag_id}/dagRuns/{run_id}", json={'state': 'failed'})
+        self.request('PATCH', f"/dags/{dag_id}", json={'is_paused': True})
+
+
+def run_mode(api, mode, runs, duration, interval):
+    """
+    Dispara as execuções de um modo e retorna o pico de cada estado e as
+    contagens da última amostra (regime, após a ocupação inicial).
+    """
+    dag_id = DAG_IDS[mode]
+    tag = uuid.uuid4().hex[:8]
+    run_ids = api.trigger(dag_id, runs, tag)
+    peaks = dict.fromkeys(SAMPLED_STATES + ['waiting'], 0)
+    counts = dict.fromkeys(SAMPLED_STATES, 0)
+    print(f"\n{mode}: {runs} execuções de {dag_id} disparadas")
+    print(f"{'t (s)':>6} | " + " | ".join(f"{state:>17}" for state in SAMPLED_STATES))
+    try:
+        start = time.monotonic()
+        while time.monotonic() - start < duration:
+            counts = api.count_states(dag_id)
+            for state, count in counts.items():
+                peaks[state] = max(peaks[state], count)
+            # Sem slot livre, as instâncias ficam em queued ou scheduled
+            peaks['waiting'] = max(peaks['waiting'], counts['queued'] + counts['scheduled'])
+            print(f"{time.monotonic() - start:>6.0f} | " + " | ".join(f"{counts[state]:>17}" for state in SAMPLED_STATES))
+            time.sleep(interval)
+    finally:
+        api.finish(dag_id, run_ids)
+    return peaks, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8080')
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--sensor-host', default='http://airflow-webserver:8080',
+                        help='Endereço do webserver visto de dentro dos containers')
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--duration', type=int, default=180, help='Segundos de amostragem por modo')
+    parser.add_argument('--interval', type=int, default=10)
+    parser.add_argument('--modes', nargs='+', choices=list(DAG_IDS), default=list(DAG_IDS))
+    args = parser.parse_args()
+
+    api = AirflowApi(args.base_url, args.user, args.password)
+    api.ensure_connection(args.sensor_host, args.user, args.password)
+
+    results = {mode: run_mode(api, mode, args.runs, args.duration, args.interval) for mode in args.modes}
+
+    print(f"\nCom {args.runs} esperas simultâneas (pico / última amostra)")
+    print(f"{'modo':<10} | {'slots (running)':>15} | {'sem slot':>9} | {'deferred':>9}")
+    print("-" * 52)
+    for mode, (peaks, last) in results.items():
+        print(f"{mode:<10} | {peaks['running']:>8} / {last['running']:>4} | "
+              f"{peaks['waiting']:>3} / {last['queued'] + last['scheduled']:>3} | "
+              f"{peaks['deferred']:>3} / {last['deferred']:>3}")
+
+
+if __name__ == '__main__':
+    main()
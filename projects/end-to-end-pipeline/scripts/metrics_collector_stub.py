@@ -0,0 +1,102 @@
+"""
+## Coletor local de métricas (stub do Pushgateway)
+
+Servidor HTTP mínimo que aceita os envios de `plugins/pipeline_metrics.py`
+no mesmo formato do Pushgateway (`PUT/POST /metrics/job/<job>/...`),
+imprime cada envio e expõe o último de cada grupo em `GET /metrics`.
+Permite verificar a instrumentação dos DAGs sem subir o Prometheus.
+
+Uso:
+    python scripts/metrics_collector_stub.py --port 9091
+    PIPELINE_METRICS_PUSHGATEWAY_URL=http://localhost:9091 airflow tasks test ...
+
+Com `--once`, encerra após o primeiro envio e sai com código 1 se o
+corpo não contiver as métricas de etapa (útil em verificações scriptadas).
+"""
+
+import argparse
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import unquote
+
+REQUIRED_METRICS = ['pipeline_stage_duration_seconds_bucket', 'pipeline_stage_rows']
+
+
+def parse_grouping(path):
+    """
+    `/metrics/job/<job>/<rótulo>/<valor>...` -> {'job': ..., rótulo: valor}
+    """
+    parts = [unquote(part) for part in path.strip('/').split('/')[1:]]
+    return dict(zip(parts[::2], parts[1::2]))
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    groups = {}
+    received = []
+
+    def _store(self):
+        if not self.path.startswith('/metrics/job/'):
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        grouping = parse_grouping(self.path)
+        key = tuple(sorted(grouping.items()))
+        self.groups[key] = body
+        self.received.append((grouping, body))
+        print(f"--- envio de {grouping} ({len(body)} bytes)\n{body}", flush=True)
+        self.send_response(200)
+        self.end_headers()
+
+    do_PUT = _store
+    do_POST = _store
+
+    def do_DELETE(self):
+        self.groups.pop(tuple(sorted(parse_grouping(self.path).items())), None)
+        self.send_response(202)
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = ''.join(
+            f"# grupo {dict(key)}\n{metrics}" for key, metrics in sorted(self.groups.items())
+        ).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9091)
+    parser.add_argument('--once', action='store_true', help='Encerra após o primeiro envio')
+    args = parser.parse_args()
+
+    server = HTTPServer((args.host, args.port), CollectorHandler)
+    print(f"Coletor de métricas em http://{args.host}:{args.port}", flush=True)
+    try:
+        if args.once:
+            while not CollectorHandler.received:
+                server.handle_request()
+            _, body = CollectorHandler.received[0]
+            missing = [name for name in REQUIRED_METRICS if name not in body]
+            if missing:
+                print(f"Métricas ausentes no envio: {', '.join(missing)}")
+                sys.exit(1)
+        else:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,508 @@
+"""
+## Métricas de execução das tarefas (Prometheus)
+
+Instrumentação comum aos callables dos DAGs. Cada etapa medida registra:
+
+- `pipeline_stage_duration_seconds`: histograma da duração da etapa
+- `pipeline_stage_rows` e `pipeline_stage_rows_per_second`
+- `pipeline_stage_bytes_read` e `pipeline_stage_bytes_written`
+- `pipeline_stage_db_round_trips`: comandos enviados ao banco
+- `pipeline_stage_retries`: retentativas feitas dentro da etapa
+  (ex.: páginas da API), além de `pipeline_task_attempt` com a tentativa
+  da tarefa no Airflow
+- `pipeline_db_statement_duration_seconds`: histograma da duração de cada
+  comando enviado por uma conexão instrumentada, por tipo de comando
+  (`SELECT`, `INSERT`, `COPY`, `COMMIT`...)
+
+Uso:
+
+    @instrumented()
+    def _load_data_to_database(**context):
+        conn = instrument_connection(pg_hook.get_conn())
+        with track_stage('upsert') as stage:
+            ...
+            stage.add_rows(records_count)
+
+`instrumented` abre a etapa principal da tarefa (rótulos `stage` e
+`status`) e, ao final, com sucesso ou falha, exporta as métricas:
+
+- para um Pushgateway, se `PIPELINE_METRICS_PUSHGATEWAY_URL` estiver
+  definida (agrupadas por `job=<dag_id>` e `task_id`)
+- para um arquivo `.prom` em `PIPELINE_METRICS_TEXTFILE_DIR`, lido pelo
+  textfile collector do node-exporter
+
+Como em todo job batch exportado por push, os valores descrevem a última
+execução de cada tarefa. Código auxiliar pode usar `current_stage()` para
+somar contadores à etapa aberta sem recebê-la como parâmetro; fora de uma
+etapa, os valores são descartados. Para testar localmente, aponte a
+variável do Pushgateway para `scripts/metrics_collector_stub.py`.
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+PUSHGATEWAY_URL_ENV = 'PIPELINE_METRICS_PUSHGATEWAY_URL'
+TEXTFILE_DIR_ENV = 'PIPELINE_METRICS_TEXTFILE_DIR'
+
+# Limites (s) dos buckets do histograma de duração das etapas
+DEFAULT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Limites (s) dos histogramas de comandos no banco, bem mais curtos que as etapas
+STATEMENT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 120, 600)
+
+DEFAULT_PUSH_TIMEOUT = 10  # segundos
+
+_HELP = {
+    'pipeline_stage_duration_seconds': 'Duração das etapas da tarefa',
+    'pipeline_stage_rows': 'Linhas processadas pela etapa',
+    'pipeline_stage_rows_per_second': 'Vazão da etapa em linhas por segundo',
+    'pipeline_stage_bytes_read': 'Bytes lidos pela etapa',
+    'pipeline_stage_bytes_written': 'Bytes escritos pela etapa',
+    'pipeline_stage_db_round_trips': 'Comandos enviados ao banco pela etapa',
+    'pipeline_stage_retries': 'Retentativas feitas dentro da etapa',
+    'pipeline_stage_last_success_timestamp_seconds': 'Fim da última execução bem-sucedida da etapa',
+    'pipeline_task_attempt': 'Tentativa da tarefa no Airflow (1 = primeira execução)',
+    'pipeline_db_statement_duration_seconds': 'Duração dos comandos enviados ao banco',
+    'pipeline_db_pool_wait_seconds': 'Espera por uma conexão livre no pool',
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas de uma execução, serializado no formato texto do
+    Prometheus (0.0.4). Suporta gauges e histogramas; seguro entre threads.
+    `metric_buckets` define limites próprios por histograma; os demais
+    usam `buckets`.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, metric_buckets=None):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.metric_buckets = {
+            name: tuple(sorted(bounds)) + (math.inf,) for name, bounds in (metric_buckets or {}).items()
+        }
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _series(self, name, metric_type):
+        metric = self._metrics.setdefault(name, {'type': metric_type, 'series': {}})
+        if metric['type'] != metric_type:
+            raise ValueError(f"Métrica {name} já registrada como {metric['type']}")
+        return metric['series']
+
+    def _buckets(self, name):
+        return self.metric_buckets.get(name, self.buckets)
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._series(name, 'gauge')[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        buckets = self._buckets(name)
+        with self._lock:
+            series = self._series(name, 'histogram')
+            state = series.setdefault(key, {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self, extra_labels=None):
+        """
+        Texto no formato de exposição do Prometheus. `extra_labels` é
+        acrescentado a todas as séries (ex.: rótulos de agrupamento no
+        exportador de arquivo).
+        """
+        extra = tuple(sorted((extra_labels or {}).items()))
+        lines = []
+        with self._lock:
+            for name in sorted(self._metrics):
+                metric = self._metrics[name]
+                if name in _HELP:
+                    lines.append(f"# HELP {name} {_HELP[name]}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for key, value in sorted(metric['series'].items()):
+                    labels = extra + key
+                    if metric['type'] == 'gauge':
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                        continue
+                    for bound, count in zip(self._buckets(name), value['buckets']):
+                        bucket_labels = labels + (('le', _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+class Stage:
+    """
+    Contadores de uma etapa em andamento. Os métodos `add_*` podem ser
+    chamados de várias threads.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.round_trips = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def _add(self, counter, value):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + value)
+
+    def add_rows(self, value):
+        self._add('rows', int(value))
+
+    def add_bytes_read(self, value):
+        self._add('bytes_read', int(value))
+
+    def add_bytes_written(self, value):
+        self._add('bytes_written', int(value))
+
+    def add_round_trips(self, value=1):
+        self._add('round_trips', int(value))
+
+    def add_retries(self, value=1):
+        self._add('retries', int(value))
+
+    def add_file_read(self, path):
+        self.add_bytes_read(_path_size(path))
+
+    def add_file_written(self, path):
+        self.add_bytes_written(_path_size(path))
+
+
+def _path_size(path):
+    """
+    Tamanho de um arquivo ou, para diretórios (ex.: datasets particionados),
+    a soma dos arquivos contidos. Caminhos inexistentes contam zero.
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, filenames in os.walk(path) for filename in filenames
+    )
+
+
+# Etapas abertas na thread atual; threads auxiliares (ex.: pool de busca
+# de páginas) sem etapa própria contam na etapa principal da tarefa
+_local = threading.local()
+_root = {'stage': None, 'registry': None}
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def current_stage():
+    """
+    Etapa aberta mais interna da thread atual, ou a etapa principal da
+    tarefa. Fora de qualquer etapa, retorna uma etapa avulsa descartada.
+    """
+    stack = _stack()
+    if stack:
+        return stack[-1][0]
+    return _root['stage'] or Stage('unattached')
+
+
+def _current_registry():
+    stack = _stack()
+    if stack:
+        return stack[-1][1]
+    return _root['registry']
+
+
+def _record(registry, stage, status, duration):
+    labels = {'stage': stage.name}
+    registry.observe('pipeline_stage_duration_seconds', duration, status=status, **labels)
+    registry.set('pipeline_stage_rows', stage.rows, **labels)
+    if stage.rows and duration > 0:
+        registry.set('pipeline_stage_rows_per_second', round(stage.rows / duration, 3), **labels)
+    registry.set('pipeline_stage_bytes_read', stage.bytes_read, **labels)
+    registry.set('pipeline_stage_bytes_written', stage.bytes_written, **labels)
+    registry.set('pipeline_stage_db_round_trips', stage.round_trips, **labels)
+    registry.set('pipeline_stage_retries', stage.retries, **labels)
+    if status == 'success':
+        registry.set('pipeline_stage_last_success_timestamp_seconds', round(time.time(), 3), **labels)
+
+
+def observe(name, value, **labels):
+    """
+    Registra uma observação de histograma no registry da etapa corrente,
+    com o rótulo `stage`. Fora de uma tarefa instrumentada, é descartada.
+    """
+    registry = _current_registry()
+    if registry is not None:
+        registry.observe(name, value, stage=current_stage().name, **labels)
+
+
+@contextmanager
+def track_stage(name, registry=None):
+    """
+    Mede uma etapa: duração, com status `success` ou `failed`, e os
+    contadores somados à `Stage` entregue pelo bloco. Sem `registry`, usa
+    o da etapa em que está aninhada; sem nenhum, nada é registrado. Os
+    contadores de uma etapa aninhada não são somados aos da etapa externa.
+    """
+    registry = registry or _current_registry()
+    stage = Stage(name)
+    stack = _stack()
+    stack.append((stage, registry))
+    start = time.perf_counter()
+    status = 'failed'
+    try:
+        yield stage
+        status = 'success'
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        if registry is not None:
+            _record(registry, stage, status, duration)
+
+
+class PushgatewayExporter:
+    """
+    Envia as métricas com PUT para `/metrics/job/<job>/<rótulo>/<valor>`,
+    substituindo o grupo enviado pela execução anterior da mesma tarefa.
+    """
+
+    def __init__(self, url, timeout=DEFAULT_PUSH_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def push(self, registry, job, grouping=None):
+        path = f"/metrics/job/{quote(job, safe='')}"
+        for name, value in (grouping or {}).items():
+            path += f"/{name}/{quote(str(value), safe='')}"
+        request = Request(
+            self.url + path,
+            data=registry.render().encode('utf-8'),
+            method='PUT',
+            headers={'Content-Type': 'text/plain; version=0.0.4'}
+        )
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+        return self.url + path
+
+
+class TextfileExporter:
+    """
+    Grava as métricas em `<diretório>/<job>__<rótulos>.prom`, de forma
+    atômica, com os rótulos de agrupamento em todas as séries.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def push(self, registry, job, grouping=None):
+        labels = {'job': job, **(grouping or {})}
+        filename = '__'.join(str(value).replace(os.sep, '_') for value in labels.values()) + '.prom'
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as outfile:
+            outfile.write(registry.render(labels))
+        os.replace(tmp_path, path)
+        return path
+
+
+def get_exporter():
+    """
+    Exportador configurado pelas variáveis de ambiente, ou None.
+    """
+    url = os.environ.get(PUSHGATEWAY_URL_ENV)
+    if url:
+        return PushgatewayExporter(url)
+    directory = os.environ.get(TEXTFILE_DIR_ENV)
+    if directory:
+        return TextfileExporter(directory)
+    return None
+
+
+def export(registry, job, grouping=None, exporter=None):
+    """
+    Exporta as métricas sem nunca falhar a tarefa: erros de envio são
+    apenas registrados no log.
+    """
+    exporter = exporter or get_exporter()
+    if exporter is None:
+        return None
+    try:
+        return exporter.push(registry, job, grouping)
+    except Exception as e:
+        print(f"Falha ao exportar métricas de {job}: {e}")
+        return None
+
+
+def instrumented(stage=None, exporter=None):
+    """
+    Decorator para callables de `PythonOperator`: mede a tarefa como uma
+    etapa (por padrão, o nome da função sem o `_` inicial) e exporta as
+    métricas ao final, agrupadas por `dag_id`, `task_id` e, em tarefas
+    mapeadas, `map_index`.
+    """
+    def decorator(func):
+        name = stage or func.__name__.lstrip('_')
+
+        @functools.wraps(func)
+        def wrapper(*args, **context):
+            ti = context.get('ti')
+            dag_id = getattr(ti, 'dag_id', None) or 'unknown_dag'
+            grouping = {'task_id': getattr(ti, 'task_id', None) or name}
+            # Instâncias mapeadas da mesma tarefa não sobrescrevem umas às outras
+            if getattr(ti, 'map_index', -1) >= 0:
+                grouping['map_index'] = ti.map_index
+            registry = MetricsRegistry(metric_buckets={
+                'pipeline_db_statement_duration_seconds': STATEMENT_BUCKETS,
+                'pipeline_db_pool_wait_seconds': STATEMENT_BUCKETS,
+            })
+            if ti is not None and getattr(ti, 'try_number', None):
+                registry.set('pipeline_task_attempt', ti.try_number)
+            try:
+                with track_stage(name, registry) as root:
+                    _root['stage'], _root['registry'] = root, registry
+                    return func(*args, **context)
+            finally:
+                _root['stage'] = _root['registry'] = None
+                export(registry, dag_id, grouping, exporter)
+        return wrapper
+    return decorator
+
+
+def _buffer_size(buffer):
+    try:
+        position = buffer.tell()
+        size = buffer.seek(0, os.SEEK_END) - position
+        buffer.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+def _statement_type(query):
+    # Só a primeira palavra, para manter a cardinalidade do rótulo baixa
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    words = str(query).split(None, 1) if query is not None else []
+    return words[0].upper().strip('(;') if words else 'UNKNOWN'
+
+
+@contextmanager
+def _timed_statement(statement):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('pipeline_db_statement_duration_seconds', time.perf_counter() - start, statement=statement)
+
+
+class _CountingCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, *args, **kwargs):
+        current_stage().add_round_trips()
+        with _timed_statement(_statement_type(query)):
+            return self._cursor.execute(query, *args, **kwargs)
+
+    def executemany(self, query, params_list, *args, **kwargs):
+        # executemany do psycopg2 envia um comando por linha
+        params_list = list(params_list)
+        current_stage().add_round_trips(len(params_list))
+        with _timed_statement(_statement_type(query)):
+            return self._cursor.executemany(query, params_list, *args, **kwargs)
+
+    def copy_expert(self, sql, file, *args, **kwargs):
+        stage = current_stage()
+        stage.add_round_trips()
+        stage.add_bytes_written(_buffer_size(file))
+        with _timed_statement('COPY'):
+            return self._cursor.copy_expert(sql, file, *args, **kwargs)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._cursor.__exit__(*exc_info)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs))
+
+    def commit(self):
+        current_stage().add_round_trips()
+        with _timed_statement('COMMIT'):
+            return self._conn.commit()
+
+    def rollback(self):
+        current_stage().add_round_trips()
+        with _timed_statement('ROLLBACK'):
+            return self._conn.rollback()
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        # ex.: conn.autocommit = True deve valer para a conexão real
+        if name == '_conn':
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+
+def instrument_connection(conn):
+    """
+    Envolve uma conexão DB-API para contar, na etapa corrente, os comandos
+    enviados ao banco (execute, executemany, COPY, commit, rollback) e os
+    bytes enviados por COPY, e medir a duração de cada um.
+    """
+    return _CountingConnection(conn)
@@ -0,0 +1,230 @@
+"""
+## Profiling opcional das tarefas
+
+Decorator para callables de `PythonOperator` que, quando habilitado,
+executa a tarefa sob um profiler e mede o pico de memória com
+`tracemalloc`. Desabilitado, a chamada segue direto para a função.
+
+Habilitação, por DAG:
+
+- parâmetro `profile: true` na execução (ex.: `airflow dags trigger
+  <dag_id> --conf '{"profile": true}'`)
+- Variable `profiled_dags`: dag_ids separados por vírgula, para perfilar
+  as execuções agendadas sem alterar o DAG
+
+Modos (Variable `profiling_mode`):
+
+- `sampling` (padrão): amostra as pilhas de todas as threads a cada
+  `profiling_sample_interval` segundos e grava `flamegraph.folded`, no
+  formato de pilhas colapsadas aceito por `flamegraph.pl` e pelo speedscope
+- `cprofile`: grava `profile.pstats` (para `snakeviz`/`pstats`) e
+  `profile.txt` com as funções de maior tempo acumulado
+
+Os artefatos ficam em `<profiling_dir>/<dag_id>/<task_id>/<run_id>/`
+(uma subpasta por tentativa e instância mapeada), junto com
+`summary.json`: duração, pico de memória e as linhas que mais alocaram.
+O resumo também é publicado no XCom `profile_summary`.
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+DEFAULT_PROFILING_DIR = '/opt/airflow/data/profiles'
+DEFAULT_MODE = 'sampling'
+MODES = ('sampling', 'cprofile')
+DEFAULT_SAMPLE_INTERVAL = 0.01  # segundos
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 15
+
+
+def _safe(value):
+    # run_ids têm ':' e '+' (ex.: scheduled__2025-04-29T00:00:00+00:00)
+    return re.sub(r'[^A-Za-z0-9_.=-]', '_', str(value))
+
+
+def artifact_dir(base_dir, dag_id, task_id, run_id, try_number=None, map_index=-1):
+    parts = [base_dir, _safe(dag_id), _safe(task_id), _safe(run_id)]
+    attempt = f"try_{try_number or 1}"
+    if map_index is not None and map_index >= 0:
+        attempt += f"_map_{map_index}"
+    return os.path.join(*parts, attempt)
+
+
+def is_enabled(dag_id, params, profiled_dags):
+    if params and params.get('profile'):
+        return True
+    return dag_id in {name.strip() for name in (profiled_dags or '').split(',') if name.strip()}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Profiler por amostragem: uma thread auxiliar lê `sys._current_frames()`
+    a cada `interval` segundos e conta as pilhas de cada thread, com o
+    nome da thread como raiz. O custo não depende da quantidade de
+    chamadas, ao contrário do cProfile.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path):
+        with open(path, 'w') as outfile:
+            for stack, count in self.samples.most_common():
+                outfile.write(f"{stack} {count}\n")
+        return path
+
+
+def _top_allocations(snapshot, limit=TOP_ALLOCATIONS):
+    return [
+        {
+            'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            'size_bytes': stat.size,
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+def run_profiled(func, args, kwargs, output_dir, mode=DEFAULT_MODE, interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    Executa `func(*args, **kwargs)` sob o profiler escolhido e grava os
+    artefatos em `output_dir`, mesmo se a função falhar.
+    Retorna `(resultado, resumo)`; exceções da função são propagadas.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modo de profiling inválido: {mode} (use {', '.join(MODES)})")
+    os.makedirs(output_dir, exist_ok=True)
+
+    profiler = cProfile.Profile() if mode == 'cprofile' else StackSampler(interval)
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, 'reset_peak'):
+        # Python 3.9+; no 3.8 o pico inclui o que foi alocado antes da tarefa
+        tracemalloc.reset_peak()
+
+    status = 'failed'
+    start = time.perf_counter()
+    if mode == 'cprofile':
+        profiler.enable()
+    else:
+        profiler.start()
+    try:
+        result = func(*args, **kwargs)
+        status = 'success'
+    finally:
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+        duration = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        allocations = _top_allocations(tracemalloc.take_snapshot())
+        if not already_tracing:
+            tracemalloc.stop()
+
+        artifacts = {}
+        if mode == 'cprofile':
+            artifacts['pstats'] = os.path.join(output_dir, 'profile.pstats')
+            profiler.dump_stats(artifacts['pstats'])
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            artifacts['report'] = os.path.join(output_dir, 'profile.txt')
+            with open(artifacts['report'], 'w') as outfile:
+                outfile.write(report.getvalue())
+        else:
+            artifacts['flamegraph'] = profiler.write_folded(os.path.join(output_dir, 'flamegraph.folded'))
+
+        summary = {
+            'status': status,
+            'mode': mode,
+            'duration_seconds': round(duration, 3),
+            'peak_memory_bytes': peak,
+            'final_memory_bytes': current,
+            'top_allocations': allocations,
+            'artifacts': artifacts,
+        }
+        if mode == 'sampling':
+            summary['samples'] = sum(profiler.samples.values())
+            summary['sample_interval_seconds'] = interval
+        with open(os.path.join(output_dir, 'summary.json'), 'w') as outfile:
+            json.dump(summary, outfile, indent=2)
+        print(f"Profiling ({mode}) em {output_dir}: {summary['duration_seconds']}s, "
+              f"pico de memória {peak / 1024 ** 2:.1f} MiB")
+    return result, summary
+
+
+def _settings():
+    from airflow.models import Variable
+    return {
+        'profiled_dags': Variable.get("profiled_dags", default_var=''),
+        'base_dir': Variable.get("profiling_dir", default_var=DEFAULT_PROFILING_DIR),
+        'mode': Variable.get("profiling_mode", default_var=DEFAULT_MODE),
+        'interval': float(Variable.get("profiling_sample_interval", default_var=DEFAULT_SAMPLE_INTERVAL)),
+    }
+
+
+def profiled(settings=_settings):
+    """
+    Decorator para callables de `PythonOperator`. `settings` retorna a
+    configuração (por padrão, lida das Variables descritas no módulo).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **context):
+            ti = context.get('ti')
+            dag_id = getattr(ti, 'dag_id', None)
+            if ti is None:
+                return func(*args, **context)
+            config = settings()
+            if not is_enabled(dag_id, context.get('params'), config['profiled_dags']):
+                return func(*args, **context)
+
+            output_dir = artifact_dir(
+                config['base_dir'], dag_id, ti.task_id, context.get('run_id') or ti.run_id,
+                getattr(ti, 'try_number', None), getattr(ti, 'map_index', -1)
+            )
+            result, summary = run_profiled(func, args, context, output_dir, config['mode'], config['interval'])
+            ti.xcom_push(key='profile_summary', value={**summary, 'output_dir': output_dir})
+            return result
+        return wrapper
+    return decorator
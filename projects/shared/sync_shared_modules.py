@@ -0,0 +1,127 @@
+"""
+## Sincronização dos módulos compartilhados entre os projetos
+
+Os projetos com Airflow montam apenas a própria pasta `plugins/` nos
+contêineres e cada projeto é executado de forma independente, então os
+módulos comuns são copiados (vendorizados) em cada projeto. A fonte única
+é esta pasta `shared/`: as cópias não devem ser editadas diretamente.
+
+- `airflow_plugins/`: módulos de `plugins/` dos projetos com Airflow
+- `scripts/`: harness de benchmark e coletor local de métricas
+
+Nas cópias marcadas com `keep_docstring`, o docstring do módulo é do
+projeto (ex.: título `###` no airflow-fundamentals) e só o código depois
+dele é sincronizado.
+
+Uso (a partir de `projects/`):
+    python shared/sync_shared_modules.py           # atualiza as cópias
+    python shared/sync_shared_modules.py --check   # sai com código 1 se alguma divergir
+"""
+
+import argparse
+import ast
+import os
+import sys
+
+SHARED_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECTS_DIR = os.path.dirname(SHARED_DIR)
+
+# Módulo de origem (relativo a shared/) -> cópias (relativas a projects/)
+TARGETS = {
+    'airflow_plugins/pipeline_metrics.py': [
+        'end-to-end-pipeline/airflow/plugins/pipeline_metrics.py',
+        'dbt-airflow-flights/airflow/plugins/pipeline_metrics.py',
+    ],
+    'airflow_plugins/connection_pool.py': [
+        'end-to-end-pipeline/airflow/plugins/connection_pool.py',
+        'dbt-airflow-flights/airflow/plugins/connection_pool.py',
+    ],
+    'airflow_plugins/task_profiler.py': [
+        'end-to-end-pipeline/airflow/plugins/task_profiler.py',
+        'dbt-airflow-flights/airflow/plugins/task_profiler.py',
+    ],
+    'airflow_plugins/page_fetcher.py': [
+        'end-to-end-pipeline/airflow/plugins/page_fetcher.py',
+        'dbt-airflow-flights/airflow/plugins/page_fetcher.py',
+    ],
+    'scripts/metrics_collector_stub.py': [
+        'end-to-end-pipeline/scripts/metrics_collector_stub.py',
+        'dbt-airflow-flights/scripts/metrics_collector_stub.py',
+    ],
+    'scripts/benchmark_harness.py': [
+        'end-to-end-pipeline/scripts/benchmark_harness.py',
+        'dbt-airflow-flights/scripts/benchmark_harness.py',
+        ('airflow-fundamentals/scripts/benchmark_harness.py', 'keep_docstring'),
+        ('dbt-fundamentals/scripts/benchmark_harness.py', 'keep_docstring'),
+    ],
+}
+
+
+def split_docstring(source):
+    """
+    Separa o texto do módulo em (docstring, restante), pela linha em que
+    termina o docstring. Sem docstring, retorna ('', source).
+    """
+    tree = ast.parse(source)
+    if not (tree.body and isinstance(tree.body[0], ast.Expr)
+            and isinstance(getattr(tree.body[0], 'value', None), ast.Constant)
+            and isinstance(tree.body[0].value.value, str)):
+        return '', source
+    lines = source.splitlines(keepends=True)
+    end = tree.body[0].end_lineno
+    return ''.join(lines[:end]), ''.join(lines[end:])
+
+
+def expected_content(source, current, keep_docstring):
+    if not keep_docstring or current is None:
+        return source
+    return split_docstring(current)[0] + split_docstring(source)[1]
+
+
+def iter_targets():
+    for source_path, copies in TARGETS.items():
+        for copy in copies:
+            copy_path, keep_docstring = (copy, False) if isinstance(copy, str) else (copy[0], True)
+            yield source_path, copy_path, keep_docstring
+
+
+def sync(check=False):
+    """
+    Atualiza as cópias a partir de `shared/` (ou, com `check`, só lista as
+    divergentes). Retorna as cópias desatualizadas.
+    """
+    stale = []
+    for source_path, copy_path, keep_docstring in iter_targets():
+        with open(os.path.join(SHARED_DIR, source_path), encoding='utf-8') as f:
+            source = f.read()
+        target = os.path.join(PROJECTS_DIR, copy_path)
+        current = None
+        if os.path.exists(target):
+            with open(target, encoding='utf-8') as f:
+                current = f.read()
+        expected = expected_content(source, current, keep_docstring)
+        if current == expected:
+            continue
+        stale.append(copy_path)
+        if not check:
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(expected)
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='Apenas verifica, sem alterar as cópias')
+    args = parser.parse_args()
+
+    stale = sync(check=args.check)
+    for copy_path in stale:
+        print(f"{'Divergente' if args.check else 'Atualizado'}: {copy_path}")
+    if args.check and stale:
+        sys.exit("Cópias divergentes de shared/; edite o módulo em shared/ e rode sync_shared_modules.py")
+    if not stale:
+        print("Cópias em dia com shared/")
+
+
+if __name__ == '__main__':
+    main()